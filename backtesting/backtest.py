@@ -5,6 +5,7 @@ TQQQ 200-Day SMA Strategy Backtesting
 Backtests the 200 SMA +5/-3 strategy from TQQQ inception (2010-02-11) to present.
 Compares strategy performance against buy-and-hold TQQQ and QQQ.
 """
+import argparse
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -15,8 +16,9 @@ from datetime import datetime, timezone
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-from src.data_fetcher import fetch_data_with_retry
-from src.calculations import compute_sma
+from src import config
+from src.data_fetcher import fetch_adj_close
+from src.calculations import compute_sma, compute_sma_matrix, hysteresis_positions
 
 
 # Strategy parameters
@@ -24,21 +26,23 @@ SMA_PERIOD = 200
 BUY_MULTIPLIER = 1.05   # +5%
 SELL_MULTIPLIER = 0.97  # -3%
 INITIAL_CAPITAL = 10000  # $10,000 starting capital
+SWEEP_PERIODS = range(50, 301, 10)  # SMA periods compared by --sweep
 
 
-def fetch_full_history(symbol, start_date='2010-02-11'):
-    """Fetch complete history from TQQQ inception."""
+def fetch_full_history(symbol, start_date=config.BACKTEST_START):
+    """
+    Fetch complete history from TQQQ inception.
+
+    Goes through the shared market data cache, so history already held by
+    the daily job's cache is reused and only missing bars are downloaded.
+    """
     print(f"Fetching {symbol} data from {start_date}...")
 
-    # Fetch with daily interval
-    df = fetch_data_with_retry(symbol, interval='1d', period='max', retries=5, delay=2)
+    df = fetch_adj_close(symbol, start=start_date, columns=["adj_close"])
 
     if df.empty:
         raise RuntimeError(f"Failed to fetch data for {symbol}")
 
-    # Filter to start date
-    df = df[df.index >= start_date]
-
     print(f"  Fetched {len(df)} days of data from {df.index[0].date()} to {df.index[-1].date()}")
     return df
 
@@ -65,6 +69,99 @@ def calculate_sharpe_ratio(returns, risk_free_rate=0.02):
     return np.sqrt(252) * excess_returns.mean() / excess_returns.std()
 
 
+def align_closes(qqq_data, tqqq_data):
+    """Align QQQ and TQQQ adjusted closes on their common dates."""
+    return pd.DataFrame({
+        'qqq_close': qqq_data['adj_close'],
+        'tqqq_close': tqqq_data['adj_close']
+    }).dropna()
+
+
+def simulate_strategy(combined):
+    """
+    Trade the +5/-3 rules over aligned prices and threshold levels.
+
+    Positions come from hysteresis_positions (the state machine the daily
+    signal uses); only the trades themselves are walked in Python.
+
+    Args:
+        combined: DataFrame with qqq_close, tqqq_close, buy_level and
+                  sell_level columns (no NaNs)
+
+    Returns:
+        tuple: (portfolio_values, positions, trades) - value and position
+               ('TQQQ'/'CASH') arrays for every day, and the list of trades
+    """
+    qqq_prices = combined['qqq_close'].to_numpy(dtype=np.float64)
+    tqqq_prices = combined['tqqq_close'].to_numpy(dtype=np.float64)
+    # Start in CASH
+    held, trade_bars = hysteresis_positions(
+        qqq_prices, combined['buy_level'].to_numpy(), combined['sell_level'].to_numpy()
+    )
+
+    # Cash and shares held after each trade (index 0: before the first one)
+    cash = INITIAL_CAPITAL
+    shares = 0
+    cash_after = [cash]
+    shares_after = [shares]
+    trades = []
+    for i in trade_bars:
+        tqqq_price = tqqq_prices[i]
+        if held[i]:
+            # BUY signal - go all in to TQQQ
+            shares = cash / tqqq_price
+            cash = 0
+            action, value = 'BUY', shares * tqqq_price
+        else:
+            # SELL signal - exit to CASH
+            cash = shares * tqqq_price
+            action, value = 'SELL', cash
+        trades.append({
+            'date': combined.index[i],
+            'action': action,
+            'qqq_price': qqq_prices[i],
+            'tqqq_price': tqqq_price,
+            'shares': shares,
+            'value': value
+        })
+        if not held[i]:
+            shares = 0
+        cash_after.append(cash)
+        shares_after.append(shares)
+
+    # Calculate portfolio value from the last trade at or before each day
+    segment = np.searchsorted(trade_bars, np.arange(len(combined)), side='right')
+    portfolio_values = np.where(held, np.asarray(shares_after, dtype=np.float64)[segment] * tqqq_prices,
+                                np.asarray(cash_after, dtype=np.float64)[segment])
+    positions = np.where(held, 'TQQQ', 'CASH')
+
+    return portfolio_values, positions, trades
+
+
+def performance_metrics(portfolio_values, index):
+    """
+    Return, CAGR, Sharpe ratio and drawdown of a portfolio value series.
+
+    Args:
+        portfolio_values: daily portfolio values
+        index: dates matching portfolio_values
+
+    Returns:
+        dict: final_value, total_return, cagr, sharpe_ratio, max_drawdown, years
+    """
+    final_value = portfolio_values[-1]
+    years = (index[-1] - index[0]).days / 365.25
+    values = pd.Series(portfolio_values)
+    return {
+        'final_value': final_value,
+        'total_return': (final_value / INITIAL_CAPITAL - 1) * 100,
+        'cagr': calculate_cagr(INITIAL_CAPITAL, final_value, years),
+        'sharpe_ratio': calculate_sharpe_ratio(values.pct_change()),
+        'max_drawdown': calculate_max_drawdown(values),
+        'years': years,
+    }
+
+
 def backtest_strategy(qqq_data, tqqq_data):
     """
     Backtest the 200 SMA +5/-3 strategy.
@@ -76,15 +173,7 @@ def backtest_strategy(qqq_data, tqqq_data):
     print("Running Backtest: 200 SMA +5/-3 Strategy")
     print("="*60)
 
-    # Extract adj_close series
-    qqq_close = qqq_data['adj_close'].squeeze() if isinstance(qqq_data['adj_close'], pd.DataFrame) else qqq_data['adj_close']
-    tqqq_close = tqqq_data['adj_close'].squeeze() if isinstance(tqqq_data['adj_close'], pd.DataFrame) else tqqq_data['adj_close']
-
-    # Align data
-    combined = pd.DataFrame({
-        'qqq_close': qqq_close,
-        'tqqq_close': tqqq_close
-    }).dropna()
+    combined = align_closes(qqq_data, tqqq_data)
 
     # Calculate QQQ SMA
     combined['sma200'] = compute_sma(combined['qqq_close'], SMA_PERIOD)
@@ -98,58 +187,7 @@ def backtest_strategy(qqq_data, tqqq_data):
     print(f"Total trading days: {len(combined)}")
     print(f"Initial capital: ${INITIAL_CAPITAL:,.2f}")
 
-    # Initialize strategy tracking
-    position = 'CASH'  # Start in CASH
-    cash = INITIAL_CAPITAL
-    shares = 0
-    portfolio_values = []
-    positions = []
-    trades = []
-
-    # Run backtest
-    for date, row in combined.iterrows():
-        qqq_price = row['qqq_close']
-        tqqq_price = row['tqqq_close']
-        buy_threshold = row['buy_level']
-        sell_threshold = row['sell_level']
-
-        # Check for signals
-        if position == 'CASH' and qqq_price >= buy_threshold:
-            # BUY signal - go all in to TQQQ
-            shares = cash / tqqq_price
-            cash = 0
-            position = 'TQQQ'
-            trades.append({
-                'date': date,
-                'action': 'BUY',
-                'qqq_price': qqq_price,
-                'tqqq_price': tqqq_price,
-                'shares': shares,
-                'value': shares * tqqq_price
-            })
-
-        elif position == 'TQQQ' and qqq_price <= sell_threshold:
-            # SELL signal - exit to CASH
-            cash = shares * tqqq_price
-            position = 'CASH'
-            trades.append({
-                'date': date,
-                'action': 'SELL',
-                'qqq_price': qqq_price,
-                'tqqq_price': tqqq_price,
-                'shares': shares,
-                'value': cash
-            })
-            shares = 0
-
-        # Calculate portfolio value
-        if position == 'TQQQ':
-            portfolio_value = shares * tqqq_price
-        else:
-            portfolio_value = cash
-
-        portfolio_values.append(portfolio_value)
-        positions.append(position)
+    portfolio_values, positions, trades = simulate_strategy(combined)
 
     # Create results DataFrame
     results = combined.copy()
@@ -157,16 +195,13 @@ def backtest_strategy(qqq_data, tqqq_data):
     results['position'] = positions
 
     # Calculate final metrics
-    final_value = portfolio_values[-1]
-    total_return = (final_value / INITIAL_CAPITAL - 1) * 100
-    years = (combined.index[-1] - combined.index[0]).days / 365.25
-    cagr = calculate_cagr(INITIAL_CAPITAL, final_value, years)
-
-    # Calculate returns for Sharpe ratio
-    returns = pd.Series(portfolio_values).pct_change()
-    sharpe = calculate_sharpe_ratio(returns)
-
-    max_dd = calculate_max_drawdown(pd.Series(portfolio_values))
+    metrics = performance_metrics(portfolio_values, combined.index)
+    final_value = metrics['final_value']
+    total_return = metrics['total_return']
+    years = metrics['years']
+    cagr = metrics['cagr']
+    sharpe = metrics['sharpe_ratio']
+    max_dd = metrics['max_drawdown']
 
     # Count trades and win rate
     num_trades = len(trades)
@@ -205,6 +240,65 @@ def backtest_strategy(qqq_data, tqqq_data):
     }
 
 
+def sweep_sma_periods(qqq_data, tqqq_data, periods=SWEEP_PERIODS):
+    """
+    Backtest the +5/-3 strategy for a range of SMA periods.
+
+    All SMAs come from a single compute_sma_matrix call. Every period is
+    traded over the same dates, starting when the longest SMA is defined,
+    so the results are directly comparable.
+
+    Args:
+        qqq_data: DataFrame with QQQ adj_close
+        tqqq_data: DataFrame with TQQQ adj_close
+        periods: SMA periods to test
+
+    Returns:
+        DataFrame: indexed by period, with final_value, cagr, max_drawdown,
+                   sharpe_ratio and num_trades columns
+
+    Raises:
+        ValueError: if there is not enough history for the longest period
+    """
+    combined = align_closes(qqq_data, tqqq_data)
+    periods = list(periods)
+    smas = compute_sma_matrix(combined['qqq_close'], periods)
+
+    start = max(periods) - 1
+    if start >= len(combined):
+        raise ValueError(f"Not enough history for a {max(periods)}-day SMA ({len(combined)} days)")
+    window = combined.iloc[start:].copy()
+
+    rows = []
+    for period, sma in zip(periods, smas[:, start:]):
+        window['buy_level'] = sma * BUY_MULTIPLIER
+        window['sell_level'] = sma * SELL_MULTIPLIER
+        portfolio_values, _, trades = simulate_strategy(window)
+        metrics = performance_metrics(portfolio_values, window.index)
+        rows.append({
+            'period': period,
+            'final_value': metrics['final_value'],
+            'cagr': metrics['cagr'],
+            'max_drawdown': metrics['max_drawdown'],
+            'sharpe_ratio': metrics['sharpe_ratio'],
+            'num_trades': len(trades),
+        })
+    return pd.DataFrame(rows).set_index('period')
+
+
+def print_sweep(sweep):
+    """Print the SMA period sweep as a table."""
+    print(f"\n{'='*60}")
+    print("SMA PERIOD SWEEP (+5/-3 thresholds)")
+    print(f"{'='*60}")
+    print(f"{'Period':<8} {'Final Value':>15} {'CAGR':>9} {'Max DD':>9} {'Sharpe':>8} {'Trades':>7}")
+    print(f"{'-'*60}")
+    for period, row in sweep.iterrows():
+        print(f"{period:<8} ${row['final_value']:>14,.2f} {row['cagr']:>8.2f}% "
+              f"{row['max_drawdown']:>8.2f}% {row['sharpe_ratio']:>8.2f} {int(row['num_trades']):>7}")
+    print(f"{'='*60}\n")
+
+
 def backtest_buy_and_hold(data, symbol_name, initial_capital=INITIAL_CAPITAL):
     """Backtest buy-and-hold strategy."""
     print(f"\n{'─'*60}")
@@ -212,7 +306,7 @@ def backtest_buy_and_hold(data, symbol_name, initial_capital=INITIAL_CAPITAL):
     print(f"{'─'*60}")
 
     # Extract adj_close series
-    adj_close = data['adj_close'].squeeze() if isinstance(data['adj_close'], pd.DataFrame) else data['adj_close']
+    adj_close = data['adj_close']
 
     initial_price = adj_close.iloc[0]
     final_price = adj_close.iloc[-1]
@@ -379,7 +473,7 @@ def generate_backtest_report(strategy_results, tqqq_bh, qqq_bh):
         )
 
     # Plot 3: Position over time
-    position_numeric = [1 if p == 'TQQQ' else 0 for p in results['position']]
+    position_numeric = (results['position'] == 'TQQQ').astype(int)
     fig.add_trace(
         go.Scatter(
             x=results.index,
@@ -420,8 +514,14 @@ def generate_backtest_report(strategy_results, tqqq_bh, qqq_bh):
     return output_file
 
 
-def main():
+def main(argv=None):
     """Run complete backtest analysis."""
+    parser = argparse.ArgumentParser(description="TQQQ 200-day SMA strategy backtest")
+    parser.add_argument("--sweep", action="store_true",
+                        help=f"also compare SMA periods {SWEEP_PERIODS.start}-{SWEEP_PERIODS.stop - 1} "
+                             f"(step {SWEEP_PERIODS.step})")
+    args = parser.parse_args(argv)
+
     print("\n" + "="*60)
     print("TQQQ 200-DAY SMA STRATEGY BACKTEST")
     print("="*60)
@@ -431,8 +531,8 @@ def main():
     print("="*60)
 
     # Fetch historical data
-    qqq_data = fetch_full_history('QQQ', start_date='2010-02-11')
-    tqqq_data = fetch_full_history('TQQQ', start_date='2010-02-11')
+    qqq_data = fetch_full_history(config.QQQ_SYMBOL)
+    tqqq_data = fetch_full_history(config.TQQQ_SYMBOL)
 
     # Align dates
     common_dates = qqq_data.index.intersection(tqqq_data.index)
@@ -458,11 +558,15 @@ def main():
     print(f"{'QQQ Buy & Hold':<25} ${qqq_bh['final_value']:>14,.2f} {qqq_bh['cagr']:>9.2f}% {qqq_bh['max_drawdown']:>9.2f}% {qqq_bh['sharpe_ratio']:>9.2f}")
     print(f"{'='*60}\n")
 
-    return {
+    results = {
         'strategy': strategy_results,
         'tqqq_bh': tqqq_bh,
         'qqq_bh': qqq_bh
     }
+    if args.sweep:
+        results['sweep'] = sweep_sma_periods(qqq_data, tqqq_data)
+        print_sweep(results['sweep'])
+    return results
 
 
 if __name__ == '__main__':
@@ -3,7 +3,7 @@
 # clean-cached-data.sh - Remove cached market data and generated files
 #
 # This script deletes the data/ folder which contains:
-#   - market_data_cache.pkl (cached Yahoo Finance data)
+#   - market_data_cache/ (cached Yahoo Finance data)
 #   - position_state.json (trading position state)
 #   - signals_log.csv (trade history log)
 #   - tqqq_sma_chart.html (interactive chart)
@@ -3,21 +3,47 @@
 Clean cached market data and generated files.
 
 Removes the data/ folder which contains:
-  - market_data_cache.pkl (cached Yahoo Finance data)
+  - market_data_cache/ (cached Yahoo Finance data)
   - position_state.json (trading position state)
   - signals_log.csv (trade history log)
   - tqqq_sma_chart.html (interactive chart)
 
 ⚠️  WARNING: This will delete your trading history and position state!
+
+With --compact, only the market data cache is tidied instead: segments are
+merged, leftover temporary files removed and the CACHE_MAX_BYTES budget
+applied. Nothing else is deleted and no confirmation is asked.
 """
+import argparse
 import os
 import sys
 import shutil
 from pathlib import Path
 
 
-def main():
+def compact():
+    """Compact the market data cache in place."""
+    from src import bar_store, config
+
+    stats = bar_store.compact_store(max_bytes=config.CACHE_MAX_BYTES)
+    print(f"🗜️  Compacted {stats['compacted']} cache entries in {config.CACHE_DIR}")
+    if stats["evicted"]:
+        print(f"   Evicted {stats['evicted']} least recently used entries")
+    if stats["removed"]:
+        print(f"   Removed {stats['removed']} leftover files")
+    print(f"✅ Cache size: {stats['before'] / 1024:.1f} KB → {stats['after'] / 1024:.1f} KB")
+    return 0
+
+
+def main(argv=None):
     """Main entry point for the clean-data script."""
+    parser = argparse.ArgumentParser(description="Delete or compact cached data")
+    parser.add_argument("--compact", action="store_true",
+                        help="compact the market data cache instead of deleting data/")
+    args = parser.parse_args(argv)
+    if args.compact:
+        return compact()
+
     project_root = Path(__file__).parent.parent
     data_dir = project_root / "data"
 
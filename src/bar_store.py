@@ -0,0 +1,728 @@
+"""
+Columnar on-disk store for daily market data bars.
+
+Each entry (e.g. one symbol) lives in its own ``<name>.bars`` file inside
+``config.CACHE_DIR`` and a small ``manifest.json`` holds the freshness
+metadata for all entries. Reading or writing one entry never touches the
+files of other entries, and nothing is pickled, so the cache survives
+pandas upgrades.
+
+File layout (little endian):
+
+    8 bytes   magic ``b"TQBARS01"``
+    4 bytes   uint32 length of the JSON header
+    N bytes   JSON header: schema version, rows, index name, the entry's
+              manifest metadata and one record per column (name, numpy
+              dtype string, byte offset from the data start, CRC-32)
+    padding   up to the next 64-byte boundary
+    data      each column stored contiguously, starting with the date index
+
+Entries are append-only: historical rows are sealed into immutable segment
+files ``<name>.<seq>.bars`` of ``config.CACHE_SEGMENT_ROWS`` rows, and only
+the hot tail ``<name>.bars`` (whose header lists the segments) is rewritten
+by a daily update. Too many segments are compacted into one.
+
+Because every column is a contiguous block at a known offset, columns can
+be memory-mapped with ``numpy.memmap`` without reading the rest of the file,
+so callers only materialize the columns they ask for. Column dtypes are
+chosen per column (COLUMN_DTYPES): a full OHLCV bar costs 36 bytes plus
+the date.
+
+The store is size-capped: reads are stamped in memory and written to the
+entry's "last_access" with the next manifest update (or at exit), and
+enforce_budget evicts least recently used entries once the files exceed a
+byte budget. compact_store merges segments and removes leftovers of
+interrupted writes.
+
+Files and the manifest are written to a temporary file and renamed into
+place, so a killed process never leaves a partial file behind. Manifest
+updates hold an exclusive lock on ``manifest.lock`` so concurrent processes
+(e.g. prefetch and a backtest) never lose each other's entries. Reads check
+the schema version and the checksum of every column they load and raise
+CorruptEntryError on mismatch; a read that raced a concurrent rewrite of
+the entry is retried instead. Because each header repeats its manifest
+metadata, a lost manifest is rebuilt from the entry files.
+"""
+import atexit
+import json
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from . import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: the store is shared without locking
+    fcntl = None
+
+MAGIC = b"TQBARS01"
+SCHEMA_VERSION = 2
+ALIGNMENT = 64
+INDEX_COLUMN = "date"
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = "manifest.lock"
+# Attempts to read an entry whose files are being replaced by another writer
+READ_ATTEMPTS = 3
+
+# Storage dtype per column; anything not listed is stored as float64.
+# Prices the signal is computed from stay float64, the intraday prices are
+# stored compactly. Volume stays float64 so a missing value reads back as
+# NaN (volumes are exact in float64 up to 2**53).
+COLUMN_DTYPES = {
+    "open": "<f4",
+    "high": "<f4",
+    "low": "<f4",
+}
+
+# Reentrant so writers can reload the manifest while holding it; readers take
+# it too so concurrent fetch threads never see a half-written manifest
+_manifest_lock = threading.RLock()
+# Depth and descriptor of the inter-process lock held by this process
+_store_lock_depth = 0
+_store_lock_fd = None
+# (cache dir, entry name) -> ISO time of reads not yet written to the manifest
+_pending_access = {}
+
+
+class CorruptEntryError(ValueError):
+    """Raised when a bar store file fails header or checksum validation."""
+
+
+@contextmanager
+def _store_lock():
+    """
+    Hold the manifest lock of this process and, around the outermost use,
+    an exclusive flock on ``manifest.lock`` shared with other processes.
+
+    Every read-modify-write of the manifest runs under this lock.
+    """
+    global _store_lock_depth, _store_lock_fd
+    with _manifest_lock:
+        if _store_lock_depth == 0 and fcntl is not None:
+            os.makedirs(config.CACHE_DIR, exist_ok=True)
+            fd = os.open(os.path.join(config.CACHE_DIR, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            _store_lock_fd = fd
+        _store_lock_depth += 1
+        try:
+            yield
+        finally:
+            _store_lock_depth -= 1
+            if _store_lock_depth == 0 and _store_lock_fd is not None:
+                fcntl.flock(_store_lock_fd, fcntl.LOCK_UN)
+                os.close(_store_lock_fd)
+                _store_lock_fd = None
+
+
+def _entry_path(name):
+    """Path of the columnar file for a store entry."""
+    return os.path.join(config.CACHE_DIR, f"{name}.bars")
+
+
+def _manifest_path():
+    """Path of the store manifest."""
+    return os.path.join(config.CACHE_DIR, MANIFEST_NAME)
+
+
+def _align(offset):
+    """Round offset up to the next ALIGNMENT boundary."""
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _checksum(values):
+    """CRC-32 of an array's raw bytes."""
+    return zlib.crc32(np.ascontiguousarray(values).view(np.uint8))
+
+
+def _atomic_write(path, chunks):
+    """
+    Write chunks of bytes to path via a temporary file and an atomic rename.
+
+    Readers see either the old file or the complete new one, never a
+    truncated file, even if the process is killed mid-write.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_manifest():
+    """
+    Load the store manifest.
+
+    If the manifest cannot be parsed it is rebuilt from the entry file
+    headers, so a damaged manifest never invalidates the whole cache.
+
+    Returns:
+        dict: mapping of entry name -> metadata ("updated", "last_access",
+              "rows", "first", "last", "columns", "segments"); empty if the
+              store does not exist yet
+    """
+    path = _manifest_path()
+    with _manifest_lock:
+        if not os.path.exists(path):
+            return {}
+
+        try:
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            entries = manifest.get("entries") if isinstance(manifest, dict) else None
+            if not isinstance(entries, dict):
+                raise ValueError("missing entries")
+            return entries
+        except ValueError as e:
+            entries = rebuild_manifest()
+            print(f"Bar store manifest unreadable ({e}), rebuilt from {len(entries)} entries")
+            return entries
+
+
+def rebuild_manifest():
+    """
+    Recreate the manifest from the metadata stored in each entry's header.
+
+    Entries whose header cannot be read are left out (and will be refetched).
+
+    Returns:
+        dict: rebuilt manifest entries
+    """
+    entries = {}
+    if not os.path.isdir(config.CACHE_DIR):
+        return entries
+    with _store_lock():
+        for filename in sorted(os.listdir(config.CACHE_DIR)):
+            if not filename.endswith(".bars") or _is_segment_file(filename):
+                continue
+            path = os.path.join(config.CACHE_DIR, filename)
+            try:
+                with open(path, "rb") as f:
+                    header, _ = _read_header(f, path)
+            except (OSError, ValueError):
+                continue
+            if header.get("meta"):
+                entries[filename[:-len(".bars")]] = header["meta"]
+        _save_manifest(entries)
+    return entries
+
+
+def _save_manifest(entries):
+    """
+    Write the manifest atomically (callers must hold _store_lock).
+
+    Pending access stamps of this store are written along with it.
+    """
+    os.makedirs(config.CACHE_DIR, exist_ok=True)
+    _with_access(entries)
+    data = json.dumps({"version": 1, "entries": entries}, indent=2, sort_keys=True)
+    _atomic_write(_manifest_path(), [data.encode("utf-8")])
+    for key in [key for key in _pending_access if key[0] == config.CACHE_DIR]:
+        del _pending_access[key]
+
+
+def _with_access(entries):
+    """Apply this store's pending access stamps to manifest entries (in place)."""
+    for (cache_dir, name), stamp in _pending_access.items():
+        if cache_dir == config.CACHE_DIR and name in entries and stamp > entries[name].get("last_access", ""):
+            entries[name]["last_access"] = stamp
+    return entries
+
+
+def entry_updated(info):
+    """
+    Parse the "updated" timestamp of a manifest entry.
+
+    Args:
+        info: manifest entry dict
+
+    Returns:
+        datetime: timezone-aware update time, or None if missing
+    """
+    updated = info.get("updated") if info else None
+    return datetime.fromisoformat(updated) if updated else None
+
+
+def _segment_path(name, seq):
+    """Path of an immutable historical segment of an entry."""
+    return os.path.join(config.CACHE_DIR, f"{name}.{seq:06d}.bars")
+
+
+def _is_segment_file(filename):
+    """Whether a file name is a segment (``<name>.<6 digits>.bars``)."""
+    stem = filename[:-len(".bars")]
+    parts = stem.rsplit(".", 1)
+    return len(parts) == 2 and len(parts[1]) == 6 and parts[1].isdigit()
+
+
+def _segment_files(name):
+    """All segment files of an entry on disk, sorted by sequence number."""
+    if not os.path.isdir(config.CACHE_DIR):
+        return []
+    prefix = f"{name}."
+    return sorted(
+        f for f in os.listdir(config.CACHE_DIR)
+        if f.startswith(prefix) and f.endswith(".bars") and _is_segment_file(f)
+        and "." not in f[len(prefix):-len(".bars")]
+    )
+
+
+def _column_values(df, col):
+    """Values of one column converted to its storage dtype (see COLUMN_DTYPES)."""
+    return df[col].to_numpy(dtype="<f8").astype(COLUMN_DTYPES.get(str(col), "<f8"))
+
+
+def _write_file(path, index, df, meta):
+    """Atomically write one columnar file holding the index and columns of df."""
+    arrays = [(INDEX_COLUMN, index.to_numpy())]
+    arrays += [(str(col), _column_values(df, col)) for col in df.columns]
+
+    columns = []
+    offset = 0
+    for col, values in arrays:
+        data = np.ascontiguousarray(values)
+        columns.append({
+            "name": col,
+            "dtype": values.dtype.str,
+            "offset": offset,
+            "crc32": _checksum(data),
+        })
+        offset += values.nbytes
+
+    header = json.dumps({
+        "schema_version": SCHEMA_VERSION,
+        "rows": len(df),
+        "index_name": df.index.name,
+        "meta": meta,
+        "columns": columns,
+    }).encode("utf-8")
+    preamble = MAGIC + struct.pack("<I", len(header)) + header
+    data_start = _align(len(preamble))
+
+    chunks = [preamble, b"\0" * (data_start - len(preamble))]
+    chunks += [np.ascontiguousarray(values).tobytes() for _, values in arrays]
+    _atomic_write(path, chunks)
+
+
+def _current_segments(name):
+    """Segment file names referenced by the entry's hot file, or []."""
+    path = _entry_path(name)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "rb") as f:
+            header, _ = _read_header(f, path)
+    except (OSError, ValueError):
+        return []
+    return header.get("meta", {}).get("segments", [])
+
+
+def _reusable_segments(name, index, df):
+    """
+    Leading segments of the current entry whose rows equal the start of df.
+
+    Returns:
+        list: segment file names that can be kept unchanged
+    """
+    kept = []
+    pos = 0
+    for filename in _current_segments(name):
+        try:
+            segment = read_file(os.path.join(config.CACHE_DIR, filename))
+        except (OSError, ValueError):
+            break
+        n = len(segment)
+        if (pos + n > len(df) or list(segment.columns) != [str(c) for c in df.columns]
+                or not np.array_equal(segment.index.to_numpy(), index[pos:pos + n].to_numpy())):
+            break
+        if not all(np.array_equal(segment[col].to_numpy(), _column_values(df, col)[pos:pos + n], equal_nan=True)
+                   for col in segment.columns):
+            break
+        kept.append(filename)
+        pos += n
+    return kept
+
+
+def write_frame(name, df, metadata=None, compact=False):
+    """
+    Write a DataFrame as one entry and record it in the manifest.
+
+    The entry is stored as immutable historical segments plus a small hot
+    tail file (``<name>.bars``). Segments whose rows are unchanged are kept
+    as they are, so appending a day of bars only rewrites the tail; once the
+    tail reaches ``config.CACHE_SEGMENT_ROWS`` rows it is sealed into a new
+    segment. When there are more than ``config.CACHE_MAX_SEGMENTS`` segments
+    they are compacted into one. If earlier rows changed (e.g. re-adjusted
+    history) the segments are rewritten.
+
+    The index must be datetime-like; columns are stored with the dtypes in
+    COLUMN_DTYPES (float64 for anything else).
+
+    Args:
+        name: entry name (e.g. "QQQ")
+        df: DataFrame indexed by date
+        metadata: optional extra fields to store in the manifest entry
+        compact: merge all historical rows into a single segment
+    """
+    os.makedirs(config.CACHE_DIR, exist_ok=True)
+
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    now = datetime.now(timezone.utc).isoformat()
+    info = {
+        "updated": now,
+        "last_access": now,
+        "rows": len(df),
+        "first": index[0].strftime("%Y-%m-%d") if len(index) else None,
+        "last": index[-1].strftime("%Y-%m-%d") if len(index) else None,
+        "columns": [str(col) for col in df.columns],
+    }
+    info.update(metadata or {})
+
+    with _store_lock():
+        existing = _segment_files(name)
+        next_seq = int(existing[-1][len(name) + 1:-len(".bars")]) + 1 if existing else 1
+
+        segments = _reusable_segments(name, index, df)
+        sealed = sum(_segment_rows(f) for f in segments)
+
+        # Seal every complete block of tail rows into one new segment
+        seal = (len(df) - sealed) // config.CACHE_SEGMENT_ROWS * config.CACHE_SEGMENT_ROWS
+        if compact or len(segments) + (1 if seal else 0) > config.CACHE_MAX_SEGMENTS:
+            # Compact: all sealed rows into a single segment
+            segments, seal = [], sealed + seal
+            sealed = 0
+        if seal:
+            filename = os.path.basename(_segment_path(name, next_seq))
+            rows = slice(sealed, sealed + seal)
+            _write_file(os.path.join(config.CACHE_DIR, filename), index[rows], df.iloc[rows],
+                        {"segment_of": name})
+            segments.append(filename)
+            sealed += seal
+
+        info["segments"] = segments
+        _write_file(_entry_path(name), index[sealed:], df.iloc[sealed:], info)
+
+        # Segments no longer referenced were replaced or compacted
+        for filename in set(existing) - set(segments):
+            os.remove(os.path.join(config.CACHE_DIR, filename))
+
+        entries = load_manifest()
+        entries[name] = info
+        _save_manifest(entries)
+
+
+def compact_entry(name):
+    """
+    Merge all segments of an entry into one, keeping its metadata.
+
+    Args:
+        name: entry name
+
+    Returns:
+        bool: True if the entry was rewritten, False if it does not exist or
+              is already a single segment plus a partial tail
+    """
+    with _store_lock():
+        df = read_frame(name, mmap=False)
+        if df is None:
+            return False
+        path = _entry_path(name)
+        with open(path, "rb") as f:
+            header, _ = _read_header(f, path)
+        if len(header["meta"].get("segments", [])) <= 1 and header["rows"] < config.CACHE_SEGMENT_ROWS:
+            return False
+        info = load_manifest().get(name, {})
+        metadata = {k: v for k, v in info.items()
+                    if k not in ("rows", "first", "last", "columns", "segments")}
+        write_frame(name, df, metadata=metadata, compact=True)
+    return True
+
+
+def _segment_rows(filename):
+    """Number of rows in a segment file."""
+    path = os.path.join(config.CACHE_DIR, filename)
+    with open(path, "rb") as f:
+        header, _ = _read_header(f, path)
+    return header["rows"]
+
+
+def _read_header(f, path):
+    """Read and validate the file header, returning (header, data_start)."""
+    preamble = f.read(len(MAGIC) + 4)
+    if len(preamble) < len(MAGIC) + 4 or preamble[:len(MAGIC)] != MAGIC:
+        raise CorruptEntryError(f"Not a bar store file: {path}")
+
+    (header_len,) = struct.unpack("<I", preamble[len(MAGIC):])
+    raw = f.read(header_len)
+    if len(raw) != header_len:
+        raise CorruptEntryError(f"Truncated bar store header: {path}")
+
+    try:
+        header = json.loads(raw.decode("utf-8"))
+    except ValueError:
+        raise CorruptEntryError(f"Unreadable bar store header: {path}")
+    if not isinstance(header, dict) or header.get("schema_version") != SCHEMA_VERSION:
+        version = header.get("schema_version") if isinstance(header, dict) else None
+        raise CorruptEntryError(f"Unsupported bar store schema {version} (expected {SCHEMA_VERSION}): {path}")
+    return header, _align(len(preamble) + header_len)
+
+
+def read_frame(name, columns=None, mmap=True, verify=True):
+    """
+    Read one entry from the store (all segments plus the hot tail).
+
+    Args:
+        name: entry name (e.g. "QQQ")
+        columns: optional list of columns to load (default: all)
+        mmap: memory-map column data instead of reading it into memory
+        verify: check the CRC-32 of every loaded column
+
+    A writer replaces the hot tail and then removes the segments it no
+    longer references, so a read racing it can find a segment missing or a
+    column not matching its header. When the tail was replaced during the
+    read, the read is retried against the new files (up to READ_ATTEMPTS).
+
+    Returns:
+        DataFrame: entry indexed by date, or None if the entry does not exist
+
+    Raises:
+        CorruptEntryError: if a file fails validation or a segment is missing
+    """
+    path = _entry_path(name)
+    for attempt in range(READ_ATTEMPTS):
+        before = _file_id(path)
+        if before is None:
+            return None
+        try:
+            return read_file(path, columns=columns, mmap=mmap, verify=verify)
+        except (CorruptEntryError, FileNotFoundError):
+            if _file_id(path) == before or attempt == READ_ATTEMPTS - 1:
+                raise
+
+
+def _file_id(path):
+    """Identity of the file at path (replaced by every rewrite), or None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def read_file(path, columns=None, mmap=True, verify=True):
+    """
+    Read a ``.bars`` file from any location.
+
+    If the file is the hot tail of a segmented entry, the segments listed
+    in its header are read from the same directory and prepended.
+
+    Args:
+        path: path of the file
+        columns: optional list of columns to load (default: all)
+        mmap: memory-map column data instead of reading it into memory
+        verify: check the CRC-32 of every loaded column
+
+    Returns:
+        DataFrame: bars indexed by date
+
+    Raises:
+        CorruptEntryError: if a file fails validation or a segment is missing
+    """
+    with open(path, "rb") as f:
+        header, data_start = _read_header(f, path)
+
+    rows = header["rows"]
+    file_size = os.path.getsize(path)
+    layout = {col["name"]: col for col in header["columns"]}
+    wanted = [c for c in layout if c != INDEX_COLUMN] if columns is None else list(columns)
+
+    def load(col):
+        spec = layout[col]
+        dtype = np.dtype(spec["dtype"])
+        start = data_start + spec["offset"]
+        if start + rows * dtype.itemsize > file_size:
+            raise CorruptEntryError(f"Truncated bar store file: {path}")
+        if rows == 0:
+            values = np.empty(0, dtype=dtype)
+        elif mmap:
+            values = np.memmap(path, dtype=dtype, mode="r", offset=start, shape=(rows,))
+        else:
+            values = np.fromfile(path, dtype=dtype, count=rows, offset=start)
+        if verify and _checksum(values) != spec["crc32"]:
+            raise CorruptEntryError(f"Checksum mismatch in column '{col}': {path}")
+        return values
+
+    index = pd.DatetimeIndex(load(INDEX_COLUMN), name=header.get("index_name"))
+    tail = pd.DataFrame({col: load(col) for col in wanted}, index=index, copy=False)
+
+    parts = []
+    for filename in header.get("meta", {}).get("segments", []):
+        segment_path = os.path.join(os.path.dirname(path), filename)
+        if not os.path.exists(segment_path):
+            raise CorruptEntryError(f"Missing segment {filename} of {path}")
+        parts.append(read_file(segment_path, columns=columns, mmap=mmap, verify=verify))
+    if not parts:
+        return tail
+    return pd.concat(parts + [tail])
+
+
+def delete_entry(name):
+    """
+    Remove one entry and its manifest record.
+
+    Args:
+        name: entry name
+    """
+    path = _entry_path(name)
+    with _store_lock():
+        for filename in _segment_files(name):
+            os.remove(os.path.join(config.CACHE_DIR, filename))
+        if os.path.exists(path):
+            os.remove(path)
+
+        try:
+            entries = load_manifest()
+        except (ValueError, OSError):
+            return
+        if entries.pop(name, None) is not None:
+            _save_manifest(entries)
+
+
+def touch(name):
+    """
+    Record that an entry was just read (for LRU eviction).
+
+    The stamp is kept in memory and written with the next manifest update
+    (see flush_access), so reads never rewrite the manifest.
+
+    Args:
+        name: entry name
+    """
+    with _manifest_lock:
+        _pending_access[(config.CACHE_DIR, name)] = datetime.now(timezone.utc).isoformat()
+
+
+def flush_access():
+    """Write the pending access stamps of the store to its manifest in one update."""
+    with _manifest_lock:
+        if not any(cache_dir == config.CACHE_DIR for cache_dir, _ in _pending_access):
+            return
+        if not os.path.exists(_manifest_path()):
+            return
+        with _store_lock():
+            _save_manifest(load_manifest())
+
+
+atexit.register(flush_access)
+
+
+def entry_bytes(name):
+    """Size on disk of an entry: hot tail plus all of its segments."""
+    path = _entry_path(name)
+    if not os.path.exists(path):
+        return 0
+    total = os.path.getsize(path)
+    for filename in _current_segments(name):
+        segment_path = os.path.join(config.CACHE_DIR, filename)
+        if os.path.exists(segment_path):
+            total += os.path.getsize(segment_path)
+    return total
+
+
+def enforce_budget(max_bytes, keep=()):
+    """
+    Evict least recently used entries until the store fits in max_bytes.
+
+    Args:
+        max_bytes: byte budget for all entry files
+        keep: entry names that must not be evicted (e.g. just written)
+
+    Returns:
+        list: names of the evicted entries, least recently used first
+    """
+    evicted = []
+    with _store_lock():
+        entries = _with_access(load_manifest())
+        sizes = {name: entry_bytes(name) for name in entries}
+        total = sum(sizes.values())
+        if total <= max_bytes:
+            return evicted
+
+        def last_used(name):
+            return entries[name].get("last_access") or entries[name].get("updated") or ""
+
+        for name in sorted(entries, key=last_used):
+            if total <= max_bytes:
+                break
+            if name in keep:
+                continue
+            delete_entry(name)
+            total -= sizes[name]
+            evicted.append(name)
+    return evicted
+
+
+def compact_store(max_bytes=None):
+    """
+    Compact every entry and clean up the store directory.
+
+    Merges each entry's segments into one, removes temporary files left by
+    interrupted writes and segments no entry references, and optionally
+    applies a byte budget.
+
+    Args:
+        max_bytes: optional byte budget (see enforce_budget)
+
+    Returns:
+        dict: "before" and "after" sizes in bytes, "compacted", "removed"
+              and "evicted" counts
+    """
+    stats = {"before": 0, "after": 0, "compacted": 0, "removed": 0, "evicted": 0}
+    if not os.path.isdir(config.CACHE_DIR):
+        return stats
+
+    def store_bytes():
+        return sum(os.path.getsize(os.path.join(config.CACHE_DIR, f)) for f in os.listdir(config.CACHE_DIR))
+
+    with _store_lock():
+        stats["before"] = store_bytes()
+        if max_bytes is not None:
+            stats["evicted"] = len(enforce_budget(max_bytes))
+
+        for name in list(load_manifest()):
+            try:
+                stats["compacted"] += compact_entry(name)
+            except ValueError as e:
+                print(f"Dropping unreadable entry {name} ({e})")
+                delete_entry(name)
+
+        referenced = {MANIFEST_NAME, LOCK_NAME}
+        for name, info in load_manifest().items():
+            referenced.add(os.path.basename(_entry_path(name)))
+            referenced.update(info.get("segments", []))
+        for filename in os.listdir(config.CACHE_DIR):
+            if filename not in referenced:
+                os.remove(os.path.join(config.CACHE_DIR, filename))
+                stats["removed"] += 1
+        stats["after"] = store_bytes()
+    return stats
@@ -2,12 +2,20 @@
 Technical analysis calculations and formatting utilities.
 """
 import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 
 
 def compute_sma(series, period):
     """
     Compute Simple Moving Average.
 
+    Uses the vectorized compensated kernel (see _rolling_moments), which
+    agrees with the incremental path (IncrementalSMA) to within rounding.
+
     Args:
         series: pandas Series of prices
         period: number of periods for the moving average
@@ -15,7 +23,576 @@ def compute_sma(series, period):
     Returns:
         pandas Series with SMA values
     """
-    return series.rolling(window=period).mean()
+    means, _ = _rolling_moments(series.to_numpy(dtype=np.float64), period, variance=False)
+    return pd.Series(means, index=series.index, name=series.name)
+
+
+def _neumaier_add(total, compensation, value):
+    """Add value to a Neumaier-compensated sum; returns (total, compensation)."""
+    result = total + value
+    if abs(total) >= abs(value):
+        compensation += (total - result) + value
+    else:
+        compensation += (value - result) + total
+    return result, compensation
+
+
+class RollingStats:
+    """
+    Rolling mean, variance, min and max over a fixed window, one value at a time.
+
+    The window sum and sum of squares are Neumaier-compensated and taken
+    relative to a shift (the window mean at the last re-anchor), so large
+    prices do not cancel away the variance. Every ``anchor_every`` updates
+    both sums are re-anchored: recomputed exactly from the window with
+    math.fsum, which bounds the drift however long the series is. Min and
+    max come from monotonic deques, so every update is O(1) amortized.
+
+    Like pandas' rolling functions, values are NaN until the window is full
+    and while it holds a NaN.
+    """
+
+    def __init__(self, period, anchor_every=None):
+        """
+        Args:
+            period: window length
+            anchor_every: updates between re-anchors (default: period)
+        """
+        self.period = period
+        self.anchor_every = anchor_every or period
+        self.count = 0
+        self._values = [0.0] * period
+        self._next = 0  # slot the next value is written to
+        self._nans = 0
+        self._seen = 0
+        self._shift = 0.0
+        self._sum = self._sum_c = 0.0
+        self._sq = self._sq_c = 0.0
+        self._since_anchor = 0
+        self._min = deque()  # (position, value), values increasing
+        self._max = deque()  # (position, value), values decreasing
+
+    @property
+    def ready(self):
+        """Whether the window is full and holds no NaN."""
+        return self.count == self.period and self._nans == 0
+
+    def update(self, value):
+        """
+        Push the next value, dropping the oldest one once the window is full.
+
+        Args:
+            value: next value of the series
+        """
+        value = float(value)
+        if self.count == self.period:
+            old = self._values[self._next]
+            if math.isnan(old):
+                self._nans -= 1
+            else:
+                delta = old - self._shift
+                self._sum, self._sum_c = _neumaier_add(self._sum, self._sum_c, -delta)
+                self._sq, self._sq_c = _neumaier_add(self._sq, self._sq_c, -delta * delta)
+        else:
+            self.count += 1
+
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.period
+        position = self._seen
+        self._seen += 1
+
+        if math.isnan(value):
+            self._nans += 1
+        else:
+            delta = value - self._shift
+            self._sum, self._sum_c = _neumaier_add(self._sum, self._sum_c, delta)
+            self._sq, self._sq_c = _neumaier_add(self._sq, self._sq_c, delta * delta)
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((position, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((position, value))
+
+        expired = position - self.period
+        while self._min and self._min[0][0] <= expired:
+            self._min.popleft()
+        while self._max and self._max[0][0] <= expired:
+            self._max.popleft()
+
+        self._since_anchor += 1
+        if self._since_anchor >= self.anchor_every:
+            self._reanchor()
+
+    def _reanchor(self):
+        """Recompute both sums exactly from the window, around its current mean."""
+        values = [v for v in self.window() if not math.isnan(v)]
+        self._shift = math.fsum(values) / len(values) if values else 0.0
+        deltas = [v - self._shift for v in values]
+        self._sum, self._sum_c = math.fsum(deltas), 0.0
+        self._sq, self._sq_c = math.fsum(d * d for d in deltas), 0.0
+        self._since_anchor = 0
+
+    def window(self):
+        """Values in the window, oldest first."""
+        if self.count < self.period:
+            return self._values[:self.count]
+        return self._values[self._next:] + self._values[:self._next]
+
+    @property
+    def mean(self):
+        """Window mean, NaN if not ready."""
+        if not self.ready:
+            return math.nan
+        return self._shift + (self._sum + self._sum_c) / self.period
+
+    @property
+    def var(self):
+        """Sample variance of the window (ddof=1), NaN if not ready."""
+        if not self.ready or self.period < 2:
+            return math.nan
+        total = self._sum + self._sum_c
+        squares = self._sq + self._sq_c
+        return max(0.0, (squares - total * total / self.period) / (self.period - 1))
+
+    @property
+    def min(self):
+        """Window minimum, NaN if not ready."""
+        return self._min[0][1] if self.ready else math.nan
+
+    @property
+    def max(self):
+        """Window maximum, NaN if not ready."""
+        return self._max[0][1] if self.ready else math.nan
+
+
+def _compensated_prefix(values):
+    """
+    Prefix sums along the last axis, each corrected by its running rounding error.
+
+    The error of every cumsum step is recovered exactly (TwoSum) and summed
+    back in, so the prefix sums are as accurate as a compensated loop.
+
+    Returns:
+        ndarray: sums with a leading 0 column, one longer than values
+    """
+    out = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,), dtype=np.float64)
+    sums, prev = out[..., 1:], out[..., :-1]
+    np.cumsum(values, axis=-1, out=sums)
+    back = sums - prev
+    errors = sums - back
+    np.subtract(prev, errors, out=errors)
+    np.subtract(values, back, out=back)
+    errors += back
+    np.cumsum(errors, axis=-1, out=errors)
+    sums += errors
+    return out
+
+
+def _rolling_moments(values, period, anchor_every=None, variance=True):
+    """
+    Rolling mean and (optionally) sample variance, vectorized.
+
+    Outputs are computed in blocks of ``anchor_every`` rows. Each block is
+    re-anchored like RollingStats: its values are taken relative to the mean
+    of the first window in the block, and the window sums are differenced
+    from compensated prefix sums of those deltas, so the error is bounded
+    however long the series is.
+
+    Returns:
+        tuple: (mean, var) float64 arrays, NaN where the window is not full
+               or holds a NaN; var is None unless ``variance`` is set
+    """
+    values = np.asarray(values, dtype=np.float64)
+    anchor_every = anchor_every or period
+    n = len(values)
+    mean = np.full(n, np.nan, dtype=np.float64)
+    var = np.full(n, np.nan, dtype=np.float64) if variance else None
+    if n < period:
+        return mean, var
+
+    nans = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.isnan(values), out=nans[1:])
+    ready = nans[period:] == nans[:-period]
+
+    # One row per block: the period - 1 values before its first output, then its outputs
+    starts = np.arange(period - 1, n, anchor_every)
+    columns = np.arange(period - 1 + anchor_every)
+    rows = values[np.minimum(starts[:, None] - (period - 1) + columns, n - 1)]
+
+    first = rows[:, :period]
+    finite = ~np.isnan(first)
+    shift = np.where(finite, first, 0.0).sum(axis=1) / np.maximum(finite.sum(axis=1), 1)
+    deltas = rows - shift[:, None]
+    deltas[np.isnan(deltas)] = 0.0
+
+    outputs = n - period + 1
+    sums = _compensated_prefix(deltas)
+    total = (sums[:, period:] - sums[:, :-period]).ravel()[:outputs]
+    shift = np.repeat(shift, anchor_every)[:outputs]
+    mean[period - 1:] = np.where(ready, shift + total / period, np.nan)
+
+    if variance and period > 1:
+        squares = _compensated_prefix(deltas * deltas)
+        sq = (squares[:, period:] - squares[:, :-period]).ravel()[:outputs]
+        spread = np.maximum(0.0, (sq - total * total / period) / (period - 1))
+        var[period - 1:] = np.where(ready, spread, np.nan)
+    return mean, var
+
+
+def rolling_stats(values, period, anchor_every=None):
+    """
+    Rolling mean, variance, min and max of a whole array.
+
+    Mean and variance come from the re-anchored compensated prefix sums of
+    _rolling_moments and agree with feeding the values to RollingStats one
+    at a time to within rounding. Min and max are reduced over a sliding
+    window view.
+
+    Args:
+        values: 1-D array of values
+        period: window length
+        anchor_every: rows per re-anchored block (default: period)
+
+    Returns:
+        dict: "mean", "var", "min" and "max" float64 arrays, NaN where the
+              window is not full or holds a NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mean, var = _rolling_moments(values, period, anchor_every)
+    low = np.full(len(values), np.nan, dtype=np.float64)
+    high = np.full(len(values), np.nan, dtype=np.float64)
+    if len(values) >= period:
+        windows = sliding_window_view(values, period)
+        # NaN propagates through min/max, matching the not-ready windows
+        low[period - 1:] = windows.min(axis=1)
+        high[period - 1:] = windows.max(axis=1)
+    return {"mean": mean, "var": var, "min": low, "max": high}
+
+
+def compute_sma_matrix(prices, periods):
+    """
+    Simple moving averages for many periods at once.
+
+    Every row is differenced from one prefix-sum array (taken around the
+    first finite price to keep the sums small), so a sweep over p periods
+    costs one cumulative sum and O(n·p) arithmetic into a single
+    preallocated matrix instead of p rolling passes.
+
+    Args:
+        prices: 1-D array (or Series) of prices
+        periods: iterable of window lengths, e.g. range(50, 301)
+
+    Returns:
+        ndarray: float64 matrix of shape (len(periods), len(prices)); row i
+                 is the SMA for periods[i], NaN where the window is not full
+                 or holds a NaN
+
+    Raises:
+        ValueError: if a period is not a positive integer
+    """
+    values = np.asarray(prices, dtype=np.float64)
+    periods = [int(p) for p in periods]
+    if any(p < 1 for p in periods):
+        raise ValueError(f"SMA periods must be positive, got {periods}")
+
+    n = len(values)
+    missing = np.isnan(values)
+    finite = values[~missing]
+    shift = finite[0] if len(finite) else 0.0
+
+    sums = np.zeros(n + 1, dtype=np.float64)
+    np.cumsum(np.where(missing, 0.0, values - shift), out=sums[1:])
+    nans = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(missing, out=nans[1:])
+
+    out = np.full((len(periods), n), np.nan, dtype=np.float64)
+    for row, p in enumerate(periods):
+        if p > n:
+            continue
+        window = out[row, p - 1:]
+        np.subtract(sums[p:], sums[:-p], out=window)
+        window /= p
+        window += shift
+        window[nans[p:] != nans[:-p]] = np.nan
+    return out
+
+
+def hysteresis_positions(prices, buy_levels, sell_levels, invested=False):
+    """
+    Run the BUY/SELL state machine over whole arrays.
+
+    CASH switches to TQQQ on a close at or above the buy level, TQQQ
+    switches back to CASH on a close at or below the sell level, and every
+    other bar keeps the position. Since a trigger only ever moves toward its
+    own side, the position after a bar is the side of the most recent
+    trigger, so it is a forward fill of trigger events instead of a
+    per-bar loop.
+
+    A bar where both triggers fire (buy level at or below the sell level)
+    or a level is NaN triggers nothing.
+
+    Args:
+        prices: 1-D array of closes
+        buy_levels: buy threshold for each bar
+        sell_levels: sell threshold for each bar
+        invested: position before the first bar (True for TQQQ)
+
+    Returns:
+        tuple: (held, trades) - bool array, True where the position after
+               the bar is TQQQ, and int array of the bars where the position
+               changed (a BUY where held is True, a SELL otherwise)
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    buy = prices >= np.asarray(buy_levels, dtype=np.float64)
+    sell = prices <= np.asarray(sell_levels, dtype=np.float64)
+
+    triggered = buy != sell
+    last = np.where(triggered, np.arange(len(prices)), -1)
+    np.maximum.accumulate(last, out=last)
+    held = np.where(last >= 0, buy[np.maximum(last, 0)], bool(invested))
+
+    before = np.concatenate(([bool(invested)], held[:-1]))
+    return held, np.flatnonzero(held != before)
+
+
+def trigger_price(window, multiplier):
+    """
+    Next-session close that lands exactly on multiplier × SMA.
+
+    The next SMA drops the oldest close of the window and includes the new
+    close X itself, so the level moves with X. With S the sum of the newest
+    period-1 closes, X = m·(S + X)/period solves to X = m·S / (period - m).
+    A close at or above the BUY trigger (at or below the SELL trigger)
+    fires the signal.
+
+    Args:
+        window: the last ``period`` closes, oldest first
+        multiplier: threshold multiplier (e.g. config.BUY_MULTIPLIER)
+
+    Returns:
+        float: trigger price for the next session
+    """
+    window = np.asarray(window, dtype=np.float64)
+    period = len(window)
+    return float(multiplier * math.fsum(window[1:]) / (period - multiplier))
+
+
+def trigger_price_table(window, multipliers, sessions=5, paths=1000, seed=0):
+    """
+    Trigger prices for each of the next sessions under assumed price paths.
+
+    The trigger on session k depends on the closes of sessions 1..k-1, so
+    it is evaluated along three paths for those closes:
+     - ``flat``: every close equals the last one
+     - ``drift``: closes grow at the window's mean daily log return
+     - ``bootstrap``: median over ``paths`` paths of daily log returns
+       resampled from the window
+
+    Everything is computed once, as array arithmetic on the window's suffix
+    sums and the paths' prefix sums, so answering "what price triggers on
+    session k" is a lookup.
+
+    Args:
+        window: the last ``period`` closes (at least two), oldest first
+        multipliers: dict of name -> multiplier, e.g. {"buy": 1.05, "sell": 0.97}
+        sessions: number of sessions ahead (at most ``period``)
+        paths: number of bootstrap paths
+        seed: random seed for the bootstrap (fixed so output is repeatable)
+
+    Returns:
+        dict: scenario ("flat", "drift", "bootstrap") -> dict of name ->
+              float64 array of trigger prices for sessions 1..sessions
+    """
+    window = np.asarray(window, dtype=np.float64)
+    period = len(window)
+    sessions = min(sessions, period)
+    last = window[-1]
+
+    # Closes of the window still inside the SMA on session k: window[k:]
+    suffix = np.concatenate((np.cumsum(window[::-1])[::-1], [0.0]))
+    kept = suffix[1:sessions + 1]
+
+    log_returns = np.diff(np.log(window))
+    steps = np.arange(1, sessions)
+    rng = np.random.default_rng(seed)
+    sampled = rng.choice(log_returns, size=(paths, sessions - 1))
+    scenarios = {
+        "flat": np.full((1, sessions - 1), last),
+        "drift": last * np.exp(log_returns.mean() * steps)[None, :],
+        "bootstrap": last * np.exp(np.cumsum(sampled, axis=1)),
+    }
+
+    table = {}
+    for scenario, closes in scenarios.items():
+        # Sum of the assumed closes before session k (none before session 1)
+        added = np.concatenate((np.zeros((len(closes), 1)), np.cumsum(closes, axis=1)), axis=1)
+        table[scenario] = {
+            name: np.median(m * (kept + added) / (period - m), axis=0)
+            for name, m in multipliers.items()
+        }
+    return table
+
+
+class IncrementalSMA(RollingStats):
+    """
+    Simple moving average updated one bar at a time.
+
+    A RollingStats window (ring buffer plus compensated running sum) that
+    also remembers the date of its newest bar, so it can be saved with the
+    position state (``to_dict``) and the next run only feeds the bars that
+    arrived since (``sync``). Each new bar costs O(1).
+    """
+
+    def __init__(self, period):
+        """
+        Args:
+            period: number of periods for the moving average
+        """
+        super().__init__(period)
+        self.last_date = None
+
+    @property
+    def value(self):
+        """Current SMA, or None until ``period`` prices have been seen."""
+        return self.mean if self.ready else None
+
+    def update(self, price, date=None):
+        """
+        Add the next bar, dropping the oldest one once the window is full.
+
+        Args:
+            price: closing price of the new bar
+            date: date of the new bar
+
+        Returns:
+            float: the updated SMA, or None if the window is not full yet
+        """
+        super().update(price)
+        if date is not None:
+            self.last_date = pd.Timestamp(date)
+        return self.value
+
+    def prices(self):
+        """Prices in the window, oldest first."""
+        return self.window()
+
+    def to_dict(self):
+        """
+        Serialize the window for the state file.
+
+        Returns:
+            dict: period, date of the newest bar ("YYYY-MM-DD") and the
+                  prices in the window, oldest first
+        """
+        return {
+            "period": self.period,
+            "last_date": self.last_date.strftime("%Y-%m-%d") if self.last_date is not None else None,
+            "prices": self.prices(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Restore a window saved by ``to_dict``.
+
+        The running sum is re-anchored (recomputed exactly) from the saved
+        prices, so rounding error never carries over from one run to the next.
+
+        Raises:
+            ValueError: if the saved window is malformed
+        """
+        try:
+            period = int(data["period"])
+            prices = [float(price) for price in data["prices"]]
+            last_date = pd.Timestamp(data["last_date"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid SMA state: {e}") from e
+        if period <= 0 or len(prices) > period or not all(math.isfinite(p) for p in prices):
+            raise ValueError("Invalid SMA state: window does not match its period")
+        if pd.isna(last_date):
+            raise ValueError("Invalid SMA state: no date for the newest bar")
+
+        sma = cls(period)
+        for price in prices:
+            sma.update(price)
+        sma._reanchor()
+        sma.last_date = last_date
+        return sma
+
+    @classmethod
+    def from_history(cls, series, period):
+        """
+        Build the window from the last ``period`` bars of a price series.
+
+        Args:
+            series: pandas Series of prices with a sorted DatetimeIndex
+            period: number of periods for the moving average
+
+        Returns:
+            IncrementalSMA: window ending at the last bar of series
+        """
+        sma = cls(period)
+        for date, price in series.iloc[-period:].items():
+            sma.update(price, date)
+        return sma
+
+    @classmethod
+    def sync(cls, state, series, period):
+        """
+        Bring a saved window up to the end of a price series.
+
+        Only the bars after the saved window's newest bar are fed in. The
+        window is rebuilt from series instead when the saved state is
+        missing or malformed, was built for another period, is not full,
+        ends on a date series does not have, or no longer matches the
+        series bars it covers (e.g. after a dividend re-adjustment of the
+        history or a revision of any bar in the window).
+
+        Args:
+            state: dict from ``to_dict`` or None
+            series: pandas Series of prices with a sorted DatetimeIndex
+            period: number of periods for the moving average
+
+        Returns:
+            IncrementalSMA: window ending at the last bar of series
+        """
+        try:
+            sma = cls.from_dict(state) if state else None
+        except ValueError:
+            sma = None
+        new_bars = sma._bars_after(series) if sma is not None and sma.period == period else None
+        if new_bars is None:
+            return cls.from_history(series, period)
+
+        for date, price in new_bars.items():
+            sma.update(price, date)
+        return sma
+
+    def _bars_after(self, series):
+        """
+        Bars of series after the newest bar in the window.
+
+        The whole window is compared with the matching bars of series, so
+        a revision of any bar in it forces a rebuild.
+
+        Returns:
+            Series: the new bars, or None if the window does not line up
+                    with series (or rebuilding would be as cheap)
+        """
+        if self.count < self.period or self.last_date is None:
+            return None
+        pos = series.index.searchsorted(self.last_date)
+        if pos < self.period - 1 or pos >= len(series) or series.index[pos] != self.last_date:
+            return None
+        # Any bar of the window may have been revised, not just the newest
+        history = series.iloc[pos - self.period + 1:pos + 1].to_numpy(dtype=np.float64)
+        if not np.allclose(history, self.window(), rtol=1e-9, atol=0.0):
+            return None
+        new_bars = series.iloc[pos + 1:]
+        if len(new_bars) >= self.period:
+            return None
+        return new_bars
 
 
 def pct_distance(current, target):
@@ -51,3 +628,38 @@ def format_pct(val):
         return "N/A"
     return f"{val:+.2f}%"
 
+
+def pct_distance_array(current, target):
+    """
+    Vectorized pct_distance over whole arrays.
+
+    Args:
+        current: array of current values
+        target: array of target values (or a scalar)
+
+    Returns:
+        ndarray: float64 percentage distances, NaN where pct_distance would
+                 return None (current is 0 or either value is NaN)
+    """
+    current = np.asarray(current, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    valid = (current != 0) & ~np.isnan(current) & ~np.isnan(target)
+    ratio = np.divide(target, current, out=np.full(np.broadcast(current, target).shape, np.nan), where=valid)
+    return (ratio - 1) * 100.0
+
+
+def format_pct_array(values, na="N/A", prefix=""):
+    """
+    format_pct over a whole array, e.g. for hover or CSV text.
+
+    Args:
+        values: array of percentage values (None and NaN are missing)
+        na: text for missing values
+        prefix: text put before every formatted (non-missing) value
+
+    Returns:
+        ndarray: strings like "+5.50%", ``na`` where the value is missing
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # One pass over Python floats; x != x is the NaN test
+    return np.array([na if x != x else f"{prefix}{x:+.2f}%" for x in values.tolist()])
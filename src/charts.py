@@ -5,6 +5,7 @@ import pandas as pd
 import numpy as np
 
 from . import config
+from .calculations import format_pct_array, pct_distance_array
 
 
 def plot_ascii_chart(df, width=60, height=20):
@@ -21,11 +22,6 @@ def plot_ascii_chart(df, width=60, height=20):
 
     # Get data for chart
     data = df[['adj_close', 'sma200']].copy()
-
-    # Flatten any multi-level columns if present
-    if isinstance(data.columns, pd.MultiIndex):
-        data.columns = data.columns.get_level_values(0)
-
     data['buy_level'] = data['sma200'] * config.BUY_MULTIPLIER
     data['sell_level'] = data['sma200'] * config.SELL_MULTIPLIER
     data = data.dropna(subset=['sma200', 'buy_level', 'sell_level'])
@@ -33,15 +29,8 @@ def plot_ascii_chart(df, width=60, height=20):
     if len(data) == 0:
         return
 
-    # Get min/max for scaling - flatten all values and find min/max
-    value_arrays = [
-        data['adj_close'].values.flatten(),
-        data['sma200'].values.flatten(),
-        data['buy_level'].values.flatten(),
-        data['sell_level'].values.flatten()
-    ]
-
-    all_values = np.concatenate(value_arrays)
+    # Get min/max for scaling
+    all_values = data[['adj_close', 'sma200', 'buy_level', 'sell_level']].to_numpy(dtype=float).ravel()
     all_values = all_values[~np.isnan(all_values)]  # Remove NaN values
 
     if len(all_values) == 0:
@@ -66,19 +55,13 @@ def plot_ascii_chart(df, width=60, height=20):
         """Scale value to chart height"""
         return int((height - 1) * (1 - (value - min_val) / val_range))
 
-    # Helper to safely get scalar value from row item (might be Series or scalar)
-    def get_val(val):
-        if isinstance(val, pd.Series):
-            return val.iloc[0] if len(val) > 0 else np.nan
-        return val
-
     # Plot lines (showing QQQ price, thresholds and SMA)
     for i, (idx, row) in enumerate(sampled_data.iterrows()):
         if i >= width:
             break
 
         # Plot SMA200 first (so it can be overwritten by other symbols)
-        sma_val = get_val(row['sma200'])
+        sma_val = row['sma200']
         if not pd.isna(sma_val):
             y_sma = scale_y(sma_val)
             if 0 <= y_sma < height:
@@ -86,7 +69,7 @@ def plot_ascii_chart(df, width=60, height=20):
                     chart[y_sma][i] = '─'
 
         # Plot buy threshold
-        buy_val = get_val(row['buy_level'])
+        buy_val = row['buy_level']
         if not pd.isna(buy_val):
             y_buy = scale_y(buy_val)
             if 0 <= y_buy < height:
@@ -94,7 +77,7 @@ def plot_ascii_chart(df, width=60, height=20):
                     chart[y_buy][i] = '+'
 
         # Plot sell threshold
-        sell_val = get_val(row['sell_level'])
+        sell_val = row['sell_level']
         if not pd.isna(sell_val):
             y_sell = scale_y(sell_val)
             if 0 <= y_sell < height:
@@ -102,7 +85,7 @@ def plot_ascii_chart(df, width=60, height=20):
                     chart[y_sell][i] = '-'
 
         # Plot QQQ price (last so it appears on top)
-        qqq_val = get_val(row['adj_close'])
+        qqq_val = row['adj_close']
         if not pd.isna(qqq_val):
             y_qqq = scale_y(qqq_val)
             if 0 <= y_qqq < height:
@@ -193,11 +176,6 @@ def generate_interactive_chart(df, filename=None):
 
     # Prepare data
     data = df[['adj_close', 'sma200']].copy()
-
-    # Flatten columns if needed
-    if isinstance(data.columns, pd.MultiIndex):
-        data.columns = data.columns.get_level_values(0)
-
     data['buy_level'] = data['sma200'] * config.BUY_MULTIPLIER
     data['sell_level'] = data['sma200'] * config.SELL_MULTIPLIER
     data = data.dropna()
@@ -242,6 +220,9 @@ def generate_interactive_chart(df, filename=None):
         showlegend=True
     ))
 
+    # Percentage distance from SMA for the hover text, formatted for all bars at once
+    pct_from_sma = pct_distance_array(data['sma200'].to_numpy(), data['adj_close'].to_numpy())
+
     # Add QQQ price
     fig.add_trace(go.Scatter(
         x=data.index,
@@ -250,14 +231,10 @@ def generate_interactive_chart(df, filename=None):
         name='QQQ Price',
         line=dict(color='rgba(0, 0, 0, 0.9)', width=2.5),
         hovertemplate='<b>QQQ Price</b><br>Date: %{x}<br>Price: $%{y:.2f}<br>%{text}',
-        text=[f"vs SMA: {((p/s - 1) * 100):+.2f}%" if not pd.isna(s) and s > 0 else ""
-              for p, s in zip(data['adj_close'], data['sma200'])],
+        text=format_pct_array(pct_from_sma, na="", prefix="vs SMA: "),
         showlegend=True
     ))
 
-    # Calculate percentage distance from SMA
-    pct_from_sma = ((data['adj_close'] / data['sma200']) - 1) * 100
-
     # Highlight buy/sell zones with vertical rectangles
     # Find periods where price crosses thresholds
     buy_signals = (data['adj_close'] >= data['buy_level']).astype(int).diff() == 1
@@ -1,6 +1,7 @@
 """
 Configuration and constants for the TQQQ SMA trading system.
 """
+import os
 
 # ========== TRADING PARAMETERS ==========
 QQQ_SYMBOL = "QQQ"
@@ -9,6 +10,10 @@ TQQQ_SYMBOL = "TQQQ"
 SMA_PERIOD = 200
 BUY_MULTIPLIER = 1.05   # +5% vs sma200
 SELL_MULTIPLIER = 0.97  # -3% vs sma200
+# Next-session trigger prices are tabulated this many sessions ahead
+# (flat, drift and bootstrap paths; 0 prints only the next session)
+TRIGGER_SESSIONS = 5
+TRIGGER_BOOTSTRAP_PATHS = 1000
 
 # Manual position override - Set this to override the saved position state
 # Options: "CASH", "TQQQ", or None (to use saved state from position_state.json)
@@ -17,21 +22,106 @@ SELL_MULTIPLIER = 0.97  # -3% vs sma200
 #          If you want to use the saved state, set MANUAL_POSITION = None
 MANUAL_POSITION = None
 
+# ========== DATA SOURCE ==========
+# Market data provider (see src/providers.py):
+#   "yfinance"  - live Yahoo Finance data (default)
+#   "local"     - replay <SYMBOL>.csv / <SYMBOL>.bars files from LOCAL_DATA_DIR
+#   "synthetic" - deterministic generated bars (offline benchmarks and tests)
+# Can be overridden with the TQQQ_DATA_PROVIDER environment variable
+DATA_PROVIDER = os.environ.get("TQQQ_DATA_PROVIDER", "yfinance")
+LOCAL_DATA_DIR = os.environ.get("TQQQ_LOCAL_DATA_DIR", "data/replay")
+SYNTHETIC_SEED = 42
+SYNTHETIC_START = "2000-01-03"  # earlier start = more bars per symbol
+
 # ========== FILE PATHS ==========
-DATA_DIR = "data"
-STATE_FILE = "data/position_state.json"
-SIGNAL_LOG_CSV = "data/signals_log.csv"
-CACHE_FILE = "data/market_data_cache.pkl"
-INTERACTIVE_CHART_FILENAME = "data/tqqq_sma_chart.html"
+# Offline providers write to their own directory so replay and synthetic runs
+# never overwrite the committed cache, chart or position state
+DATA_DIR = "data" if DATA_PROVIDER == "yfinance" else os.path.join("data", "offline", DATA_PROVIDER)
+STATE_FILE = os.path.join(DATA_DIR, "position_state.json")
+SIGNAL_LOG_CSV = os.path.join(DATA_DIR, "signals_log.csv")
+CACHE_DIR = os.path.join(DATA_DIR, "market_data_cache")   # one columnar file per entry + manifest.json
+INTERACTIVE_CHART_FILENAME = os.path.join(DATA_DIR, "tqqq_sma_chart.html")
+# Precomputed NYSE sessions (regenerate with: uv run market-calendar build)
+MARKET_CALENDAR_FILE = "data/market_calendar.npz"
+# Cache entries are split into immutable segments of this many rows plus a
+# small hot tail, so a daily update only rewrites the tail file
+CACHE_SEGMENT_ROWS = 64
+# More segments than this are compacted into one on the next write
+CACHE_MAX_SEGMENTS = 16
+# Byte budget for the whole cache; least recently read entries are evicted
+# beyond it (e.g. symbols from a one-off backtest). QQQ + TQQQ use ~45KB.
+CACHE_MAX_BYTES = 5 * 1024 * 1024
 
 # ========== DATA FETCHING ==========
 HISTORY_YEARS = 3       # years of data to fetch for reliable SMA
                         # Note: Actual fetch is 5 years (for chart) but signals use 3 years
                         # This reduces API calls. If rate limiting occurs, the cache
                         # file persists data between runs in GitHub Actions.
-# Cache expires after market close (4 PM ET / 9 PM UTC)
+CHART_HISTORY_YEARS = 5 # years of QQQ fetched for the signal and the charts
+BACKTEST_START = "2010-02-11"   # TQQQ inception; history used by the backtest
+# Cache expires at the last session close from the NYSE calendar
+# (4 PM ET, 1 PM ET on early-close days; holidays and weekends keep the cache)
 # Cache file is reused in GitHub Actions to minimize Yahoo Finance API calls
 
+# Exit before any network access when today is not a trading session
+# (weekends, exchange holidays). Enabled in CI via TQQQ_SKIP_NON_SESSION_DAYS=1
+SKIP_NON_SESSION_DAYS = os.environ.get("TQQQ_SKIP_NON_SESSION_DAYS", "0") == "1"
+
+# Stale-while-revalidate: when the cache is stale, print a provisional signal
+# from the cached bars immediately and refresh in the background; the final
+# signal (and any state change) follows once the refresh completes.
+#   True / False, or "auto" = only when stdout is a terminal (off in CI)
+STALE_WHILE_REVALIDATE = "auto"
+
+# When the cache is stale, download only the bars after the last cached date
+# and append them instead of re-downloading the whole window
+INCREMENTAL_FETCH = True
+# Downloaded bars moving more than this fraction in one session are reported
+# as possible bad ticks (they are kept; missing/zero prices are dropped)
+SPIKE_THRESHOLD = 0.5
+
+# Bars at the end of the cache that an incremental download fetches again.
+# Yahoo re-adjusts the whole adj_close history after every dividend; when the
+# overlapping bars differ from the cache by one constant factor while the raw
+# close is unchanged, the cached history is rescaled instead of refetched.
+INCREMENTAL_OVERLAP_BARS = 5
+# Relative tolerance when checking the overlapping bars against the cache.
+# Any other mismatch (revised prices, splits) triggers a full refetch.
+INCREMENTAL_OVERLAP_RTOL = 1e-5
+
+# Request pacing: token bucket shared by all fetches in a process
+# (replaces fixed sleeps between symbols and before fallbacks)
+REQUESTS_PER_SECOND = 1.0
+REQUEST_BURST = 2
+# Bucket state shared by all processes on the host (not committed)
+RATE_LIMIT_FILE = os.path.join(DATA_DIR, "rate_limit_state.json")
+# Seconds every process waits after Yahoo answers with HTTP 429
+RATE_LIMIT_COOLDOWN = 60
+# Circuit breaker on the Yahoo endpoint, remembered across runs (committed by CI).
+# After CIRCUIT_FAILURE_THRESHOLD consecutive transport/HTTP errors (or one 429) no
+# requests are sent for CIRCUIT_COOLDOWN seconds and runs use cached bars; then a
+# single probe decides, and every failed probe doubles the cooldown up to the max.
+CIRCUIT_BREAKER_FILE = os.path.join(DATA_DIR, "circuit_breaker.json")
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 30 * 60
+CIRCUIT_MAX_COOLDOWN = 6 * 60 * 60
+# Symbols fetched concurrently by fetch_adj_close_many
+FETCH_MAX_WORKERS = 4
+# Download symbols missing from the cache with one multi-ticker request
+BATCH_FETCH = True
+# Start the next fallback interval in parallel when a full-window download
+# has not answered within HEDGE_DELAY seconds; the first valid result wins
+HEDGED_FETCH = True
+HEDGE_DELAY = 20
+
+# ========== RUN DEADLINE ==========
+# Upper bound on the wall time of one tqqq-sma run (seconds), so a hung request,
+# chart or SMTP login cannot keep the CI job running until it is killed
+RUN_DEADLINE = float(os.environ.get("TQQQ_RUN_DEADLINE", "300"))
+# Relative share of the remaining time given to each stage, in run order.
+# Time a stage does not use carries over to the later ones.
+STAGE_BUDGETS = {"fetch": 0.6, "compute": 0.1, "chart": 0.2, "notify": 0.1}
+
 # ========== VISUALIZATION ==========
 # Whether to print ASCII chart of last 6 months with buy/sell levels
 PRINT_CHART = True
@@ -50,4 +140,6 @@ EMAIL_ALERT = {
     "from_addr": "your.email@example.com",
     "to_addrs": ["your.email@example.com"],
 }
+# Seconds before an unresponsive SMTP connect/login/send is given up
+SMTP_TIMEOUT = 20
 
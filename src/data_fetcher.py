@@ -1,193 +1,1375 @@
 """
 Market data fetching with caching and retry logic.
 """
+import json
 import os
-import pickle
+import threading
 import time
-from datetime import datetime, timezone, timedelta
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
 import pandas as pd
-import yfinance as yf
 
-from . import config
+from . import bar_store, config, market_calendar
+from .providers import get_provider
+
+try:
+    import fcntl
+except ImportError:  # Windows: the state file is shared without locking
+    fcntl = None
+
+# Coverage marker for entries fetched with period="max"
+FULL_HISTORY = "max"
+# Columns kept in the cache: the full OHLCV record, so later indicators never
+# download the same bars twice. The raw close is also used to tell dividend
+# re-adjustments of adj_close from real price revisions.
+STORED_COLUMNS = ["adj_close", "close", "open", "high", "low", "volume"]
 
 
 def get_last_market_close():
     """
-    Get the timestamp of the last market close (4 PM ET / 9 PM UTC).
+    Get the timestamp of the last session close from the NYSE calendar.
+
+    Accounts for DST (20:00 or 21:00 UTC), exchange holidays and early
+    closes, so cached data stays valid over weekends and holidays.
 
     Returns:
-        datetime: timestamp of last market close
+        datetime: timestamp of last market close (UTC)
     """
-    now_utc = datetime.now(timezone.utc)
-
-    # Market close is at 4 PM ET = 9 PM UTC (21:00)
-    # Adjust for today or yesterday based on current time
-    today_close = now_utc.replace(hour=21, minute=0, second=0, microsecond=0)
-
-    # If it's currently before 9 PM UTC, use yesterday's close
-    if now_utc.hour < 21:
-        today_close = today_close - timedelta(days=1)
-
-    # Handle weekends - go back to Friday's close
-    # Monday=0, Sunday=6
-    while today_close.weekday() >= 5:  # Saturday=5, Sunday=6
-        today_close = today_close - timedelta(days=1)
-
-    return today_close
+    return market_calendar.last_close(datetime.now(timezone.utc))
 
 
-def load_cache():
+def load_cache(keys=None, columns=None):
     """
     Load cached market data if available and not expired (based on market close).
 
+    Each entry carries its own timestamp in the bar store manifest, so entries
+    refreshed after the last market close are returned even if other entries
+    are stale. Only the requested entries are read from disk.
+
+    Args:
+        keys: optional list of cache keys to load (default: all entries)
+        columns: optional list of columns to load (default: all stored columns)
+
     Returns:
         dict: cached data or None if cache is invalid/expired
     """
-    if not os.path.exists(config.CACHE_FILE):
+    try:
+        manifest = bar_store.load_manifest()
+    except Exception as e:
+        print(f"Cache load error: {e}, fetching fresh data...")
         return None
 
-    try:
-        with open(config.CACHE_FILE, 'rb') as f:
-            cache_data = pickle.load(f)
-
-        # Check if cache is expired based on market close time
-        cache_time = cache_data.get('timestamp')
-        if cache_time:
-            last_market_close = get_last_market_close()
-
-            # Cache is valid only if it was created AFTER the last market close
-            if cache_time >= last_market_close:
-                age = datetime.now(timezone.utc) - cache_time
-                print(f"Using cached data from today (age: {age.seconds // 3600}h {(age.seconds % 3600) // 60}m)")
-                return cache_data.get('data')
-            else:
-                print(f"Cache is from before last market close, fetching fresh data...")
-                return None
+    if keys is not None:
+        manifest = {key: info for key, info in manifest.items() if key in keys}
+    if not manifest:
+        return None
 
+    # An entry is valid only if it was written AFTER the last market close
+    last_market_close = get_last_market_close()
+    fresh_keys = []
+    for key, info in manifest.items():
+        updated = bar_store.entry_updated(info)
+        if updated is not None and updated >= last_market_close:
+            fresh_keys.append(key)
+    if not fresh_keys:
+        print(f"Cache is from before last market close, fetching fresh data...")
         return None
+
+    fresh = {}
+    for key in fresh_keys:
+        try:
+            fresh[key] = _read_entry(key, columns)
+        except Exception as e:
+            print(f"Cache load error for {key}: {e}, fetching fresh data...")
+    fresh = {key: df for key, df in fresh.items() if df is not None}
+    if not fresh:
+        return None
+
+    cache_time = max(bar_store.entry_updated(manifest[key]) for key in fresh)
+    age = datetime.now(timezone.utc) - cache_time
+    print(f"Using cached data from today (age: {age.seconds // 3600}h {(age.seconds % 3600) // 60}m)")
+    return fresh
+
+
+def load_stale_entry(cache_key, columns=None):
+    """
+    Load a cached entry regardless of its age.
+
+    Used as the base for incremental updates: a stale series still holds
+    all history up to its last bar, so only newer bars need downloading.
+
+    Args:
+        cache_key: cache key (ticker symbol)
+        columns: optional list of columns to load (default: all stored columns)
+
+    Returns:
+        DataFrame: cached entry or None if not cached
+    """
+    try:
+        return _read_entry(cache_key, columns)
     except Exception as e:
-        print(f"Cache load error: {e}, fetching fresh data...")
+        print(f"Cache load error for {cache_key}: {e}")
         return None
 
 
-def save_cache(data):
+def _read_entry(cache_key, columns=None):
+    """
+    Read one cache entry, dropping it if it fails validation.
+
+    A truncated or corrupted file only costs a refetch of that one symbol;
+    the other entries stay valid. Only the requested columns are mapped,
+    and each successful read is recorded for LRU eviction.
+    """
+    try:
+        df = bar_store.read_frame(cache_key, columns=columns)
+    except bar_store.CorruptEntryError as e:
+        print(f"Cache entry for {cache_key} failed validation ({e}), refetching {cache_key} only...")
+        bar_store.delete_entry(cache_key)
+        return None
+    if df is not None:
+        bar_store.touch(cache_key)
+    return df
+
+
+def save_cache(data, coverage=None):
     """
     Save market data to cache.
 
+    Each entry in ``data`` is written to its own columnar file and stamped
+    with the current time; other entries in the store are left untouched
+    unless the store exceeds ``config.CACHE_MAX_BYTES``, in which case the
+    least recently used entries are evicted.
+
     Args:
-        data: dictionary of market data to cache
+        data: dictionary of cache key -> DataFrame
+        coverage: optional dictionary of cache key -> first date the entry
+                  covers ("YYYY-MM-DD", or FULL_HISTORY for period="max")
     """
+    coverage = coverage or {}
     try:
-        cache_data = {
-            'timestamp': datetime.now(timezone.utc),
-            'data': data
-        }
-        with open(config.CACHE_FILE, 'wb') as f:
-            pickle.dump(cache_data, f)
+        for key, df in data.items():
+            metadata = {"covers_from": coverage[key]} if key in coverage else None
+            bar_store.write_frame(key, df, metadata=metadata)
         print("Market data cached successfully")
+        evicted = bar_store.enforce_budget(config.CACHE_MAX_BYTES, keep=set(data))
+        if evicted:
+            print(f"Evicted least recently used cache entries: {', '.join(evicted)}")
     except Exception as e:
         print(f"Cache save error: {e}")
 
 
-def fetch_data_with_retry(symbol, interval="1d", period="3y", retries=3, initial_delay=2):
+def _open_state_file(path):
     """
-    Fetch data from yfinance with retries and exponential backoff.
+    Open (creating if needed) a JSON state file shared between processes.
+
+    Returns:
+        int: file descriptor opened for reading and writing
+
+    Raises:
+        OSError: if the file cannot be created or opened
+    """
+    state_dir = os.path.dirname(path)
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+
+@contextmanager
+def _locked_json(fd):
+    """
+    Yield the dict stored in a state file under an exclusive lock and write
+    it back on exit. Unreadable content starts from an empty dict.
 
     Args:
-        symbol: ticker symbol
-        interval: data interval ("1d", "1h", "30m", etc.)
-        period: time period ("3y", "1mo", etc.)
-        retries: number of retry attempts (reduced from 5 to 3)
-        initial_delay: initial seconds to wait between retries (exponential backoff)
+        fd: descriptor returned by _open_state_file (closed on exit)
+    """
+    with os.fdopen(fd, "r+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            if not isinstance(state, dict):
+                state = {}
+            yield state
+            f.seek(0)
+            f.truncate()
+            json.dump(state, f)
+            f.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate of outgoing requests.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``, so
+    short bursts go out immediately and sustained traffic is paced instead
+    of every request paying a fixed sleep.
+
+    With a ``state_file`` the bucket lives on disk behind an exclusive file
+    lock, so every process on the host (CI prefetch, the signal run, ad-hoc
+    backtests) draws from the same budget. The file also records when Yahoo
+    last answered with a 429, and all processes hold off until that cooldown
+    has passed.
+    """
+
+    def __init__(self, rate, capacity, state_file=None):
+        """
+        Args:
+            rate: tokens added per second
+            capacity: maximum number of tokens (burst size)
+            state_file: optional JSON file shared between processes
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.state_file = state_file
+        self._state = {"tokens": float(capacity), "updated": time.monotonic(), "cooldown_until": 0.0}
+        self._lock = threading.Lock()
+
+    def _clock(self):
+        """Wall clock for on-disk state (comparable across processes), monotonic otherwise."""
+        return time.time() if self.state_file else time.monotonic()
+
+    @contextmanager
+    def _locked_state(self):
+        """
+        Yield the bucket state with exclusive access, saving changes on exit.
+
+        Falls back to the in-process state if the state file cannot be used.
+        """
+        with self._lock:
+            if not self.state_file:
+                yield self._state
+                return
+
+            try:
+                fd = _open_state_file(self.state_file)
+            except OSError as e:
+                print(f"Rate limit state unavailable ({e}), limiting this process only")
+                self.state_file = None
+                self._state["updated"] = time.monotonic()
+                yield self._state
+                return
+
+            with _locked_json(fd) as state:
+                yield state
+
+    def _take(self, state, tokens, now):
+        """
+        Take tokens from state if available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise seconds to wait
+        """
+        cooldown = state.get("cooldown_until", 0.0) - now
+        if cooldown > 0:
+            return cooldown
+
+        elapsed = max(0.0, now - state.get("updated", now))
+        available = min(self.capacity, state.get("tokens", self.capacity) + elapsed * self.rate)
+        state["updated"] = now
+        if available >= tokens:
+            state["tokens"] = available - tokens
+            return 0.0
+        state["tokens"] = available
+        return (tokens - available) / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Block until ``tokens`` tokens are available and take them.
+
+        Args:
+            tokens: number of tokens (requests) to take
+
+        Returns:
+            float: seconds spent waiting
+        """
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._locked_state() as state:
+                wait = self._take(state, tokens, self._clock())
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def record_rate_limit(self, cooldown):
+        """
+        Record a 429 response so every user of the bucket pauses.
+
+        Args:
+            cooldown: seconds during which no request should be sent
+        """
+        with self._locked_state() as state:
+            now = self._clock()
+            state["cooldown_until"] = max(state.get("cooldown_until", 0.0), now + cooldown)
+            state["tokens"] = 0.0
+            state["updated"] = now
+
+    def cooldown_remaining(self):
+        """
+        Seconds left in a recorded rate-limit cooldown.
+
+        Returns:
+            float: 0 if no cooldown is active
+        """
+        with self._locked_state() as state:
+            return max(0.0, state.get("cooldown_until", 0.0) - self._clock())
+
+
+# Shared by every fetch on this host (including fetch_adj_close_many workers)
+_rate_limiter = TokenBucket(config.REQUESTS_PER_SECOND, config.REQUEST_BURST, state_file=config.RATE_LIMIT_FILE)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the market data endpoint, persisted across runs.
+
+    ``closed``: requests go out normally. After ``failure_threshold``
+    consecutive failed attempts (transport or HTTP errors; an empty answer
+    is not a failure), or at once on a rate-limit answer, the
+    breaker goes ``open``: no requests are sent and callers fall back to
+    cached data. Once ``cooldown`` seconds have passed the next caller gets
+    a single probe request (``half_open``); success closes the breaker,
+    failure opens it again with the cooldown doubled (up to
+    ``max_cooldown``).
+
+    The state lives in a JSON file behind the same file lock as the token
+    bucket, so the CI prefetch, the signal run and the next scheduled run
+    all see it.
+    """
+
+    def __init__(self, state_file=None, failure_threshold=5, cooldown=1800, max_cooldown=21600,
+                 probe_timeout=120):
+        """
+        Args:
+            state_file: optional JSON file shared between processes and runs
+            failure_threshold: consecutive failed attempts that open the breaker
+            cooldown: seconds the breaker stays open before the first probe
+            max_cooldown: cap for the cooldown after repeated failed probes
+            probe_timeout: seconds after which an unanswered probe (for
+                           example from a killed process) is given up
+        """
+        self.state_file = state_file
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self._state = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked_state(self):
+        """Yield the breaker state with exclusive access, saving changes on exit."""
+        with self._lock:
+            if not self.state_file:
+                yield self._state
+                return
+            try:
+                fd = _open_state_file(self.state_file)
+            except OSError as e:
+                print(f"Circuit breaker state unavailable ({e}), tracking this process only")
+                self.state_file = None
+                yield self._state
+                return
+            with _locked_json(fd) as state:
+                yield state
+
+    def _blocked(self, state, now):
+        """Whether a request must not be sent, given the current state."""
+        status = state.get("state", "closed")
+        if status == "open":
+            return now < state.get("retry_at", 0.0)
+        if status == "half_open":
+            return now < state.get("probe_started", 0.0) + self.probe_timeout
+        return False
+
+    def allow_request(self):
+        """
+        Ask to send one request.
+
+        Returns:
+            bool: True if the request may go out; when the breaker was open
+                  and its cooldown has passed, this request is the probe
+        """
+        with self._locked_state() as state:
+            now = time.time()
+            if state.get("state", "closed") == "closed":
+                return True
+            if self._blocked(state, now):
+                return False
+            state["state"] = "half_open"
+            state["probe_started"] = now
+            return True
+
+    def is_open(self):
+        """
+        Whether requests are currently refused (open, or a probe in flight).
+
+        Returns:
+            bool: True if callers should use cached data instead
+        """
+        with self._locked_state() as state:
+            return self._blocked(state, time.time())
+
+    def record_success(self):
+        """Record a successful request; closes the breaker."""
+        with self._locked_state() as state:
+            if state.get("state", "closed") != "closed":
+                print("✅ Circuit breaker closed: market data endpoint is answering again")
+            state.clear()
+            state["state"] = "closed"
+            state["failures"] = 0
+
+    def record_failure(self, rate_limited=False):
+        """
+        Record a failed request.
+
+        Args:
+            rate_limited: the endpoint answered with a rate limit; opens
+                          the breaker immediately
+
+        Returns:
+            bool: True if the breaker is open after this failure
+        """
+        with self._locked_state() as state:
+            now = time.time()
+            status = state.get("state", "closed")
+            failures = state.get("failures", 0) + 1
+            state["failures"] = failures
+
+            if status == "half_open":
+                cooldown = min(state.get("cooldown", self.cooldown) * 2, self.max_cooldown)
+            elif status == "closed" and (rate_limited or failures >= self.failure_threshold):
+                cooldown = self.cooldown
+            else:
+                return status == "open"
+
+            state["state"] = "open"
+            state["cooldown"] = cooldown
+            state["opened_at"] = now
+            state["retry_at"] = now + cooldown
+            state.pop("probe_started", None)
+            print(f"⛔ Circuit breaker open after {failures} failed request(s): "
+                  f"no market data requests for {cooldown / 60:.0f} min")
+            return True
+
+    def describe(self):
+        """
+        Human-readable state for log messages.
+
+        Returns:
+            str: e.g. "circuit breaker open until 21:40 UTC"
+        """
+        with self._locked_state() as state:
+            status = state.get("state", "closed")
+            if status == "open":
+                until = datetime.fromtimestamp(state.get("retry_at", 0.0), timezone.utc)
+                return f"circuit breaker open until {until:%Y-%m-%d %H:%M} UTC"
+            if status == "half_open":
+                return "circuit breaker half-open (probe in progress)"
+            return "circuit breaker closed"
+
+
+# Guards every network request; state survives across runs in DATA_DIR
+_circuit_breaker = CircuitBreaker(
+    state_file=config.CIRCUIT_BREAKER_FILE,
+    failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+    cooldown=config.CIRCUIT_COOLDOWN,
+    max_cooldown=config.CIRCUIT_MAX_COOLDOWN,
+)
+
+# Set once the run deadline has abandoned the fetch stage
+_aborted = threading.Event()
+
+
+def abort_requests():
+    """
+    Stop every download in this process before its next attempt.
+
+    Called when the run deadline abandons the fetch stage: requests already
+    on the wire finish, but no retry or fallback request follows.
+    """
+    _aborted.set()
+
+
+# yfinance column names -> names used throughout the pipeline
+_YF_FIELDS = {
+    "Adj Close": "adj_close",
+    "Close": "close",
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Volume": "volume",
+}
+
+
+def flag_bars(df):
+    """
+    Flag suspicious bars of a normalized frame.
+
+    Args:
+        df: DataFrame with an adj_close (or close) column
 
     Returns:
-        DataFrame: fetched data with standardized columns
+        DataFrame: boolean "missing", "nonpositive" and "spike" columns
+                   indexed like df. A spike is a move from the previous valid
+                   bar larger than ``config.SPIKE_THRESHOLD``.
+    """
+    column = "adj_close" if "adj_close" in df.columns else "close"
+    if column in df.columns:
+        price = df[column].to_numpy(dtype=float)
+    else:
+        price = np.full(len(df), np.nan)
+
+    missing = np.isnan(price)
+    nonpositive = ~missing & (price <= 0)
+    valid = np.flatnonzero(~(missing | nonpositive))
+
+    spike = np.zeros(len(df), dtype=bool)
+    if len(valid) > 1:
+        moves = np.abs(np.diff(np.log(price[valid])))
+        spike[valid[1:]] = moves > np.log1p(config.SPIKE_THRESHOLD)
+
+    return pd.DataFrame({"missing": missing, "nonpositive": nonpositive, "spike": spike}, index=df.index)
+
+
+def normalize_bars(df, label=None):
+    """
+    Ingestion stage run once on every downloaded frame.
+
+    Guarantees the shape the rest of the code relies on, so consumers can
+    use ``df["adj_close"]`` as a plain float Series without any checks:
+     - flat lower-case columns (yfinance (field, ticker) levels are dropped)
+     - a DatetimeIndex named "Date", sorted, without duplicate dates
+     - float64 columns (unparseable values become NaN)
+     - no bars with a missing or non-positive price; large one-session moves
+       are kept but reported (see flag_bars)
+
+    Args:
+        df: raw frame from a provider
+        label: name used in log messages
+
+    Returns:
+        DataFrame: normalized bars (empty if df is empty)
+    """
+    if df.empty:
+        return pd.DataFrame()
+
+    columns = df.columns
+    if isinstance(columns, pd.MultiIndex):
+        # yfinance returns (field, ticker) columns even for one symbol
+        fields = [i for i in range(columns.nlevels) if set(columns.get_level_values(i)) & set(_YF_FIELDS)]
+        columns = columns.get_level_values(fields[0] if fields else 0)
+    df = df.copy()
+    df.columns = [_YF_FIELDS.get(str(col), str(col)) for col in columns]
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.index), name="Date")
+    df = df[~df.index.duplicated(keep="last")]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind="stable")
+
+    df = df.apply(pd.to_numeric, errors="coerce").astype("float64")
+
+    flags = flag_bars(df)
+    bad = (flags["missing"] | flags["nonpositive"]).to_numpy()
+    label = label or "data"
+    if bad.any():
+        print(f"[{label}] ⚠️  Dropped {int(bad.sum())} bar(s) with missing or non-positive prices")
+    if flags["spike"].any():
+        dates = ", ".join(d.strftime("%Y-%m-%d") for d in df.index[flags["spike"].to_numpy()][:5])
+        print(f"[{label}] ⚠️  Large one-session move (> {config.SPIKE_THRESHOLD:.0%}) on {dates}")
+    return df[~bad]
+
+
+def resample_to_daily(df):
+    """
+    Collapse intraday bars into one bar per trading session.
+
+    Bars outside regular trading hours are dropped; each session keeps its
+    first open, highest high, lowest low, summed volume and last close, so
+    the result has the same columns and date index as a daily download.
+
+    Args:
+        df: intraday DataFrame with standardized columns; naive timestamps
+            are taken as UTC
+
+    Returns:
+        DataFrame: daily bars indexed by session date
+    """
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    seconds = index.as_unit("s").asi8
+
+    order = np.argsort(seconds, kind="stable")
+    seconds = seconds[order]
+    sessions = market_calendar.session_opens(seconds)
+    keep = sessions >= 0
+    rows, sessions = order[keep], sessions[keep]
+    if len(rows) == 0:
+        return df.iloc[:0]
+
+    # Start of each session's run of bars
+    starts = np.flatnonzero(np.r_[True, sessions[1:] != sessions[:-1]])
+    ends = np.r_[starts[1:], len(rows)] - 1
+
+    daily = {}
+    for col in df.columns:
+        values = df[col].to_numpy()[rows]
+        if col == "open":
+            daily[col] = values[starts]
+        elif col == "high":
+            daily[col] = np.maximum.reduceat(values, starts)
+        elif col == "low":
+            daily[col] = np.minimum.reduceat(values, starts)
+        elif col == "volume":
+            daily[col] = np.add.reduceat(values, starts)
+        else:
+            daily[col] = values[ends]
+
+    dates = market_calendar.session_dates(sessions[starts])
+    return pd.DataFrame(daily, index=pd.DatetimeIndex(dates, name="Date"))
+
+
+def _download_with_retry(tickers, label, interval, period, retries, initial_delay, start, cancel=None):
+    """
+    Download from the configured provider with rate limiting, retries and
+    exponential backoff.
+
+    Args:
+        tickers: ticker symbol or list of symbols
+        label: name used in log messages
+        interval, period, retries, initial_delay, start, cancel: see fetch_data_with_retry
+
+    Returns:
+        DataFrame: raw yfinance frame, empty if every attempt failed or the
+                   request was cancelled
     """
     delay = initial_delay
+    request_count = len(tickers) if isinstance(tickers, list) else 1
+
+    provider = get_provider()
+
+    # Another process (or an earlier run) may have been rate limited recently
+    cooldown = _rate_limiter.cooldown_remaining() if provider.uses_network else 0.0
+    if cooldown > 0:
+        print(f"[{label}] ⏳ Rate limit cooldown active, waiting {cooldown:.0f}s before requesting...")
 
     for attempt in range(1, retries + 1):
+        # A hedged request that lost the race (or an abandoned run) stops between attempts
+        if _aborted.is_set() or (cancel is not None and cancel.is_set()):
+            return pd.DataFrame()
         try:
-            # Add a small delay before each request to avoid rate limiting
+            # Back off before retrying a failed request
             if attempt > 1:
-                time.sleep(delay)
-
-            df = yf.download(
-                symbol,
-                period=period,
-                interval=interval,
-                progress=False,
-                auto_adjust=False,
-                prepost=False,
-                threads=False,
-            )
+                if cancel is None:
+                    time.sleep(delay)
+                elif cancel.wait(delay):
+                    return pd.DataFrame()
+
+            # Stop spending requests while the endpoint is known to be blocking us
+            if provider.uses_network and not _circuit_breaker.allow_request():
+                print(f"[{label}] ⛔ Skipping request: {_circuit_breaker.describe()}")
+                return pd.DataFrame()
+
+            # Pace requests through the shared token bucket
+            if provider.uses_network:
+                _rate_limiter.acquire(request_count)
+
+            df = provider.download(tickers, interval=interval, period=period, start=start)
+            # The endpoint answered: an empty answer (e.g. an intraday range
+            # Yahoo does not serve) is not a failure for the breaker, which
+            # only counts transport and HTTP errors (raised below)
+            if provider.uses_network:
+                _circuit_breaker.record_success()
             if not df.empty:
-                # Ensure standardized output
-                df = df.rename(columns={
-                    "Adj Close": "adj_close",
-                    "Close": "close"
-                })
-                df.index = pd.to_datetime(df.index)
                 return df
         except Exception as e:
             error_str = str(e).lower()
 
             # Detect rate limiting
-            if "429" in error_str or "rate limit" in error_str or "too many requests" in error_str:
-                print(f"[{symbol}] ⚠️  Rate limit detected on attempt {attempt}/{retries}")
+            rate_limited = "429" in error_str or "rate limit" in error_str or "too many requests" in error_str
+            if rate_limited:
+                print(f"[{label}] ⚠️  Rate limit detected on attempt {attempt}/{retries}")
+                # Make every process sharing the bucket back off, not just this one
+                _rate_limiter.record_rate_limit(config.RATE_LIMIT_COOLDOWN)
                 # Use longer delay for rate limits
                 delay = min(delay * 3, 60)  # Cap at 60 seconds
             else:
-                print(f"[{symbol}] Fetch attempt {attempt}/{retries} failed: {e}")
+                print(f"[{label}] Fetch attempt {attempt}/{retries} failed: {e}")
                 delay = min(delay * 2, 30)  # Exponential backoff, cap at 30 seconds
 
+            # Retrying only makes the block worse once the breaker has opened
+            if provider.uses_network and _circuit_breaker.record_failure(rate_limited=rate_limited):
+                print(f"[{label}] ⛔ Not retrying: {_circuit_breaker.describe()}")
+                return pd.DataFrame()
+
             if attempt < retries:
-                print(f"[{symbol}] Retrying in {delay} seconds...")
+                print(f"[{label}] Retrying in {delay} seconds...")
 
-    print(f"!!! ERROR: Unable to fetch data for {symbol} after {retries} attempts.")
+    if _aborted.is_set() or (cancel is not None and cancel.is_set()):
+        return pd.DataFrame()
+    print(f"!!! ERROR: Unable to fetch data for {label} after {retries} attempts.")
     print(f"           This may be due to rate limiting from GitHub Actions IP addresses.")
     return pd.DataFrame()  # return empty to catch downstream
 
 
-def fetch_adj_close(symbol, years, use_cache=True):
+def fetch_data_with_retry(symbol, interval="1d", period="3y", retries=3, initial_delay=2, start=None,
+                          cancel=None):
+    """
+    Fetch data from yfinance with retries and exponential backoff.
+
+    Args:
+        symbol: ticker symbol
+        interval: data interval ("1d", "1h", "30m", etc.)
+        period: time period ("3y", "1mo", etc.)
+        retries: number of retry attempts (reduced from 5 to 3)
+        initial_delay: initial seconds to wait between retries (exponential backoff)
+        start: optional start date ("YYYY-MM-DD"); when given it replaces period
+        cancel: optional threading.Event; once set, no further attempts are
+                made and an empty frame is returned
+
+    Returns:
+        DataFrame: fetched data, normalized by normalize_bars
+    """
+    df = _download_with_retry(symbol, symbol, interval, period, retries, initial_delay, start, cancel)
+    if df.empty:
+        return df
+    return normalize_bars(df, symbol)
+
+
+def fetch_batch_with_retry(symbols, interval="1d", period="3y", retries=3, initial_delay=2, start=None):
+    """
+    Fetch several symbols with one yfinance multi-ticker download.
+
+    Args:
+        symbols: list of ticker symbols
+        interval, period, retries, initial_delay, start: see fetch_data_with_retry
+
+    Returns:
+        dict: symbol -> DataFrame normalized by normalize_bars; symbols for
+              which no data came back are missing from the dict
+    """
+    symbols = list(symbols)
+    df = _download_with_retry(symbols, ",".join(symbols), interval, period, retries, initial_delay, start)
+    if df.empty:
+        return {}
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        return {symbols[0]: normalize_bars(df, symbols[0])} if len(symbols) == 1 else {}
+
+    frames = {}
+    tickers = df.columns.get_level_values(1)
+    for symbol in symbols:
+        if symbol not in tickers:
+            continue
+        # Symbols with shorter histories are NaN-padded to the common index
+        sub = df.xs(symbol, axis=1, level=1).dropna(how="all")
+        if not sub.empty:
+            frames[symbol] = normalize_bars(sub, symbol)
+    return frames
+
+
+def _stored_columns(df):
+    """Columns kept in the cache (see STORED_COLUMNS) that df has."""
+    return df[[col for col in STORED_COLUMNS if col in df.columns]].copy()
+
+
+def _project(df, columns):
+    """Select the requested columns (all when None); missing ones are NaN."""
+    if columns is None:
+        return df
+    return df.reindex(columns=list(columns))
+
+
+def _has_columns(info, columns):
+    """Whether a manifest entry stores every requested column."""
+    return columns is None or set(columns) <= set(info.get("columns", []))
+
+
+def _extendable(info):
+    """
+    Whether a stale entry can be extended with just the missing bars.
+
+    Only a complete record is extended: appending OHLCV rows to e.g. a
+    legacy adj_close-only entry would leave the new columns empty for the
+    old rows, so such entries are refetched in full.
+    """
+    return config.INCREMENTAL_FETCH and _has_columns(info, STORED_COLUMNS)
+
+
+def _adjustment_ratio(cached, delta):
+    """
+    Compare the overlapping bars of an incremental download with the cache.
+
+    After a dividend Yahoo rescales the adj_close history by one factor
+    while the raw close stays the same. That is detected here so the cache
+    can be rescaled instead of refetched.
+
+    Args:
+        cached: cached DataFrame with adj_close (and usually close) columns
+        delta: freshly downloaded DataFrame overlapping the end of the cache
+
+    Returns:
+        float: factor to multiply the cached adj_close by (1.0 if the overlap
+               matches), or None if the overlap cannot be reconciled
+    """
+    overlap = cached.index.intersection(delta.index)
+    if len(overlap) == 0:
+        return None
+
+    rtol = config.INCREMENTAL_OVERLAP_RTOL
+    if "close" in cached.columns and "close" in delta.columns:
+        old_close = cached.loc[overlap, "close"].to_numpy(dtype=float)
+        new_close = delta.loc[overlap, "close"].to_numpy(dtype=float)
+        known = ~np.isnan(old_close)
+        # Raw prices changed: a split or a data correction, not a re-adjustment
+        if not np.allclose(old_close[known], new_close[known], rtol=rtol, atol=0.0):
+            return None
+
+    old = cached.loc[overlap, "adj_close"].to_numpy(dtype=float)
+    new = delta.loc[overlap, "adj_close"].to_numpy(dtype=float)
+    if np.allclose(old, new, rtol=rtol, atol=0.0):
+        return 1.0
+
+    # A single bar cannot tell a re-adjustment from a revised price
+    ratios = new / old
+    if len(overlap) < 2 or not np.allclose(ratios, ratios[-1], rtol=rtol, atol=0.0):
+        return None
+    return float(ratios[-1])
+
+
+def _merge_incremental(cached, delta):
+    """
+    Append newly downloaded bars to a cached series.
+
+    The delta download re-fetches the last ``config.INCREMENTAL_OVERLAP_BARS``
+    cached bars. If Yahoo re-adjusted the history (see _adjustment_ratio),
+    the cached adj_close is rescaled with one multiply; any other mismatch
+    returns None so the caller refetches the full window.
+
+    Args:
+        cached: cached DataFrame with adj_close column
+        delta: freshly downloaded DataFrame overlapping the end of the cache
+
+    Returns:
+        tuple: (merged DataFrame, adjustment factor applied), or None if the
+               overlap does not validate or delta brings columns the cache
+               does not store
+    """
+    if not set(_stored_columns(delta).columns) <= set(cached.columns):
+        return None
+
+    ratio = _adjustment_ratio(cached, delta)
+    if ratio is None:
+        return None
+
+    if ratio != 1.0:
+        cached = cached.copy()
+        cached["adj_close"] = cached["adj_close"].to_numpy(dtype=float) * ratio
+
+    new_rows = _stored_columns(delta.loc[delta.index > cached.index[-1]])
+    return pd.concat([cached, new_rows]), ratio
+
+
+def _fetch_incremental(symbol, cached):
+    """
+    Refresh a stale cached series by downloading only the missing bars.
+
+    Args:
+        symbol: ticker symbol
+        cached: stale cached DataFrame with adj_close column
+
+    Returns:
+        DataFrame: updated series, or None if a full refetch is required
+    """
+    overlap_start = cached.index[-min(config.INCREMENTAL_OVERLAP_BARS, len(cached))]
+    print(f"[{symbol}] Fetching bars since {overlap_start.strftime('%Y-%m-%d')} (incremental)...")
+
+    delta = fetch_data_with_retry(symbol, interval="1d", start=overlap_start.strftime("%Y-%m-%d"), retries=2)
+    if delta.empty or "adj_close" not in delta.columns:
+        print(f"[{symbol}] Incremental fetch failed. Falling back to full download...")
+        return None
+
+    merged = _merge_incremental(cached, delta)
+    if merged is None:
+        print(f"[{symbol}] Cached history does not match new data. Falling back to full download...")
+        return None
+
+    merged, ratio = merged
+    if ratio != 1.0:
+        print(f"[{symbol}] Adjusted close was revised (factor {ratio:.6f}), rescaled cached history")
+    added = len(merged.index.difference(cached.index))
+    print(f"[{symbol}] Added {added} new bar(s) to cached data")
+    return merged
+
+
+def window_start(years=None, start=None):
+    """
+    Resolve a request window to its first date.
+
+    Args:
+        years: number of years back from today
+        start: explicit start date ("YYYY-MM-DD")
+
+    Returns:
+        Timestamp: first requested date, or None for the full history
+    """
+    if start is not None:
+        return pd.Timestamp(start).normalize()
+    if years is not None:
+        return pd.Timestamp.now().normalize() - pd.DateOffset(years=years)
+    return None
+
+
+def _covers(info, requested_start):
+    """
+    Check whether a cached entry holds the requested window.
+
+    Args:
+        info: bar store manifest entry
+        requested_start: first requested date, or None for the full history
+
+    Returns:
+        bool: True if the entry covers everything from requested_start onward
+    """
+    covers_from = info.get("covers_from", info.get("first"))
+    if covers_from == FULL_HISTORY:
+        return True
+    if covers_from is None or requested_start is None:
+        return False
+    return requested_start >= pd.Timestamp(covers_from)
+
+
+def _slice_window(df, requested_start):
+    """Return the part of a cached series that starts at requested_start."""
+    if requested_start is None:
+        return df
+    return df[df.index >= requested_start]
+
+
+def _manifest_entry(symbol):
+    """Return the bar store manifest entry for symbol, or None."""
+    try:
+        return bar_store.load_manifest().get(symbol)
+    except Exception:
+        return None
+
+
+def lookup_cached(symbol, years=None, start=None, columns=None):
+    """
+    Serve a request from the cache without any network access.
+
+    Each symbol is stored once, as the longest series fetched so far. Any
+    window that fits inside the stored range is answered by slicing it, so
+    e.g. QQQ 3y, QQQ 5y and the backtest's full history share one entry.
+
+    Args:
+        symbol: ticker symbol
+        years: number of years back from today
+        start: explicit start date ("YYYY-MM-DD")
+        columns: optional list of columns to load (default: all stored columns)
+
+    Returns:
+        DataFrame: fresh cached bars for the window, or None
+    """
+    requested_start = window_start(years, start)
+    info = _manifest_entry(symbol)
+    if info is None or not _covers(info, requested_start) or not _has_columns(info, columns):
+        return None
+
+    cached_data = load_cache([symbol], columns=columns)
+    if not cached_data or symbol not in cached_data:
+        return None
+    return _slice_window(cached_data[symbol], requested_start)
+
+
+def cache_status(symbol, years=None, start=None):
     """
-    Fetch adjusted close data with optional caching.
+    Classify how a request would be served, without any network access.
+
+    Args:
+        symbol: ticker symbol
+        years: number of years back from today
+        start: explicit start date ("YYYY-MM-DD")
+
+    Returns:
+        str: "hit" (fresh entry covering the window), "stale" (covering entry
+             that needs an incremental refresh) or "miss" (full download,
+             including out-of-date entries that cannot be extended, see
+             _extendable)
+    """
+    info = _manifest_entry(symbol)
+    if info is None or not _covers(info, window_start(years, start)):
+        return "miss"
+    updated = bar_store.entry_updated(info)
+    if updated is not None and updated >= get_last_market_close():
+        return "hit"
+    return "stale" if _extendable(info) else "miss"
+
+
+def peek_cached(symbol, years=None, start=None, columns=None):
+    """
+    Read a cached window regardless of its age, without any network access.
+
+    Used for provisional results while a refresh is still running.
+
+    Args:
+        symbol: ticker symbol
+        years: number of years back from today
+        start: explicit start date ("YYYY-MM-DD")
+        columns: optional list of columns to load (default: all stored columns)
+
+    Returns:
+        tuple: (DataFrame or None, bool fresh) - the cached window and whether
+               it already includes the last market close
+    """
+    requested_start = window_start(years, start)
+    info = _manifest_entry(symbol)
+    if info is None or not _covers(info, requested_start) or not _has_columns(info, columns):
+        return None, False
+
+    cached = load_stale_entry(symbol, columns)
+    if cached is None or cached.empty:
+        return None, False
+    updated = bar_store.entry_updated(info)
+    fresh = updated is not None and updated >= get_last_market_close()
+    return _slice_window(cached, requested_start), fresh
+
+
+def fetch_adj_close(symbol, years=None, use_cache=True, start=None, columns=None):
+    """
+    Fetch daily bars (adjusted close and the rest of the OHLCV record) with optional caching.
+
+    The cache holds one series per symbol together with the date it covers
+    from. Requests that fit inside it are sliced from the cache; when the
+    entry is stale and ``config.INCREMENTAL_FETCH`` is enabled, only the bars
+    after the last cached date are downloaded and appended. Requests that
+    reach further back than the cache trigger a full download that replaces
+    the entry.
+
+    The full OHLCV record is always downloaded and cached; ``columns``
+    only controls what is returned, and cache hits load just those columns.
+
+    While the circuit breaker is open no request is sent: the cached bars
+    are returned whatever their age, marked ``attrs["degraded"] = True``.
 
     Args:
         symbol: ticker symbol
         years: number of years of historical data
         use_cache: whether to use cached data
+        start: explicit start date ("YYYY-MM-DD"); used instead of years.
+               With neither, the full history is fetched.
+        columns: optional list of columns to return, e.g. ["adj_close"]
+                 (default: all of STORED_COLUMNS that are available)
 
     Returns:
-        DataFrame: adjusted close prices
+        DataFrame: daily bars with the requested columns
 
     Raises:
         RuntimeError: if data fetch fails
     """
-    cache_key = f"{symbol}_{years}y"
+    requested_start = window_start(years, start)
 
-    # Try to load from cache first
     if use_cache:
-        cached_data = load_cache()
-        if cached_data and cache_key in cached_data:
-            return cached_data[cache_key]
+        # Try to load from cache first
+        cached = lookup_cached(symbol, years=years, start=start, columns=columns)
+        if cached is not None:
+            return cached
+
+        # The endpoint is blocking us: serve what the cache has without asking
+        if _endpoint_blocked():
+            return _degraded_from_cache(symbol, requested_start, columns)
+        try:
+            return _refresh_cached(symbol, years, start, columns)
+        except RuntimeError:
+            # The breaker opened during this fetch
+            if not _endpoint_blocked():
+                raise
+            return _degraded_from_cache(symbol, requested_start, columns)
+
+    return _project(_fetch_full_window(symbol, years=years, start=start), columns)
+
+
+def _endpoint_blocked():
+    """Whether the circuit breaker currently refuses network requests."""
+    return get_provider().uses_network and _circuit_breaker.is_open()
+
+
+def _refresh_cached(symbol, years, start, columns):
+    """
+    Download what the cache is missing for a request and update the entry.
+
+    Stale entries covering the request are extended incrementally when
+    they store the full record (STORED_COLUMNS), otherwise refetched over
+    their own range; anything else is a full download of the requested
+    window.
+
+    Returns:
+        DataFrame: daily bars with the requested columns
+
+    Raises:
+        RuntimeError: if data fetch fails
+    """
+    requested_start = window_start(years, start)
+    covers_from = FULL_HISTORY if requested_start is None else requested_start.strftime("%Y-%m-%d")
+
+    info = _manifest_entry(symbol)
+    if info is not None and _covers(info, requested_start) and _has_columns(info, columns):
+        # Keep the cached entry as long as it is: refresh it over its own range
+        covers_from = info.get("covers_from", info.get("first"))
+
+        # Stale cache: try to extend it with just the missing bars
+        stale = load_stale_entry(symbol) if _extendable(info) else None
+        if stale is not None and not stale.empty:
+            df = _fetch_incremental(symbol, stale)
+            if df is not None:
+                save_cache({symbol: df}, coverage={symbol: covers_from})
+                return _project(_slice_window(df, requested_start), columns)
+
+        df = _fetch_full_window(symbol, start=None if covers_from == FULL_HISTORY else covers_from)
+        save_cache({symbol: df}, coverage={symbol: _coverage(df, covers_from)})
+        return _project(_slice_window(df, requested_start), columns)
+
+    df = _fetch_full_window(symbol, years=years, start=start)
+    save_cache({symbol: df}, coverage={symbol: _coverage(df, covers_from)})
+    return _project(df, columns)
 
-    # Add delay between different symbol fetches to avoid rate limiting
-    # This gives Yahoo Finance a breather between requests
-    print(f"[{symbol}] Fetching {years} years of data...")
-    time.sleep(1)  # 1 second delay before fetching
+
+def _coverage(df, covers_from):
+    """
+    Coverage to record for a frame returned by _fetch_full_window.
+
+    Yahoo caps intraday history (1h at about 730 days, 30m at about 60
+    days), so a resampled intraday fallback only covers from its first bar,
+    not from the requested start.
+
+    Args:
+        df: downloaded daily bars
+        covers_from: requested coverage ("YYYY-MM-DD" or FULL_HISTORY)
+
+    Returns:
+        str: coverage for the cache entry
+    """
+    if df.attrs.get("interval", "1d") == "1d" or df.empty:
+        return covers_from
+    return df.index[0].strftime("%Y-%m-%d")
+
+
+def _degraded_from_cache(symbol, requested_start, columns):
+    """
+    Serve a request from cached bars of any age while the circuit breaker is open.
+
+    The returned frame is marked with ``attrs["degraded"] = True`` so callers
+    can label their output.
+
+    Returns:
+        DataFrame: cached daily bars with the requested columns
+
+    Raises:
+        RuntimeError: if nothing usable is cached for the symbol
+    """
+    info = _manifest_entry(symbol)
+    cached = load_stale_entry(symbol, columns) if info is not None and _has_columns(info, columns) else None
+    if cached is None or cached.empty:
+        raise RuntimeError(f"No cached data for {symbol} and {_circuit_breaker.describe()}")
+
+    df = _project(_slice_window(cached, requested_start), columns)
+    df.attrs["degraded"] = True
+    print(f"[{symbol}] ⚠️  DEGRADED: {_circuit_breaker.describe()}, "
+          f"serving cached bars through {df.index[-1]:%Y-%m-%d}")
+    return df
+
+
+# (interval, retries) tried in order when downloading a full window
+_FALLBACK_INTERVALS = [("1d", 3), ("1h", 2), ("30m", 2)]
+
+
+def _sequential_fetch(symbol, window):
+    """
+    Try each interval of _FALLBACK_INTERVALS in turn until one returns data.
+
+    Args:
+        symbol: ticker symbol
+        window: {"start": ...} or {"period": ...} keyword for the download
+
+    Returns:
+        tuple: (DataFrame, interval) of the first non-empty result, or an
+               empty frame and the last interval tried
+    """
+    df = pd.DataFrame()
+    for i, (interval, retries) in enumerate(_FALLBACK_INTERVALS):
+        if i > 0:
+            print(f"[{symbol}] {_FALLBACK_INTERVALS[i - 1][0]} fetch failed. "
+                  f"Trying {interval} interval fallback...")
+        df = fetch_data_with_retry(symbol, interval=interval, retries=retries, **window)
+        if not df.empty:
+            break
+    return df, interval
+
+
+def _run_in_daemon(fn, *args, **kwargs):
+    """
+    Run fn in a daemon thread.
+
+    Unlike a ThreadPoolExecutor worker, an abandoned request left running
+    in it never keeps the process alive at exit.
+
+    Returns:
+        Future: resolved with fn's return value or exception
+    """
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name="hedged-fetch", daemon=True).start()
+    return future
+
+
+def _hedged_fetch(symbol, window):
+    """
+    Run the _FALLBACK_INTERVALS chain with hedged requests.
+
+    The next interval is requested as soon as every running request has
+    failed, or in parallel once config.HEDGE_DELAY seconds pass without an
+    answer, so one hung request cannot stall the run. The first non-empty
+    result wins (the daily one if several finish together) and the other
+    requests are cancelled before their next attempt.
+
+    Once the last fallback has started, the remaining wait is bounded by
+    config.HEDGE_DELAY per retry still allowed to the running requests;
+    when that runs out the fetch gives up rather than waiting on the
+    slowest request. Requests run in daemon threads, so one left hanging
+    does not hold up the process at exit.
+
+    Args:
+        symbol: ticker symbol
+        window: {"start": ...} or {"period": ...} keyword for the download
+
+    Returns:
+        tuple: (DataFrame, interval) of the winning result, or an empty
+               frame and None if every interval failed
+    """
+    pending = list(_FALLBACK_INTERVALS)
+    order = [interval for interval, _ in _FALLBACK_INTERVALS]
+    retries_of = dict(_FALLBACK_INTERVALS)
+    cancel = threading.Event()
+    running = {}
+    give_up_at = None
+
+    def launch():
+        interval, retries = pending.pop(0)
+        future = _run_in_daemon(fetch_data_with_retry, symbol, interval=interval, retries=retries,
+                                cancel=cancel, **window)
+        running[future] = interval
+
+    try:
+        launch()
+        while running:
+            if pending:
+                timeout = config.HEDGE_DELAY
+            else:
+                # Every fallback is running: bound the wait for the slowest one
+                if give_up_at is None:
+                    bound = config.HEDGE_DELAY * sum(retries_of[i] for i in running.values())
+                    give_up_at = time.monotonic() + bound
+                timeout = max(0.0, give_up_at - time.monotonic())
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done and not pending:
+                print(f"[{symbol}] No answer from {', '.join(running.values())} in time, giving up")
+                return pd.DataFrame(), None
+            if not done:
+                print(f"[{symbol}] No answer after {config.HEDGE_DELAY}s. "
+                      f"Hedging with {pending[0][0]} interval fallback...")
+                launch()
+                continue
+
+            results = []
+            for future in done:
+                interval = running.pop(future)
+                try:
+                    df = future.result()
+                except Exception as e:
+                    print(f"[{symbol}] {interval} fetch raised: {e}")
+                    df = pd.DataFrame()
+                if not df.empty:
+                    results.append((order.index(interval), interval, df))
+                elif pending and not running:
+                    print(f"[{symbol}] {interval} fetch failed. "
+                          f"Trying {pending[0][0]} interval fallback...")
+                    launch()
+
+            if results:
+                _, interval, df = min(results, key=lambda r: r[0])
+                if running:
+                    print(f"[{symbol}] {interval} fetch answered first, cancelling "
+                          f"{', '.join(running.values())}")
+                return df, interval
+        return pd.DataFrame(), None
+    finally:
+        cancel.set()
+
+
+def _fetch_full_window(symbol, years=None, start=None):
+    """
+    Download the full requested window, falling back to intraday intervals.
+
+    Args:
+        symbol: ticker symbol
+        years: number of years of historical data
+        start: explicit start date ("YYYY-MM-DD"); used instead of years
+
+    Returns:
+        DataFrame: daily bars with the available STORED_COLUMNS; the
+                   interval they were downloaded at is in ``attrs["interval"]``
+
+    Raises:
+        RuntimeError: if data fetch fails
+    """
+    if start is not None:
+        window = {"start": pd.Timestamp(start).strftime("%Y-%m-%d")}
+        description = f"data since {window['start']}"
+    elif years is not None:
+        window = {"period": f"{years}y"}
+        description = f"{years} years of data"
+    else:
+        window = {"period": "max"}
+        description = "full history"
+
+    if _endpoint_blocked():
+        raise RuntimeError(f"Not fetching {symbol}: {_circuit_breaker.describe()}")
+
+    # Requests are paced by the shared token bucket in _download_with_retry
+    print(f"[{symbol}] Fetching {description}...")
 
     # Fetch fresh data
-    # first try daily data (most common)
-    df = fetch_data_with_retry(symbol, interval="1d", period=f"{years}y", retries=3)
-    if df.empty:
-        print(f"[{symbol}] Daily fetch failed. Trying 1h interval fallback...")
-        time.sleep(2)  # Longer delay before fallback
-        df = fetch_data_with_retry(symbol, interval="1h", period=f"{years}y", retries=2)
+    # first try daily data (most common), then the intraday fallbacks
+    if config.HEDGED_FETCH:
+        df, interval = _hedged_fetch(symbol, window)
+    else:
+        df, interval = _sequential_fetch(symbol, window)
+    intraday = interval != "1d"
 
-    if df.empty:
-        print(f"[{symbol}] 1h fallback failed. Trying 30m interval fallback...")
-        time.sleep(2)  # Longer delay before fallback
-        df = fetch_data_with_retry(symbol, interval="30m", period=f"{years}y", retries=2)
+    # The SMA is defined over daily closes; never cache or return intraday bars
+    if not df.empty and intraday:
+        df = resample_to_daily(df)
+        print(f"[{symbol}] Resampled intraday fallback to {len(df)} daily bars")
 
     if df.empty:
         raise RuntimeError(
@@ -196,13 +1378,118 @@ def fetch_adj_close(symbol, years, use_cache=True):
             f"           Try again in a few minutes or check if Yahoo Finance is accessible."
         )
 
-    df = df[["adj_close"]].copy()
+    df = _stored_columns(df)
+    df.attrs["interval"] = interval
+    return df
 
-    # Save to cache
-    if use_cache:
-        cached_data = load_cache() or {}
-        cached_data[cache_key] = df
-        save_cache(cached_data)
 
-    return df
+def _window_for(value, symbol):
+    """
+    Resolve a per-symbol argument given either as a scalar or a dict.
+
+    A symbol missing from a dict is an error rather than None, which would
+    silently mean a full-history download; map it to None explicitly for that.
+
+    Raises:
+        KeyError: if value is a dict without an entry for symbol
+    """
+    if not isinstance(value, dict):
+        return value
+    if symbol not in value:
+        raise KeyError(f"No window given for {symbol}")
+    return value[symbol]
+
+
+def fetch_adj_close_many(symbols, years=None, use_cache=True, start=None, batch=None, columns=None):
+    """
+    Fetch daily bars for several symbols concurrently.
+
+    Each symbol goes through fetch_adj_close (cache lookup, incremental
+    update, full download) on a thread pool; all requests share the
+    process-wide token bucket instead of sleeping between symbols.
+
+    With ``batch`` enabled, symbols that are not cached at all are first
+    downloaded together with one yfinance multi-ticker call covering the
+    widest requested window, which is what makes cold starts cheap.
+    Symbols with a cached entry still take the per-symbol path so they
+    are refreshed incrementally.
+
+    Args:
+        symbols: list of ticker symbols
+        years: years of history, either one value or a dict per symbol
+        use_cache: whether to use cached data
+        start: start date, either one value or a dict per symbol
+        batch: use a multi-ticker download for cache misses
+               (default: config.BATCH_FETCH)
+        columns: optional list of columns to return (default: all stored)
+
+    Returns:
+        dict: symbol -> DataFrame of daily bars
+
+    Raises:
+        KeyError: if years or start is a dict without an entry for a symbol
+        RuntimeError: if data fetch fails for any symbol
+    """
+    symbols = list(dict.fromkeys(symbols))
+    # Check every window before the first request goes out
+    for symbol in symbols:
+        _window_for(years, symbol)
+        _window_for(start, symbol)
+    if batch is None:
+        batch = config.BATCH_FETCH
+
+    results = {}
+    if batch and use_cache and len(symbols) > 1:
+        results.update(_fetch_uncached_batch(symbols, years, start, columns))
+
+    pending = [symbol for symbol in symbols if symbol not in results]
+    if pending:
+        workers = max(1, min(config.FETCH_MAX_WORKERS, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                symbol: pool.submit(
+                    fetch_adj_close, symbol,
+                    years=_window_for(years, symbol),
+                    use_cache=use_cache,
+                    start=_window_for(start, symbol),
+                    columns=columns,
+                )
+                for symbol in pending
+            }
+            for symbol, future in futures.items():
+                results[symbol] = future.result()
+
+    return {symbol: results[symbol] for symbol in symbols}
+
+
+def _fetch_uncached_batch(symbols, years, start, columns=None):
+    """
+    Download every symbol without any cache entry in one request.
+
+    Returns:
+        dict: symbol -> DataFrame for the symbols that were fetched and cached
+    """
+    missing = [symbol for symbol in symbols if _manifest_entry(symbol) is None]
+    if len(missing) < 2 or _endpoint_blocked():
+        return {}
+
+    starts = {symbol: window_start(_window_for(years, symbol), _window_for(start, symbol)) for symbol in missing}
+    if any(value is None for value in starts.values()):
+        window = {"period": "max"}
+        covers_from = FULL_HISTORY
+    else:
+        earliest = min(starts.values())
+        window = {"start": earliest.strftime("%Y-%m-%d")}
+        covers_from = window["start"]
+
+    print(f"[{','.join(missing)}] Fetching in one batch request...")
+    frames = fetch_batch_with_retry(missing, interval="1d", retries=3, **window)
 
+    results = {}
+    for symbol, df in frames.items():
+        if "adj_close" not in df.columns:
+            continue
+        df = _stored_columns(df)
+        save_cache({symbol: df}, coverage={symbol: covers_from})
+        results[symbol] = _project(_slice_window(df, starts[symbol]), columns)
+    return results
@@ -0,0 +1,157 @@
+"""
+Whole-run deadline split into per-stage budgets.
+
+A run gets ``config.RUN_DEADLINE`` seconds in total. Every stage (fetch,
+compute, chart, notify) runs in a daemon thread and is given a share of
+the time still left, in proportion to ``config.STAGE_BUDGETS``, so time an
+early stage does not use carries over to the later ones.
+
+A stage that overruns its budget is abandoned: its ``cancel`` callback is
+invoked so cooperative code (downloads between retries) stops, and the
+run moves on. Python threads cannot be killed, so the caller should end
+the process with ``os._exit`` once it has reported an abandoned stage.
+
+``RunDeadline.result()`` is a plain dict reporting how every stage ended,
+including the ones skipped because an earlier stage failed.
+"""
+import threading
+import time
+
+from . import config
+
+
+class StageTimeout(RuntimeError):
+    """A stage did not finish within its budget."""
+
+    def __init__(self, stage, budget):
+        super().__init__(f"{stage} stage did not finish within its {budget:.0f}s budget")
+        self.stage = stage
+        self.budget = budget
+
+
+class RunDeadline:
+    """
+    Track the run deadline and the outcome of each stage.
+
+    Stage outcomes (``result()["stages"]``):
+     - ``ok``: finished within its budget
+     - ``timeout``: abandoned when its budget ran out
+     - ``failed``: raised an exception
+     - ``skipped``: not run, with a reason
+    """
+
+    def __init__(self, total=None, budgets=None):
+        """
+        Args:
+            total: seconds for the whole run (default: config.RUN_DEADLINE)
+            budgets: dict of stage -> relative share, in run order
+                     (default: config.STAGE_BUDGETS)
+        """
+        self.total = config.RUN_DEADLINE if total is None else total
+        self.budgets = dict(config.STAGE_BUDGETS if budgets is None else budgets)
+        self.started = time.monotonic()
+        self.stages = {}
+
+    def elapsed(self):
+        """Seconds since the run started."""
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.total - self.elapsed())
+
+    def budget(self, stage):
+        """
+        Seconds available to a stage now.
+
+        The stage gets its share of the remaining time relative to the
+        stages that have not run yet (itself included).
+
+        Args:
+            stage: stage name from the budgets
+
+        Returns:
+            float: seconds the stage may take
+        """
+        pending = [name for name in self.budgets if name not in self.stages]
+        share = self.budgets.get(stage, 0.0)
+        total_share = sum(self.budgets[name] for name in pending) or share
+        if not total_share:
+            return self.remaining()
+        return self.remaining() * share / total_share
+
+    def run(self, stage, fn, *args, cancel=None, **kwargs):
+        """
+        Run one stage within its budget.
+
+        Args:
+            stage: stage name
+            fn: callable doing the work
+            *args, **kwargs: passed to fn
+            cancel: optional callable invoked if the stage overruns, to make
+                    the abandoned work stop at its next opportunity
+
+        Returns:
+            the return value of fn
+
+        Raises:
+            StageTimeout: if fn did not finish within the stage budget
+            Exception: whatever fn raised
+        """
+        budget = self.budget(stage)
+        outcome = {}
+
+        def target():
+            try:
+                outcome["value"] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome["error"] = e
+
+        started = time.monotonic()
+        worker = threading.Thread(target=target, name=f"stage-{stage}", daemon=True)
+        worker.start()
+        worker.join(budget)
+        seconds = time.monotonic() - started
+
+        if worker.is_alive():
+            self.stages[stage] = {"status": "timeout", "seconds": seconds, "budget": budget}
+            if cancel is not None:
+                cancel()
+            raise StageTimeout(stage, budget)
+        if "error" in outcome:
+            self.stages[stage] = {"status": "failed", "seconds": seconds, "budget": budget,
+                                  "reason": str(outcome["error"])}
+            raise outcome["error"]
+        self.stages[stage] = {"status": "ok", "seconds": seconds, "budget": budget}
+        return outcome.get("value")
+
+    def skip(self, stage, reason):
+        """Record a stage that was not run."""
+        self.stages[stage] = {"status": "skipped", "reason": reason}
+
+    def skip_remaining(self, reason):
+        """Record every stage that has not run yet as skipped."""
+        for stage in self.budgets:
+            if stage not in self.stages:
+                self.skip(stage, reason)
+
+    def abandoned(self):
+        """Whether a stage was left running in the background."""
+        return any(info["status"] == "timeout" for info in self.stages.values())
+
+    def result(self):
+        """
+        Structured outcome of the run.
+
+        Returns:
+            dict: "status" ("complete" if every recorded stage finished,
+                  "partial" otherwise), "elapsed" seconds, "deadline"
+                  seconds and "stages" (stage -> outcome dict)
+        """
+        complete = all(info["status"] == "ok" for info in self.stages.values())
+        return {
+            "status": "complete" if complete else "partial",
+            "elapsed": round(self.elapsed(), 3),
+            "deadline": self.total,
+            "stages": dict(self.stages),
+        }
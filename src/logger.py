@@ -39,7 +39,8 @@ def send_email(subject, body):
     msg.set_content(body)
 
     try:
-        with smtplib.SMTP(config.EMAIL_ALERT["smtp_server"], config.EMAIL_ALERT["smtp_port"]) as s:
+        with smtplib.SMTP(config.EMAIL_ALERT["smtp_server"], config.EMAIL_ALERT["smtp_port"],
+                          timeout=config.SMTP_TIMEOUT) as s:
             s.starttls()
             s.login(config.EMAIL_ALERT["username"], config.EMAIL_ALERT["password"])
             s.send_message(msg)
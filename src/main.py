@@ -20,27 +20,50 @@ Usage:
       uv sync
   - Run *after* market close (US market close ~1:00 PM PT). Example: run at 1:05 PM PT.
       uv run tqqq-sma
+  - Warm the market data cache for the signal, charts (and --backtest) without
+    computing a signal (used by CI before the signal job):
+      uv run tqqq-sma prefetch
 
 NOT FINANCIAL ADVICE: This script only *signals* the mechanical rule we agreed on.
 Use with appropriate position sizing and risk controls.
 """
+import argparse
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import pandas as pd
 
-from . import config
-from .data_fetcher import fetch_adj_close
-from .calculations import compute_sma, pct_distance, format_pct
+from . import config, market_calendar
+from .data_fetcher import abort_requests, fetch_adj_close_many, peek_cached
+from .deadline import RunDeadline, StageTimeout
+from .calculations import (
+    IncrementalSMA, compute_sma, hysteresis_positions, pct_distance, format_pct,
+    trigger_price, trigger_price_table,
+)
 from .state_manager import load_state, save_state
 from .charts import plot_ascii_chart, generate_interactive_chart
 from .logger import append_signal_log, send_email
+from .prefetch import prefetch
 
 
-def main():
+def main(argv=None):
     """Main entry point for the TQQQ SMA trading signal system."""
+    parser = argparse.ArgumentParser(description="TQQQ 200-day SMA trading signal")
+    sub = parser.add_subparsers(dest="command")
+    warm = sub.add_parser("prefetch", help="fetch the data every consumer needs into the cache")
+    warm.add_argument("--backtest", action="store_true", help="also fetch the backtest's full history")
+    args = parser.parse_args(argv)
+
+    deadline = RunDeadline(budgets=_stage_budgets())
     try:
-        _main_logic()
+        if args.command == "prefetch":
+            deadline = RunDeadline(budgets={"fetch": 1.0})
+            deadline.run("fetch", prefetch, include_backtest=args.backtest, cancel=abort_requests)
+        else:
+            _main_logic(deadline)
     except Exception as e:
+        deadline.skip_remaining(f"{e.stage} stage timed out" if isinstance(e, StageTimeout) else "run failed")
         print("")
         print("═" * 60)
         print("  ❌ ERROR: Script execution failed")
@@ -54,13 +77,82 @@ def main():
         print("")
         print("Please try again later or check the error message above.")
         print("═" * 60)
+        _print_run_result(deadline)
         # Return exit code 1 to indicate failure
-        import sys
-        sys.exit(1)
+        _exit(deadline, 1)
+    else:
+        _print_run_result(deadline)
+        _exit(deadline, 0)
+
+
+def _stage_budgets():
+    """
+    Budget shares for the stages this run can actually reach.
+
+    Disabled charts and email alerts are left out so their share of the
+    deadline goes to the stages that do run.
+
+    Returns:
+        dict: stage -> relative share, in run order
+    """
+    budgets = dict(config.STAGE_BUDGETS)
+    if not (config.GENERATE_INTERACTIVE_CHART or config.PRINT_CHART):
+        budgets.pop("chart", None)
+    if not config.EMAIL_ALERT.get("enabled", False):
+        budgets.pop("notify", None)
+    return budgets
+
+
+def _exit(deadline, code):
+    """
+    End the process with an exit code.
+
+    A stage abandoned by the deadline is still running in a daemon thread
+    (and may hold non-daemon download workers), so the interpreter is left
+    without waiting for it.
+    """
+    if deadline.abandoned():
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+    elif code:
+        sys.exit(code)
+
+
+def _print_run_result(deadline):
+    """Print how each stage of the run ended."""
+    result = deadline.result()
+    if not result["stages"]:
+        return
+    parts = []
+    for stage, info in result["stages"].items():
+        if info["status"] == "ok":
+            parts.append(f"{stage} {info['seconds']:.1f}s")
+        elif info["status"] == "timeout":
+            parts.append(f"{stage} timed out ({info['budget']:.0f}s budget)")
+        else:
+            parts.append(f"{stage} {info['status']}")
+    print(f"⏱️  Run {result['status']} in {result['elapsed']:.1f}s "
+          f"(deadline {result['deadline']:.0f}s): {', '.join(parts)}")
 
 
-def _main_logic():
-    """Main logic implementation."""
+def _main_logic(deadline=None):
+    """
+    Main logic implementation.
+
+    Args:
+        deadline: RunDeadline bounding the fetch, compute, chart and notify
+                  stages (default: a new one from config.RUN_DEADLINE covering
+                  the enabled stages)
+
+    Returns:
+        dict: deadline.result() describing how every stage ended, or None on
+              non-session days (nothing was run)
+
+    Raises:
+        StageTimeout: if the fetch or compute stage overran its budget
+    """
+    deadline = deadline or RunDeadline(budgets=_stage_budgets())
     # Ensure data directory exists
     os.makedirs(config.DATA_DIR, exist_ok=True)
 
@@ -69,6 +161,13 @@ def _main_logic():
     print("  TQQQ 200-Day SMA Trading Signal")
     print("═" * 60)
 
+    # Nothing can have changed on a non-session day; stop before any network access
+    if config.SKIP_NON_SESSION_DAYS and not market_calendar.is_session_day():
+        print(f"📅 No trading session today ({market_calendar.exchange_date()}), nothing to update.")
+        print(f"   Last close: {market_calendar.last_close():%Y-%m-%d %H:%M} UTC")
+        print(f"   Next open:  {market_calendar.next_open():%Y-%m-%d %H:%M} UTC")
+        return
+
     # Load state
     state = load_state()
 
@@ -93,55 +192,57 @@ def _main_logic():
 
     # Fetch data
     print("Fetching market data...")
-    # Fetch 5 years of QQQ data (used for both signal and chart)
-    # This reduces API calls from 3 to 2 per run
-    qdf_5y = fetch_adj_close(config.QQQ_SYMBOL, 5)
-    qdf_5y['sma200'] = compute_sma(qdf_5y['adj_close'], config.SMA_PERIOD)
-
-    # Use the most recent N years for signal calculation
-    # (but we fetch 5 years to avoid duplicate API calls for the chart)
-    qdf = qdf_5y.copy()
-
-    # Fetch TQQQ data
-    tqqq_df = fetch_adj_close(config.TQQQ_SYMBOL, config.HISTORY_YEARS)
-
-    # Generate interactive chart if enabled (reuse already-fetched 5y data)
-    if config.GENERATE_INTERACTIVE_CHART:
-        print("Generating interactive chart...")
-        generate_interactive_chart(qdf_5y)
-
-    # Print ASCII chart if enabled
-    if config.PRINT_CHART:
-        # Get last 6 months of data for chart
-        six_months_ago = qdf.index[-1] - pd.DateOffset(months=6)
-        chart_data = qdf[qdf.index >= six_months_ago].copy()
-        plot_ascii_chart(chart_data)
-
-    # Get latest values
-    latest_q = qdf.iloc[-1]
-    latest_date = latest_q.name.strftime("%Y-%m-%d")
-    qqq_close = latest_q['adj_close'].iloc[0] if isinstance(latest_q['adj_close'], pd.Series) else float(latest_q['adj_close'])
-    sma200_val = latest_q['sma200']
-    if isinstance(sma200_val, pd.Series):
-        sma200 = float(sma200_val.iloc[0]) if not sma200_val.isna().iloc[0] else None
-    else:
-        sma200 = float(sma200_val) if not pd.isna(sma200_val) else None
-
-    # Get latest TQQQ price
-    latest_tqqq = tqqq_df.iloc[-1]
-    tqqq_close = latest_tqqq['adj_close'].iloc[0] if isinstance(latest_tqqq['adj_close'], pd.Series) else float(latest_tqqq['adj_close'])
-
-    if sma200 is None:
+    refresh = None
+    provisional = None
+    if _stale_while_revalidate():
+        provisional, fresh = _provisional_signal(state.get("sma"))
+        if provisional is not None and not fresh:
+            _print_provisional(provisional, position)
+            # Download in the background; the final signal follows when it completes
+            pool = ThreadPoolExecutor(max_workers=1)
+            refresh = pool.submit(_fetch_frames)
+            pool.shutdown(wait=False)
+
+    fetch = refresh.result if refresh is not None else _fetch_frames
+    qdf_5y, tqqq_df = deadline.run("fetch", fetch, cancel=abort_requests)
+
+    signal = deadline.run("compute", _compute_signal, qdf_5y, tqqq_df, sma_state=state.get("sma"))
+    if refresh is not None:
+        _print_refresh_result(provisional, signal)
+    qdf = signal["qdf"]
+
+    # Keep the SMA window so the next run only has to add the new bars
+    state["sma"] = signal["sma_state"]
+    save_state(state)
+
+    # The data endpoint is blocked: say so before the summary that CI parses
+    if qdf_5y.attrs.get("degraded") or tqqq_df.attrs.get("degraded"):
+        print("")
+        print("⚠️  DEGRADED: Yahoo Finance circuit breaker is open; using cached data.")
+        print(f"   Signal computed from cached bars through {signal['latest_date']}.")
+
+    # Charts are optional output: on timeout the signal is still reported
+    if config.GENERATE_INTERACTIVE_CHART or config.PRINT_CHART:
+        try:
+            deadline.run("chart", _render_charts, qdf)
+        except StageTimeout as e:
+            print(f"⚠️  {e}, continuing without it")
+        except Exception as e:
+            print(f"⚠️  Chart generation failed: {e}")
+
+    if signal["sma200"] is None:
         print(f"Not enough history to compute SMA{config.SMA_PERIOD}. Need more data.")
-        return
-
-    # Calculate trading levels and distances
-    buy_level = sma200 * config.BUY_MULTIPLIER
-    sell_level = sma200 * config.SELL_MULTIPLIER
-
-    pct_vs_sma = pct_distance(sma200, qqq_close)      # percentage of current price vs SMA200
-    pct_to_buy = pct_distance(qqq_close, buy_level)   # positive => needs +X% to reach buy threshold
-    pct_to_sell = pct_distance(qqq_close, sell_level) # positive => needs +X% to reach sell threshold
+        return deadline.result()
+
+    latest_date = signal["latest_date"]
+    qqq_close = signal["qqq_close"]
+    sma200 = signal["sma200"]
+    tqqq_close = signal["tqqq_close"]
+    buy_level = signal["buy_level"]
+    sell_level = signal["sell_level"]
+    pct_vs_sma = signal["pct_vs_sma"]
+    pct_to_buy = signal["pct_to_buy"]
+    pct_to_sell = signal["pct_to_sell"]
 
     # Print human-friendly summary
     print("")
@@ -156,6 +257,7 @@ def _main_logic():
     print("")
     print(f"Distance to BUY:         {format_pct(pct_to_buy)}")
     print(f"Distance to SELL:        {format_pct(pct_to_sell)}")
+    _print_triggers(signal)
 
     print("─" * 60)
     print(f"Position:                {position}")
@@ -168,10 +270,11 @@ def _main_logic():
     # Decision logic
     reason = ""
     log_row = None
+    action = _signal_action(position, signal)
 
     # BUY condition (only if currently CASH)
     if position == "CASH":
-        if qqq_close >= buy_level:
+        if action == "BUY":
             reason = f"QQQ {qqq_close:.2f} >= BUY threshold {buy_level:.2f}"
             # update state
             state["position"] = "TQQQ"
@@ -209,7 +312,7 @@ def _main_logic():
 
     # SELL condition (only if currently TQQQ)
     elif position == "TQQQ":
-        if qqq_close <= sell_level:
+        if action == "SELL":
             reason = f"QQQ {qqq_close:.2f} <= SELL threshold {sell_level:.2f}"
             # update state
             state["position"] = "CASH"
@@ -260,20 +363,223 @@ def _main_logic():
             f"Sell level: {log_row['sell_level']:.4f}",
             f"pct_to_buy: {format_pct(log_row['pct_to_buy'])}",
             f"pct_to_sell: {format_pct(log_row['pct_to_sell'])}",
+            f"Next session BUY trigger: {signal['next_buy_trigger']:.4f}",
+            f"Next session SELL trigger: {signal['next_sell_trigger']:.4f}",
             "",
             "This message is generated by a mechanical SMA-based signalling script."
         ]
-        send_email(subject, "\n".join(body_lines))
         print(f"\n   Trade logged to {config.SIGNAL_LOG_CSV}")
         if config.EMAIL_ALERT.get("enabled", False):
-            print(f"   Email alert sent")
+            try:
+                deadline.run("notify", send_email, subject, "\n".join(body_lines))
+                print(f"   Email alert sent")
+            except StageTimeout as e:
+                print(f"   ⚠️  Email alert not sent: {e}")
 
     print("")
     print("─" * 60)
-    print("📊 Interactive Chart: Open data/tqqq_sma_chart.html in your browser")
+    print(f"📊 Interactive Chart: Open {config.INTERACTIVE_CHART_FILENAME} in your browser")
     print("   to explore 5 years of historical data with 200-day SMA,")
     print("   buy/sell thresholds, zoom, hover tooltips, and more!")
     print("─" * 60)
+    return deadline.result()
+
+
+def _render_charts(qdf):
+    """Generate the interactive chart and print the ASCII chart, as configured."""
+    # The signal uses the incremental SMA; the charts need the whole SMA series
+    qdf = qdf.assign(sma200=compute_sma(qdf['adj_close'], config.SMA_PERIOD))
+
+    # Generate interactive chart if enabled (reuse already-fetched 5y data)
+    if config.GENERATE_INTERACTIVE_CHART:
+        print("Generating interactive chart...")
+        generate_interactive_chart(qdf)
+
+    # Print ASCII chart if enabled
+    if config.PRINT_CHART:
+        # Get last 6 months of data for chart
+        six_months_ago = qdf.index[-1] - pd.DateOffset(months=6)
+        chart_data = qdf[qdf.index >= six_months_ago].copy()
+        plot_ascii_chart(chart_data)
+
+
+def _stale_while_revalidate():
+    """Whether to show a provisional signal from cached data while refreshing."""
+    mode = config.STALE_WHILE_REVALIDATE
+    if mode == "auto":
+        return sys.stdout.isatty()
+    return bool(mode)
+
+
+def _fetch_frames():
+    """
+    Fetch QQQ (5 years, used for both signal and chart) and TQQQ.
+
+    Both symbols are fetched concurrently; cache misses share a single
+    batch download.
+
+    Returns:
+        tuple: (QQQ DataFrame, TQQQ DataFrame) of adjusted close prices
+    """
+    frames = fetch_adj_close_many(
+        [config.QQQ_SYMBOL, config.TQQQ_SYMBOL],
+        years={config.QQQ_SYMBOL: config.CHART_HISTORY_YEARS, config.TQQQ_SYMBOL: config.HISTORY_YEARS},
+        columns=["adj_close"],
+    )
+    return frames[config.QQQ_SYMBOL], frames[config.TQQQ_SYMBOL]
+
+
+def _compute_signal(qdf_5y, tqqq_df, sma_state=None):
+    """
+    Compute the latest values, trading levels and distances.
+
+    The SMA comes from an IncrementalSMA window: with ``sma_state`` from the
+    previous run only the bars added since are processed.
+
+    Args:
+        qdf_5y: QQQ adjusted close prices
+        tqqq_df: TQQQ adjusted close prices
+        sma_state: saved SMA window (IncrementalSMA.to_dict) or None
+
+    Returns:
+        dict: "qdf" (QQQ data), "latest_date", "qqq_close", "sma200" (None if
+              there is not enough history), "sma_state" (the updated window),
+              "tqqq_close", and when sma200 is available the levels, percent
+              distances, next-session trigger prices ("next_buy_trigger",
+              "next_sell_trigger") and "trigger_table" (trigger_price_table)
+    """
+    qdf = qdf_5y.copy()
+    sma = IncrementalSMA.sync(sma_state, qdf['adj_close'], config.SMA_PERIOD)
+
+    # Get latest values
+    latest_date = qdf.index[-1].strftime("%Y-%m-%d")
+    qqq_close = float(qdf['adj_close'].iloc[-1])
+    sma200 = sma.value
+
+    # Get latest TQQQ price
+    tqqq_close = float(tqqq_df['adj_close'].iloc[-1])
+
+    signal = {
+        "qdf": qdf,
+        "latest_date": latest_date,
+        "qqq_close": qqq_close,
+        "sma200": sma200,
+        "sma_state": sma.to_dict(),
+        "tqqq_close": tqqq_close,
+    }
+    if sma200 is None:
+        return signal
+
+    # Calculate trading levels and distances
+    buy_level = sma200 * config.BUY_MULTIPLIER
+    sell_level = sma200 * config.SELL_MULTIPLIER
+    signal.update({
+        "buy_level": buy_level,
+        "sell_level": sell_level,
+        "pct_vs_sma": pct_distance(sma200, qqq_close),     # percentage of current price vs SMA200
+        "pct_to_buy": pct_distance(qqq_close, buy_level),  # positive => needs +X% to reach buy threshold
+        "pct_to_sell": pct_distance(qqq_close, sell_level),  # positive => needs +X% to reach sell threshold
+    })
+
+    # Next-session closes that fire a signal, with the SMA including that close
+    window = sma.prices()
+    multipliers = {"buy": config.BUY_MULTIPLIER, "sell": config.SELL_MULTIPLIER}
+    signal.update({
+        "next_buy_trigger": trigger_price(window, config.BUY_MULTIPLIER),
+        "next_sell_trigger": trigger_price(window, config.SELL_MULTIPLIER),
+        "trigger_table": trigger_price_table(window, multipliers, sessions=max(config.TRIGGER_SESSIONS, 1),
+                                             paths=config.TRIGGER_BOOTSTRAP_PATHS),
+    })
+    return signal
+
+
+def _print_triggers(signal):
+    """
+    Print the QQQ closes that fire a signal on the coming sessions.
+
+    Labels avoid the summary fields CI parses ("Threshold", "QQQ Close:").
+    """
+    print("")
+    print(f"Next session BUY if QQQ closes at or above ${signal['next_buy_trigger']:.2f}, "
+          f"SELL at or below ${signal['next_sell_trigger']:.2f}")
+    if config.TRIGGER_SESSIONS <= 1:
+        return
+    table = signal["trigger_table"]
+    print("   Triggers by session (flat / drift / bootstrap path):")
+    for k in range(len(table["flat"]["buy"])):
+        buy = " / ".join(f"${table[s]['buy'][k]:.2f}" for s in ("flat", "drift", "bootstrap"))
+        sell = " / ".join(f"${table[s]['sell'][k]:.2f}" for s in ("flat", "drift", "bootstrap"))
+        print(f"   +{k + 1}  BUY ≥ {buy}   SELL ≤ {sell}")
+
+
+def _signal_action(position, signal):
+    """
+    Trade triggered by a signal for the current position.
+
+    Runs the latest bar through hysteresis_positions, the state machine the
+    backtest uses, so the daily signal and the backtest cannot disagree.
+
+    Returns:
+        str: "BUY", "SELL" or None
+    """
+    if signal["sma200"] is None:
+        return None
+    held, trades = hysteresis_positions(
+        [signal["qqq_close"]], [signal["buy_level"]], [signal["sell_level"]],
+        invested=position == "TQQQ",
+    )
+    if len(trades) == 0:
+        return None
+    return "BUY" if held[-1] else "SELL"
+
+
+def _provisional_signal(sma_state=None):
+    """
+    Compute a signal from cached bars of any age, without network access.
+
+    Args:
+        sma_state: saved SMA window (IncrementalSMA.to_dict) or None
+
+    Returns:
+        tuple: (signal dict or None, bool) - the signal and whether the
+               cached data is already fresh (no refresh needed)
+    """
+    qdf, qqq_fresh = peek_cached(config.QQQ_SYMBOL, years=config.CHART_HISTORY_YEARS, columns=["adj_close"])
+    tqqq_df, tqqq_fresh = peek_cached(config.TQQQ_SYMBOL, years=config.HISTORY_YEARS, columns=["adj_close"])
+    if qdf is None or tqqq_df is None:
+        return None, False
+    return _compute_signal(qdf, tqqq_df, sma_state=sma_state), qqq_fresh and tqqq_fresh
+
+
+def _print_provisional(signal, position):
+    """
+    Print the provisional signal block.
+
+    Labels deliberately differ from the final summary (which CI parses).
+    """
+    lines = ["", "⏳ PROVISIONAL (cached bars through " + signal["latest_date"] + "), refreshing in background..."]
+    if signal["sma200"] is None:
+        lines.append(f"   Not enough cached history for SMA{config.SMA_PERIOD}.")
+    else:
+        lines.append(
+            f"   QQQ ${signal['qqq_close']:.2f} | SMA{config.SMA_PERIOD} ${signal['sma200']:.2f} "
+            f"({format_pct(signal['pct_vs_sma'])}) | buy at ${signal['buy_level']:.2f} | sell at ${signal['sell_level']:.2f}"
+        )
+        action = _signal_action(position, signal)
+        if action:
+            lines.append(f"   Provisional action: {action} TQQQ (to be confirmed by the refresh)")
+        else:
+            lines.append(f"   Provisional action: none, keep {position}")
+    lines.append("")
+    print("\n".join(lines), flush=True)
+
+
+def _print_refresh_result(provisional, signal):
+    """Report whether the background refresh changed the provisional signal."""
+    if signal["latest_date"] == provisional["latest_date"]:
+        print(f"✅ Refresh complete: no new bars since {signal['latest_date']}, provisional signal stands.")
+    else:
+        print(f"🔄 Refresh complete: data now through {signal['latest_date']}, final signal below.")
 
 
 if __name__ == "__main__":
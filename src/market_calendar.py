@@ -0,0 +1,329 @@
+"""
+NYSE trading-session calendar.
+
+Sessions are kept as two sorted int64 arrays of UTC epoch seconds (open and
+close of every session), so "when was the last close" or "is today a
+session" is a binary search instead of date arithmetic. Closing times come
+from the exchange time zone, so DST, holidays and early closes (13:00 ET)
+are handled.
+
+The arrays are generated offline with ``market-calendar build`` and stored
+in ``config.MARKET_CALENDAR_FILE``; if the file is missing or does not
+cover today, the same rules are evaluated in memory instead.
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from . import config
+
+EXCHANGE_TZ = "America/New_York"
+REGULAR_OPEN = pd.Timedelta(hours=9, minutes=30)
+REGULAR_CLOSE = pd.Timedelta(hours=16)
+EARLY_CLOSE = pd.Timedelta(hours=13)
+FIRST_YEAR = 2000
+
+# Unscheduled full-day closures (national mourning, weather, 9/11)
+SPECIAL_CLOSURES = [
+    "2001-09-11", "2001-09-12", "2001-09-13", "2001-09-14",
+    "2004-06-11", "2007-01-02", "2012-10-29", "2012-10-30",
+    "2018-12-05", "2025-01-09",
+]
+
+_sessions = None
+
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th given weekday of a month (n=-1 for the last one)."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """Easter Sunday (Gregorian computus)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def holidays(year):
+    """
+    Full-day NYSE holidays of a year.
+
+    Args:
+        year: calendar year
+
+    Returns:
+        list: dates on which the exchange is closed (weekdays only)
+    """
+    days = []
+    new_year = date(year, 1, 1)
+    # A Saturday New Year's Day is not observed on the preceding Friday
+    if new_year.weekday() == 6:
+        days.append(date(year, 1, 2))
+    elif new_year.weekday() < 5:
+        days.append(new_year)
+
+    days.append(_nth_weekday(year, 1, 0, 3))           # Martin Luther King Jr. Day
+    days.append(_nth_weekday(year, 2, 0, 3))           # Washington's Birthday
+    days.append(_easter(year) - timedelta(days=2))     # Good Friday
+    days.append(_nth_weekday(year, 5, 0, -1))          # Memorial Day
+    if year >= 2022:
+        days.append(_observed(date(year, 6, 19)))      # Juneteenth
+    days.append(_observed(date(year, 7, 4)))           # Independence Day
+    days.append(_nth_weekday(year, 9, 0, 1))           # Labor Day
+    days.append(_nth_weekday(year, 11, 3, 4))          # Thanksgiving
+    days.append(_observed(date(year, 12, 25)))         # Christmas
+    return days
+
+
+def early_closes(year):
+    """
+    Sessions of a year that close at 13:00 ET.
+
+    Args:
+        year: calendar year
+
+    Returns:
+        list: early-close dates
+    """
+    days = [_nth_weekday(year, 11, 3, 4) + timedelta(days=1)]  # day after Thanksgiving
+    # July 3rd and December 24th close early when they fall Monday-Thursday
+    # (on a Friday they are the observed holiday itself)
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 4:
+            days.append(day)
+    return sorted(days)
+
+
+def _to_seconds(local_times):
+    """Localize exchange wall-clock times and convert to UTC epoch seconds."""
+    return local_times.tz_localize(EXCHANGE_TZ).tz_convert("UTC").as_unit("s").asi8
+
+
+def build_sessions(start_year=FIRST_YEAR, end_year=None):
+    """
+    Generate session open/close times from the exchange rules.
+
+    Args:
+        start_year: first calendar year
+        end_year: last calendar year (default: next year)
+
+    Returns:
+        tuple: (opens, closes) sorted int64 arrays of UTC epoch seconds
+    """
+    if end_year is None:
+        end_year = date.today().year + 1
+
+    closed, early = [], []
+    for year in range(start_year, end_year + 1):
+        closed += holidays(year)
+        early += early_closes(year)
+    closed = pd.DatetimeIndex(closed + SPECIAL_CLOSURES)
+
+    days = pd.bdate_range(f"{start_year}-01-01", f"{end_year}-12-31")
+    days = days[~days.isin(closed)]
+    close_offsets = np.where(days.isin(pd.DatetimeIndex(early)), EARLY_CLOSE, REGULAR_CLOSE)
+
+    opens = _to_seconds(days + REGULAR_OPEN)
+    closes = _to_seconds(days + pd.TimedeltaIndex(close_offsets))
+    return opens, closes
+
+
+def save_sessions(path, opens, closes):
+    """Write session arrays to a compressed .npz file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez_compressed(path, opens=opens, closes=closes)
+
+
+def load_sessions(path):
+    """
+    Read session arrays written by save_sessions.
+
+    Returns:
+        tuple: (opens, closes), or None if the file does not exist
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return data["opens"], data["closes"]
+
+
+def sessions(now=None):
+    """
+    Session arrays covering ``now``.
+
+    Uses the precomputed calendar file when it reaches past ``now`` and
+    falls back to evaluating the rules otherwise.
+
+    Args:
+        now: timezone-aware datetime (default: current time)
+
+    Returns:
+        tuple: (opens, closes) sorted int64 arrays of UTC epoch seconds
+    """
+    global _sessions
+    t = (now or datetime.now(timezone.utc)).timestamp()
+
+    if _sessions is None or _sessions[1][-1] <= t:
+        try:
+            loaded = load_sessions(config.MARKET_CALENDAR_FILE)
+        except (OSError, ValueError, KeyError):
+            loaded = None
+        if loaded is None or len(loaded[1]) == 0 or loaded[1][-1] <= t:
+            year = datetime.fromtimestamp(t, timezone.utc).year
+            loaded = build_sessions(FIRST_YEAR, year + 1)
+        _sessions = loaded
+    return _sessions
+
+
+def session_opens(seconds):
+    """
+    Map UTC epoch seconds to the open time of the session they fall in.
+
+    Args:
+        seconds: int64 array of UTC epoch seconds
+
+    Returns:
+        ndarray: session open (UTC epoch seconds) for each timestamp, -1 for
+                 timestamps outside regular trading hours
+    """
+    seconds = np.asarray(seconds, dtype=np.int64)
+    if len(seconds) == 0:
+        return np.empty(0, dtype=np.int64)
+    opens, closes = sessions(datetime.fromtimestamp(int(seconds.max()), timezone.utc))
+    pos = np.searchsorted(opens, seconds, side="right") - 1
+    inside = (pos >= 0) & (seconds < closes[np.maximum(pos, 0)])
+    return np.where(inside, opens[np.maximum(pos, 0)], -1)
+
+
+def session_dates(opens):
+    """
+    Exchange dates of sessions, as naive midnight timestamps.
+
+    Args:
+        opens: session open times (UTC epoch seconds)
+
+    Returns:
+        DatetimeIndex: session dates
+    """
+    local = pd.to_datetime(np.asarray(opens), unit="s", utc=True).tz_convert(EXCHANGE_TZ)
+    return local.tz_localize(None).normalize()
+
+
+def last_close(now=None):
+    """
+    Most recent session close at or before ``now``.
+
+    Args:
+        now: timezone-aware datetime (default: current time)
+
+    Returns:
+        datetime: close time in UTC
+    """
+    now = now or datetime.now(timezone.utc)
+    _, closes = sessions(now)
+    i = np.searchsorted(closes, int(now.timestamp()), side="right") - 1
+    if i < 0:
+        raise ValueError(f"No session close before {now.isoformat()}")
+    return datetime.fromtimestamp(int(closes[i]), timezone.utc)
+
+
+def next_open(now=None):
+    """
+    First session open after ``now``.
+
+    Args:
+        now: timezone-aware datetime (default: current time)
+
+    Returns:
+        datetime: open time in UTC
+    """
+    now = now or datetime.now(timezone.utc)
+    opens, _ = sessions(now + timedelta(days=14))
+    i = np.searchsorted(opens, int(now.timestamp()), side="right")
+    return datetime.fromtimestamp(int(opens[i]), timezone.utc)
+
+
+def exchange_date(now=None):
+    """Current calendar date at the exchange."""
+    return (now or datetime.now(timezone.utc)).astimezone(ZoneInfo(EXCHANGE_TZ)).date()
+
+
+def is_session_day(day=None):
+    """
+    Whether the exchange holds a session on ``day``.
+
+    Args:
+        day: date (default: today at the exchange)
+
+    Returns:
+        bool: True for trading days, False for weekends and holidays
+    """
+    day = day or exchange_date()
+    tz = ZoneInfo(EXCHANGE_TZ)
+    start = int(datetime(day.year, day.month, day.day, tzinfo=tz).timestamp())
+    end = int((datetime(day.year, day.month, day.day, tzinfo=tz) + timedelta(days=1)).timestamp())
+
+    opens, _ = sessions(datetime.fromtimestamp(end, timezone.utc))
+    i = np.searchsorted(opens, start, side="left")
+    return bool(i < len(opens) and opens[i] < end)
+
+
+def main():
+    """Entry point for the market-calendar script."""
+    parser = argparse.ArgumentParser(description="NYSE trading-session calendar")
+    sub = parser.add_subparsers(dest="command")
+
+    build = sub.add_parser("build", help="precompute the session calendar file")
+    build.add_argument("--start-year", type=int, default=FIRST_YEAR)
+    build.add_argument("--end-year", type=int, default=date.today().year + 10)
+    build.add_argument("--output", default=config.MARKET_CALENDAR_FILE)
+
+    sub.add_parser("check", help="print whether today is a trading session (for CI)")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        opens, closes = build_sessions(args.start_year, args.end_year)
+        save_sessions(args.output, opens, closes)
+        print(f"✅ Wrote {len(opens)} sessions ({args.start_year}-{args.end_year}) to {args.output}")
+        return 0
+
+    today = exchange_date()
+    session = is_session_day(today)
+    print(f"is_session={'true' if session else 'false'}")
+    print(f"exchange_date={today.isoformat()}")
+    print(f"last_close={last_close().isoformat()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
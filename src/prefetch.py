@@ -0,0 +1,94 @@
+"""
+Cache warm-up for every consumer of market data.
+
+Each consumer (the daily signal, the charts, the backtest) needs some
+symbol/date range. The cache serves any window that fits inside the
+longest series stored for a symbol, so the minimal plan is one range per
+symbol reaching back to the earliest date any consumer needs. Fetching
+that plan once means every later run is a cache hit.
+
+Run with ``tqqq-sma prefetch`` (CI does this before generating the signal).
+"""
+from . import config
+from .data_fetcher import cache_status, fetch_adj_close_many, window_start
+
+
+def requirements(include_backtest=False):
+    """
+    Symbol/date ranges needed by the configured consumers.
+
+    Args:
+        include_backtest: also include the backtest's full history
+
+    Returns:
+        list: (consumer, symbol, first date or None for the full history)
+    """
+    needs = [
+        ("signal", config.QQQ_SYMBOL, window_start(years=config.CHART_HISTORY_YEARS)),
+        ("signal", config.TQQQ_SYMBOL, window_start(years=config.HISTORY_YEARS)),
+    ]
+    if config.PRINT_CHART or config.GENERATE_INTERACTIVE_CHART:
+        needs.append(("chart", config.QQQ_SYMBOL, window_start(years=config.CHART_HISTORY_YEARS)))
+    if include_backtest:
+        start = window_start(start=config.BACKTEST_START)
+        needs.append(("backtest", config.QQQ_SYMBOL, start))
+        needs.append(("backtest", config.TQQQ_SYMBOL, start))
+    return needs
+
+
+def plan(needs):
+    """
+    Merge requirements into one range per symbol.
+
+    Args:
+        needs: list of (consumer, symbol, first date or None)
+
+    Returns:
+        dict: symbol -> (first date or None, list of consumers)
+    """
+    ranges = {}
+    for consumer, symbol, start in needs:
+        if symbol not in ranges:
+            ranges[symbol] = (start, [consumer])
+            continue
+        current, consumers = ranges[symbol]
+        if consumer not in consumers:
+            consumers.append(consumer)
+        if current is not None and (start is None or start < current):
+            ranges[symbol] = (start, consumers)
+    return ranges
+
+
+def prefetch(include_backtest=False):
+    """
+    Fetch every range in the plan once and report cache statistics.
+
+    Args:
+        include_backtest: also warm the backtest's full history
+
+    Returns:
+        dict: counts of "hit", "stale" and "miss" ranges
+
+    Raises:
+        RuntimeError: if data fetch fails for any symbol
+    """
+    ranges = plan(requirements(include_backtest))
+    starts = {symbol: start.strftime("%Y-%m-%d") if start is not None else None
+              for symbol, (start, _) in ranges.items()}
+
+    print(f"🔍 Prefetching {len(ranges)} symbol range(s)...")
+    status = {}
+    for symbol, (start, consumers) in ranges.items():
+        status[symbol] = cache_status(symbol, start=starts[symbol])
+        since = starts[symbol] or "full history"
+        print(f"   {symbol:<6} since {since} ({', '.join(consumers)}): {status[symbol]}")
+
+    frames = fetch_adj_close_many(list(ranges), start=starts, columns=["adj_close"])
+
+    print("")
+    for symbol, df in frames.items():
+        print(f"   ✓ {symbol}: {len(df)} bars through {df.index[-1].strftime('%Y-%m-%d')}")
+
+    stats = {key: sum(1 for value in status.values() if value == key) for key in ("hit", "stale", "miss")}
+    print(f"✅ Cache: {stats['hit']} hit, {stats['stale']} stale (incremental), {stats['miss']} miss")
+    return stats
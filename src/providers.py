@@ -0,0 +1,296 @@
+"""
+Market data providers.
+
+Every provider returns bars in the shape ``yf.download`` produces: a frame
+indexed by date with "Open", "High", "Low", "Close", "Adj Close" and
+"Volume" columns, using (field, ticker) MultiIndex columns when several
+tickers are requested. The rest of the pipeline (retries, standardization,
+caching) is therefore the same whichever provider is configured.
+
+Providers:
+ - ``yfinance``: live data from Yahoo Finance (default)
+ - ``local``: replays bars from ``<SYMBOL>.csv`` or ``<SYMBOL>.bars`` files
+   in ``config.LOCAL_DATA_DIR``
+ - ``synthetic``: deterministic generated bars, any history length
+
+Select one with ``config.DATA_PROVIDER`` (or the ``TQQQ_DATA_PROVIDER``
+environment variable).
+"""
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from . import bar_store, config
+
+# Column names used by the bar store -> yfinance names
+_STORE_TO_YF = {
+    "open": "Open",
+    "high": "High",
+    "low": "Low",
+    "close": "Close",
+    "adj_close": "Adj Close",
+    "volume": "Volume",
+}
+
+
+# yf.download logs failed tickers instead of raising. Messages containing one
+# of these mean the request never got a valid answer (transport or HTTP
+# error); anything else, e.g. "possibly delisted" or an intraday range Yahoo
+# does not serve, is an empty answer.
+_TRANSPORT_ERRORS = (
+    "connection", "dnserror", "timeout", "timed out", "curl:", "ssl", "proxy",
+    "http error", "httperror", "server error", "ratelimit", "rate limit", "too many requests",
+)
+
+
+class _ErrorLog(logging.Handler):
+    """Collects the error messages yfinance logs on the current thread."""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.messages.append(record.getMessage())
+
+
+def _window_start(end, period=None, start=None):
+    """
+    Resolve a yfinance-style window to its first date.
+
+    Args:
+        end: last date of the data
+        period: period string ("3y", "6mo", "5d", "max")
+        start: start date; takes precedence over period
+
+    Returns:
+        Timestamp: first date to include, or None for all data
+    """
+    if start is not None:
+        return pd.Timestamp(start)
+    if period is None or period == "max":
+        return None
+    for suffix, unit in (("mo", "months"), ("wk", "weeks"), ("y", "years"), ("d", "days")):
+        if period.endswith(suffix):
+            return end - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def _combine(frames):
+    """
+    Combine per-ticker frames the way yf.download does.
+
+    Args:
+        frames: dict of ticker -> frame with yfinance columns
+
+    Returns:
+        DataFrame: (field, ticker) MultiIndex columns, empty if no data
+    """
+    frames = {ticker: df for ticker, df in frames.items() if not df.empty}
+    if not frames:
+        return pd.DataFrame()
+    combined = pd.concat(frames, axis=1, names=["Ticker", "Price"])
+    return combined.swaplevel(axis=1)
+
+
+class MarketDataProvider:
+    """
+    Base class for market data sources.
+
+    Subclasses implement ``_fetch_symbol``; ``download`` handles windowing
+    and multi-ticker requests.
+    """
+
+    name = "base"
+    # Network providers are paced by the shared rate limiter
+    uses_network = False
+
+    def download(self, tickers, interval="1d", period=None, start=None):
+        """
+        Download bars for one or more tickers.
+
+        Args:
+            tickers: ticker symbol or list of symbols
+            interval: bar interval ("1d", "1h", "30m", ...)
+            period: period string ("3y", "max", ...)
+            start: start date ("YYYY-MM-DD"); takes precedence over period
+
+        Returns:
+            DataFrame: yfinance-shaped bars, empty if nothing is available
+        """
+        symbols = tickers if isinstance(tickers, list) else [tickers]
+        frames = {}
+        for symbol in symbols:
+            df = self._fetch_symbol(symbol, interval)
+            if df is None or df.empty:
+                continue
+            first = _window_start(df.index[-1], period=period, start=start)
+            frames[symbol] = df[df.index >= first] if first is not None else df
+        return _combine(frames)
+
+    def _fetch_symbol(self, symbol, interval):
+        """Return all available bars for symbol, or None."""
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance."""
+
+    name = "yfinance"
+    uses_network = True
+
+    def download(self, tickers, interval="1d", period=None, start=None):
+        """
+        Download bars with yf.download (see MarketDataProvider.download).
+
+        Raises:
+            ConnectionError: if nothing came back because of a transport or
+                             HTTP error (yfinance only logs those)
+        """
+        window = {"start": start} if start is not None else {"period": period}
+        errors = _ErrorLog()
+        logger = logging.getLogger("yfinance")
+        logger.addHandler(errors)
+        try:
+            df = yf.download(
+                tickers,
+                **window,
+                interval=interval,
+                progress=False,
+                auto_adjust=False,
+                prepost=False,
+                threads=False,
+            )
+        finally:
+            logger.removeHandler(errors)
+
+        if df.empty:
+            failed = [m for m in errors.messages if any(e in m.lower() for e in _TRANSPORT_ERRORS)]
+            if failed:
+                raise ConnectionError(failed[-1].strip())
+        return df
+
+
+class LocalProvider(MarketDataProvider):
+    """
+    Replay bars from files on disk.
+
+    Looks for ``<SYMBOL>.bars`` (bar store format) and then ``<SYMBOL>.csv``
+    (as written by ``yf.download(...).to_csv()`` or with lower-case
+    ``adj_close``/``close`` columns). Only daily bars are available.
+    """
+
+    name = "local"
+
+    def __init__(self, data_dir=None):
+        """
+        Args:
+            data_dir: directory holding the replay files
+                      (default: config.LOCAL_DATA_DIR)
+        """
+        self.data_dir = data_dir or config.LOCAL_DATA_DIR
+
+    def _fetch_symbol(self, symbol, interval):
+        if interval != "1d":
+            return None
+
+        bars_path = os.path.join(self.data_dir, f"{symbol}.bars")
+        csv_path = os.path.join(self.data_dir, f"{symbol}.csv")
+        if os.path.exists(bars_path):
+            df = bar_store.read_file(bars_path, mmap=False)
+        elif os.path.exists(csv_path):
+            df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        else:
+            return None
+
+        df = df.rename(columns=_STORE_TO_YF)
+        if "Adj Close" not in df.columns and "Close" in df.columns:
+            df["Adj Close"] = df["Close"]
+        df.index = pd.DatetimeIndex(df.index, name="Date")
+        return df.sort_index()
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Deterministic generated bars (geometric Brownian motion).
+
+    Each symbol gets its own random stream derived from the seed and the
+    symbol name, so the same configuration always produces the same bars.
+    Bars run on business days from ``start`` to ``end``.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, seed=None, start=None, end=None, price=100.0, drift=0.10, volatility=0.25):
+        """
+        Args:
+            seed: base random seed (default: config.SYNTHETIC_SEED)
+            start: first bar date (default: config.SYNTHETIC_START)
+            end: last bar date (default: today)
+            price: starting price
+            drift: annualized drift
+            volatility: annualized volatility
+        """
+        self.seed = config.SYNTHETIC_SEED if seed is None else seed
+        self.start = start or config.SYNTHETIC_START
+        self.end = end
+        self.price = price
+        self.drift = drift
+        self.volatility = volatility
+
+    def _fetch_symbol(self, symbol, interval):
+        if interval != "1d":
+            return None
+
+        end = pd.Timestamp(self.end) if self.end is not None else pd.Timestamp.now().normalize()
+        index = pd.bdate_range(self.start, end, name="Date")
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode("utf-8"))])
+
+        dt = 1 / 252
+        returns = rng.normal((self.drift - 0.5 * self.volatility ** 2) * dt,
+                             self.volatility * np.sqrt(dt), len(index))
+        close = self.price * np.exp(np.cumsum(returns))
+        open_ = np.concatenate(([self.price], close[:-1]))[:len(close)]
+        spread = np.abs(rng.normal(0.0, 0.005, len(index)))
+
+        return pd.DataFrame({
+            "Open": open_,
+            "High": np.maximum(open_, close) * (1 + spread),
+            "Low": np.minimum(open_, close) * (1 - spread),
+            "Close": close,
+            "Adj Close": close,
+            "Volume": rng.integers(1_000_000, 50_000_000, len(index)),
+        }, index=index)
+
+
+PROVIDERS = {
+    YFinanceProvider.name: YFinanceProvider,
+    LocalProvider.name: LocalProvider,
+    SyntheticProvider.name: SyntheticProvider,
+}
+
+
+def get_provider(name=None):
+    """
+    Build the configured market data provider.
+
+    Args:
+        name: provider name (default: config.DATA_PROVIDER)
+
+    Returns:
+        MarketDataProvider: provider instance
+
+    Raises:
+        ValueError: if the provider name is unknown
+    """
+    name = name or config.DATA_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown data provider '{name}'. Options: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
@@ -4,8 +4,19 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta, timezone
 import os
+import sys
 import tempfile
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture(autouse=True)
+def isolated_rate_limiter(monkeypatch, tmp_path):
+    """Keep the shared rate limiter and circuit breaker state out of the real data directory."""
+    from src import data_fetcher
+    monkeypatch.setattr(data_fetcher._rate_limiter, 'state_file', str(tmp_path / "rate_limit_state.json"))
+    monkeypatch.setattr(data_fetcher._circuit_breaker, 'state_file', str(tmp_path / "circuit_breaker.json"))
+
 
 @pytest.fixture
 def sample_price_data():
@@ -51,9 +62,9 @@ def mock_state_file(tmp_path):
 
 
 @pytest.fixture
-def mock_cache_file(tmp_path):
-    """Create a temporary cache file."""
-    return str(tmp_path / "data" / "market_data_cache.pkl")
+def mock_cache_dir(tmp_path):
+    """Create a temporary cache directory."""
+    return str(tmp_path / "data" / "market_data_cache")
 
 
 @pytest.fixture
@@ -61,3 +72,34 @@ def mock_log_file(tmp_path):
     """Create a temporary log file."""
     return str(tmp_path / "data" / "signals_log.csv")
 
+
+@pytest.fixture
+def signal_frames():
+    """Build QQQ and TQQQ frames with a flat history and a chosen last close."""
+    def build(n, last_price):
+        index = pd.date_range('2024-01-01', periods=n, freq='D')
+        prices = [100.0] * (n - 1) + [last_price]
+        frame = pd.DataFrame({'adj_close': prices}, index=index)
+        return frame, frame.copy()
+    return build
+
+
+@pytest.fixture
+def run_signal(monkeypatch, tmp_path):
+    """Run the main logic with cached (provisional) and refreshed (final) frames."""
+    from src import config, main
+
+    def run(provisional, final, fresh=False, mode=True):
+        monkeypatch.setattr(config, 'DATA_DIR', str(tmp_path))
+        monkeypatch.setattr(config, 'STATE_FILE', str(tmp_path / 'state.json'))
+        monkeypatch.setattr(config, 'SIGNAL_LOG_CSV', str(tmp_path / 'log.csv'))
+        monkeypatch.setattr(config, 'MANUAL_POSITION', None)
+        monkeypatch.setattr(config, 'SKIP_NON_SESSION_DAYS', False)
+        monkeypatch.setattr(config, 'PRINT_CHART', False)
+        monkeypatch.setattr(config, 'GENERATE_INTERACTIVE_CHART', False)
+        monkeypatch.setattr(config, 'STALE_WHILE_REVALIDATE', mode)
+        monkeypatch.setattr(main, 'peek_cached',
+                            lambda symbol, years=None, columns=None: (provisional[0 if symbol == 'QQQ' else 1], fresh))
+        monkeypatch.setattr(main, '_fetch_frames', lambda: final)
+        main._main_logic()
+    return run
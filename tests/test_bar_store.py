@@ -0,0 +1,426 @@
+"""Tests for the columnar bar store."""
+import pytest
+import json
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src import bar_store, config
+
+
+@pytest.fixture
+def store_dir(monkeypatch, tmp_path):
+    """Point the bar store at a temporary directory."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(config, 'CACHE_DIR', str(cache_dir))
+    return cache_dir
+
+
+def store_files(store_dir):
+    """Files in the store directory, without the manifest lock file."""
+    return sorted(f for f in os.listdir(store_dir) if f != bar_store.LOCK_NAME)
+
+
+def make_frame(n=10, start='2024-01-01'):
+    """Build a frame with two float columns."""
+    index = pd.date_range(start, periods=n, freq='D', name='Date')
+    return pd.DataFrame({
+        'adj_close': np.linspace(100.0, 110.0, n),
+        'close': np.linspace(101.0, 111.0, n),
+    }, index=index)
+
+
+class TestBarStoreRoundTrip:
+    """Tests for writing and reading entries."""
+
+    def test_round_trip(self, store_dir):
+        """Test that a frame survives a write/read round trip."""
+        df = make_frame()
+        bar_store.write_frame('QQQ', df)
+
+        loaded = bar_store.read_frame('QQQ')
+        pd.testing.assert_frame_equal(loaded, df, check_freq=False)
+        assert loaded['adj_close'].dtype == np.float64
+
+    def test_read_without_mmap(self, store_dir):
+        """Test reading into memory instead of memory-mapping."""
+        df = make_frame()
+        bar_store.write_frame('QQQ', df)
+
+        loaded = bar_store.read_frame('QQQ', mmap=False)
+        pd.testing.assert_frame_equal(loaded, df, check_freq=False)
+
+    def test_column_projection(self, store_dir):
+        """Test loading only selected columns."""
+        bar_store.write_frame('QQQ', make_frame())
+
+        loaded = bar_store.read_frame('QQQ', columns=['close'])
+        assert list(loaded.columns) == ['close']
+        assert len(loaded) == 10
+
+    def test_multiindex_columns_flattened(self, store_dir):
+        """Test that yfinance-style (field, ticker) columns are flattened."""
+        df = make_frame()
+        df.columns = pd.MultiIndex.from_tuples([('adj_close', 'QQQ'), ('close', 'QQQ')])
+        bar_store.write_frame('QQQ', df)
+
+        loaded = bar_store.read_frame('QQQ')
+        assert list(loaded.columns) == ['adj_close', 'close']
+
+    def test_empty_frame(self, store_dir):
+        """Test that an empty frame can be stored."""
+        bar_store.write_frame('EMPTY', make_frame(n=0))
+
+        loaded = bar_store.read_frame('EMPTY')
+        assert loaded.empty
+        assert bar_store.load_manifest()['EMPTY']['first'] is None
+
+    def test_ohlcv_dtypes(self, store_dir):
+        """Test that OHLCV columns are stored with their compact dtypes."""
+        df = make_frame(n=4)
+        df['open'] = [1.5, 2.5, 3.5, 4.5]
+        df['volume'] = [100.0, np.nan, 300.0, 400.0]
+        bar_store.write_frame('QQQ', df)
+
+        loaded = bar_store.read_frame('QQQ')
+        assert loaded['adj_close'].dtype == np.float64
+        assert loaded['open'].dtype == np.float32
+        assert loaded['volume'].dtype == np.float64
+        # Missing volume stays missing
+        np.testing.assert_array_equal(loaded['volume'], [100.0, np.nan, 300.0, 400.0])
+
+    def test_missing_entry(self, store_dir):
+        """Test reading an entry that was never written."""
+        assert bar_store.read_frame('NOPE') is None
+
+    def test_columns_are_aligned(self, store_dir):
+        """Test that column data starts on an aligned offset."""
+        bar_store.write_frame('QQQ', make_frame())
+
+        with open(store_dir / 'QQQ.bars', 'rb') as f:
+            header, data_start = bar_store._read_header(f, 'QQQ.bars')
+        assert data_start % bar_store.ALIGNMENT == 0
+        assert [c['name'] for c in header['columns']] == ['date', 'adj_close', 'close']
+
+
+class TestBarStoreIsolation:
+    """Tests that entries are independent of each other."""
+
+    def test_write_only_touches_own_file(self, store_dir):
+        """Test that writing one entry leaves other entry files unchanged."""
+        bar_store.write_frame('QQQ', make_frame())
+        bar_store.write_frame('TQQQ', make_frame())
+        before = (store_dir / 'QQQ.bars').read_bytes()
+        mtime = os.path.getmtime(store_dir / 'QQQ.bars')
+
+        bar_store.write_frame('TQQQ', make_frame(n=20))
+
+        assert (store_dir / 'QQQ.bars').read_bytes() == before
+        assert os.path.getmtime(store_dir / 'QQQ.bars') == mtime
+        assert len(bar_store.read_frame('TQQQ')) == 20
+
+    def test_manifest_tracks_entries(self, store_dir):
+        """Test manifest metadata for each entry."""
+        bar_store.write_frame('QQQ', make_frame(n=5, start='2024-03-01'))
+
+        info = bar_store.load_manifest()['QQQ']
+        assert info['rows'] == 5
+        assert info['first'] == '2024-03-01'
+        assert info['last'] == '2024-03-05'
+        assert info['columns'] == ['adj_close', 'close']
+        assert bar_store.entry_updated(info) is not None
+
+    def test_delete_entry(self, store_dir):
+        """Test removing an entry."""
+        bar_store.write_frame('QQQ', make_frame())
+        bar_store.write_frame('TQQQ', make_frame())
+
+        bar_store.delete_entry('QQQ')
+
+        assert bar_store.read_frame('QQQ') is None
+        assert list(bar_store.load_manifest()) == ['TQQQ']
+
+
+class TestBarStoreCorruption:
+    """Tests for invalid files."""
+
+    def test_bad_magic(self, store_dir):
+        """Test that a non-store file is rejected."""
+        store_dir.mkdir()
+        (store_dir / 'QQQ.bars').write_bytes(b"not a bar file at all")
+
+        with pytest.raises(ValueError):
+            bar_store.read_frame('QQQ')
+
+    def test_truncated_file(self, store_dir):
+        """Test that a truncated file is rejected."""
+        bar_store.write_frame('QQQ', make_frame())
+        path = store_dir / 'QQQ.bars'
+        path.write_bytes(path.read_bytes()[:-16])
+
+        with pytest.raises(ValueError):
+            bar_store.read_frame('QQQ')
+
+    def test_checksum_mismatch(self, store_dir):
+        """Test that flipped bytes in column data are detected."""
+        bar_store.write_frame('QQQ', make_frame())
+        path = store_dir / 'QQQ.bars'
+        data = bytearray(path.read_bytes())
+        data[-3] ^= 0xFF
+        path.write_bytes(bytes(data))
+
+        with pytest.raises(bar_store.CorruptEntryError):
+            bar_store.read_frame('QQQ')
+        # Columns that are not loaded are not checked
+        assert len(bar_store.read_frame('QQQ', columns=['adj_close'])) == 10
+
+    def test_schema_version_checked(self, store_dir):
+        """Test that files from another schema version are rejected."""
+        bar_store.write_frame('QQQ', make_frame())
+        path = store_dir / 'QQQ.bars'
+        data = path.read_bytes().replace(b'"schema_version": 2', b'"schema_version": 1')
+        path.write_bytes(data)
+
+        with pytest.raises(bar_store.CorruptEntryError):
+            bar_store.read_frame('QQQ')
+
+    def test_invalid_manifest_rebuilt(self, store_dir):
+        """Test that an unreadable manifest is rebuilt from the entry headers."""
+        bar_store.write_frame('QQQ', make_frame(), metadata={'covers_from': '2024-01-01'})
+        bar_store.write_frame('TQQQ', make_frame(n=4))
+        expected = bar_store.load_manifest()
+        (store_dir / 'manifest.json').write_text(json.dumps({'version': 1}))
+
+        assert bar_store.load_manifest() == expected
+        assert bar_store.load_manifest()['QQQ']['covers_from'] == '2024-01-01'
+
+    def test_truncated_manifest_rebuilt(self, store_dir):
+        """Test that a half-written manifest does not lose the cache."""
+        bar_store.write_frame('QQQ', make_frame())
+        path = store_dir / 'manifest.json'
+        path.write_text(path.read_text()[:20])
+
+        assert list(bar_store.load_manifest()) == ['QQQ']
+
+
+class TestAtomicWrites:
+    """Tests for crash-safe writes."""
+
+    def test_no_temporary_files_left(self, store_dir):
+        """Test that a successful write leaves only the final files."""
+        bar_store.write_frame('QQQ', make_frame())
+        assert store_files(store_dir) == ['QQQ.bars', 'manifest.json']
+
+    def test_failed_write_keeps_previous_file(self, store_dir, monkeypatch):
+        """Test that a write interrupted before the rename leaves the old entry intact."""
+        bar_store.write_frame('QQQ', make_frame(n=10))
+
+        replace = os.replace
+        def crash(src, dst):
+            raise KeyboardInterrupt("killed")
+        monkeypatch.setattr(bar_store.os, 'replace', crash)
+
+        with pytest.raises(KeyboardInterrupt):
+            bar_store.write_frame('QQQ', make_frame(n=20))
+
+        monkeypatch.setattr(bar_store.os, 'replace', replace)
+        assert len(bar_store.read_frame('QQQ')) == 10
+        assert store_files(store_dir) == ['QQQ.bars', 'manifest.json']
+
+
+class TestSegments:
+    """Tests for append-only segmented entries."""
+
+    @pytest.fixture(autouse=True)
+    def small_segments(self, monkeypatch):
+        """Use small segments so tests stay fast."""
+        monkeypatch.setattr(config, 'CACHE_SEGMENT_ROWS', 8)
+        monkeypatch.setattr(config, 'CACHE_MAX_SEGMENTS', 4)
+
+    def test_round_trip_across_segments(self, store_dir):
+        """Test that an entry split into segments reads back whole."""
+        df = make_frame(n=21)
+        bar_store.write_frame('QQQ', df)
+
+        assert store_files(store_dir) == ['QQQ.000001.bars', 'QQQ.bars', 'manifest.json']
+        pd.testing.assert_frame_equal(bar_store.read_frame('QQQ'), df, check_freq=False)
+        assert bar_store.load_manifest()['QQQ']['rows'] == 21
+
+    def test_append_only_rewrites_tail(self, store_dir):
+        """Test that appending a bar leaves existing segments untouched."""
+        df = make_frame(n=40)
+        bar_store.write_frame('QQQ', df.iloc[:20])
+        segment = store_dir / 'QQQ.000001.bars'
+        before = segment.read_bytes()
+        mtime = os.path.getmtime(segment)
+
+        bar_store.write_frame('QQQ', df.iloc[:21])
+
+        assert segment.read_bytes() == before
+        assert os.path.getmtime(segment) == mtime
+        assert bar_store.read_frame('QQQ')['adj_close'].iloc[-1] == df['adj_close'].iloc[20]
+        # The hot tail holds only the rows after the last segment
+        with open(store_dir / 'QQQ.bars', 'rb') as f:
+            header, _ = bar_store._read_header(f, 'QQQ.bars')
+        assert header['rows'] == 5
+
+    def test_full_tail_is_sealed(self, store_dir):
+        """Test that the tail becomes a new segment once it is full."""
+        df = make_frame(n=40)
+        bar_store.write_frame('QQQ', df.iloc[:20])
+        bar_store.write_frame('QQQ', df.iloc[:24])
+
+        assert bar_store.load_manifest()['QQQ']['segments'] == ['QQQ.000001.bars', 'QQQ.000002.bars']
+        pd.testing.assert_frame_equal(bar_store.read_frame('QQQ'), df.iloc[:24], check_freq=False)
+
+    def test_changed_history_rewrites_segments(self, store_dir):
+        """Test that re-adjusted history replaces the old segments."""
+        df = make_frame(n=20)
+        bar_store.write_frame('QQQ', df)
+        adjusted = df * 0.99
+        bar_store.write_frame('QQQ', adjusted)
+
+        assert store_files(store_dir) == ['QQQ.000002.bars', 'QQQ.bars', 'manifest.json']
+        pd.testing.assert_frame_equal(bar_store.read_frame('QQQ'), adjusted, check_freq=False)
+
+    def test_segments_compacted(self, store_dir):
+        """Test that too many segments are merged into one."""
+        df = make_frame(n=60)
+        for n in range(8, 41, 8):
+            bar_store.write_frame('QQQ', df.iloc[:n])
+
+        segments = bar_store.load_manifest()['QQQ']['segments']
+        assert len(segments) == 1
+        assert store_files(store_dir) == sorted(segments + ['QQQ.bars', 'manifest.json'])
+        pd.testing.assert_frame_equal(bar_store.read_frame('QQQ'), df.iloc[:40], check_freq=False)
+
+    def test_compact_entry(self, store_dir):
+        """Test forced compaction keeps data and metadata."""
+        df = make_frame(n=30)
+        bar_store.write_frame('QQQ', df.iloc[:10], metadata={'covers_from': '2024-01-01'})
+        bar_store.write_frame('QQQ', df.iloc[:20], metadata={'covers_from': '2024-01-01'})
+        updated = bar_store.load_manifest()['QQQ']['updated']
+
+        assert bar_store.compact_entry('QQQ')
+
+        info = bar_store.load_manifest()['QQQ']
+        assert len(info['segments']) == 1
+        assert info['updated'] == updated
+        assert info['covers_from'] == '2024-01-01'
+        pd.testing.assert_frame_equal(bar_store.read_frame('QQQ'), df.iloc[:20], check_freq=False)
+        assert not bar_store.compact_entry('NOPE')
+
+    def test_read_retried_after_concurrent_rewrite(self, store_dir, monkeypatch):
+        """Test that a segment removed by a concurrent rewrite does not fail the read."""
+        monkeypatch.setattr(config, 'CACHE_SEGMENT_ROWS', 8)
+        df = make_frame(n=20)
+        bar_store.write_frame('QQQ', df)
+        read_file = bar_store.read_file
+        calls = []
+
+        def racing_read(path, **kwargs):
+            calls.append(path)
+            if len(calls) == 1:
+                # Another writer compacts the entry while this read is running
+                bar_store.write_frame('QQQ', df, compact=True)
+                raise bar_store.CorruptEntryError(f"Missing segment of {path}")
+            return read_file(path, **kwargs)
+        monkeypatch.setattr(bar_store, 'read_file', racing_read)
+
+        pd.testing.assert_frame_equal(bar_store.read_frame('QQQ'), df, check_freq=False)
+        assert calls.count(str(store_dir / 'QQQ.bars')) == 2
+
+    def test_missing_segment_is_corruption(self, store_dir):
+        """Test that a deleted segment invalidates the entry."""
+        bar_store.write_frame('QQQ', make_frame(n=20))
+        (store_dir / 'QQQ.000001.bars').unlink()
+
+        with pytest.raises(bar_store.CorruptEntryError):
+            bar_store.read_frame('QQQ')
+
+    def test_delete_and_rebuild_with_segments(self, store_dir):
+        """Test that segments are removed with the entry and skipped by rebuild."""
+        bar_store.write_frame('QQQ', make_frame(n=20))
+        bar_store.write_frame('TQQQ', make_frame(n=20))
+        (store_dir / 'manifest.json').unlink()
+
+        assert sorted(bar_store.rebuild_manifest()) == ['QQQ', 'TQQQ']
+
+        bar_store.delete_entry('QQQ')
+        assert not any(f.startswith('QQQ.') for f in os.listdir(store_dir))
+
+
+class TestRetention:
+    """Tests for access tracking, LRU eviction and compaction."""
+
+    def test_touch_records_access(self, store_dir):
+        """Test that reads are stamped in one batched manifest update."""
+        bar_store.write_frame('QQQ', make_frame())
+        written = bar_store.load_manifest()['QQQ']['last_access']
+        manifest = (store_dir / 'manifest.json').read_bytes()
+
+        bar_store.touch('QQQ')
+        bar_store.touch('NOPE')
+
+        # Reads never rewrite the manifest
+        assert (store_dir / 'manifest.json').read_bytes() == manifest
+
+        bar_store.flush_access()
+        assert bar_store.load_manifest()['QQQ']['last_access'] > written
+        assert 'NOPE' not in bar_store.load_manifest()
+
+    def test_pending_access_kept_by_other_writes(self, store_dir):
+        """Test that a write of another entry carries the pending read stamps."""
+        bar_store.write_frame('QQQ', make_frame())
+        written = bar_store.load_manifest()['QQQ']['last_access']
+
+        bar_store.touch('QQQ')
+        bar_store.write_frame('TQQQ', make_frame())
+
+        assert bar_store.load_manifest()['QQQ']['last_access'] > written
+
+    def test_least_recently_used_evicted(self, store_dir):
+        """Test that eviction removes the entries read longest ago."""
+        for name in ('OLD', 'QQQ', 'TQQQ'):
+            bar_store.write_frame(name, make_frame(n=50))
+        bar_store.touch('QQQ')
+        bar_store.touch('OLD')
+        size = bar_store.entry_bytes('QQQ')
+
+        evicted = bar_store.enforce_budget(2 * size)
+
+        assert evicted == ['TQQQ']
+        assert sorted(bar_store.load_manifest()) == ['OLD', 'QQQ']
+        assert not (store_dir / 'TQQQ.bars').exists()
+
+    def test_kept_entries_not_evicted(self, store_dir):
+        """Test that protected entries survive even when over budget."""
+        bar_store.write_frame('QQQ', make_frame())
+        bar_store.write_frame('TQQQ', make_frame())
+
+        assert bar_store.enforce_budget(0, keep={'QQQ'}) == ['TQQQ']
+        assert bar_store.enforce_budget(10 ** 9) == []
+
+    def test_compact_store(self, store_dir, monkeypatch):
+        """Test that compaction merges segments and removes leftovers."""
+        monkeypatch.setattr(config, 'CACHE_SEGMENT_ROWS', 8)
+        df = make_frame(n=30)
+        for n in (10, 20, 30):
+            bar_store.write_frame('QQQ', df.iloc[:n])
+        (store_dir / 'QQQ.bars.123.456.tmp').write_bytes(b'partial')
+        (store_dir / 'QQQ.000099.bars').write_bytes(b'orphan')
+
+        stats = bar_store.compact_store()
+
+        assert stats['compacted'] == 1
+        assert stats['removed'] == 1
+        segments = bar_store.load_manifest()['QQQ']['segments']
+        assert len(segments) == 1
+        assert store_files(store_dir) == sorted(segments + ['QQQ.bars', 'manifest.json'])
+        pd.testing.assert_frame_equal(bar_store.read_frame('QQQ'), df, check_freq=False)
+        # Nothing left to do the second time
+        assert bar_store.compact_store()['compacted'] == 0
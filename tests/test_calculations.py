@@ -1,4 +1,5 @@
 """Tests for calculation functions (SMA, percentages, etc.)."""
+import math
 import pytest
 import pandas as pd
 import numpy as np
@@ -8,7 +9,10 @@ import os
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.calculations import compute_sma, pct_distance, format_pct
+from src.calculations import (
+    IncrementalSMA, RollingStats, compute_sma, compute_sma_matrix, hysteresis_positions, rolling_stats,
+    trigger_price, trigger_price_table, pct_distance, format_pct, pct_distance_array, format_pct_array,
+)
 
 
 class TestComputeSMA:
@@ -55,6 +59,247 @@ class TestComputeSMA:
         assert sma.isna().all()
 
 
+class TestRollingStats:
+    """Tests for the compensated rolling statistics kernel."""
+
+    def test_matches_pandas(self):
+        """Test mean, variance, min and max against pandas rolling functions."""
+        values = pd.Series(np.random.default_rng(0).normal(0, 1, 500).cumsum() + 50)
+        values.iloc[100] = np.nan
+        stats = rolling_stats(values.to_numpy(), 20)
+        rolling = values.rolling(20)
+
+        for name, expected in (("mean", rolling.mean()), ("var", rolling.var()),
+                               ("min", rolling.min()), ("max", rolling.max())):
+            np.testing.assert_allclose(stats[name], expected.to_numpy(), rtol=1e-9, equal_nan=True)
+
+    def test_batch_matches_incremental(self):
+        """Test that batch results match the values fed one at a time."""
+        values = np.random.default_rng(1).normal(100, 5, 400)
+        batch = rolling_stats(values, 30, anchor_every=7)
+
+        stats = RollingStats(30, anchor_every=7)
+        means = []
+        for value in values:
+            stats.update(value)
+            means.append(stats.mean)
+
+        np.testing.assert_allclose(batch["mean"], np.array(means), rtol=1e-13, equal_nan=True)
+
+    def test_no_drift_on_long_series(self):
+        """Test that the running sum does not drift over a long series."""
+        values = np.random.default_rng(2).normal(0, 1, 100_000).cumsum() + 1e6
+        stats = rolling_stats(values, 200)
+
+        window = values[-200:]
+        assert stats["mean"][-1] == pytest.approx(math.fsum(window) / 200, rel=1e-15, abs=0)
+        assert stats["var"][-1] == pytest.approx(np.var(window, ddof=1), rel=1e-9)
+
+    def test_variance_with_large_offset(self):
+        """Test that a large price level does not cancel away the variance."""
+        values = 1e9 + np.random.default_rng(3).normal(0, 1e-3, 1000)
+        stats = rolling_stats(values, 100)
+        assert stats["var"][-1] == pytest.approx(np.var(values[-100:], ddof=1), rel=1e-6)
+
+
+class TestSMAMatrix:
+    """Tests for the multi-period SMA matrix."""
+
+    def test_rows_match_compute_sma(self, sample_price_data):
+        """Test that every row equals compute_sma for its period."""
+        prices = sample_price_data['adj_close']
+        periods = range(50, 301, 25)
+        matrix = compute_sma_matrix(prices, periods)
+
+        assert matrix.shape == (len(periods), len(prices))
+        for row, period in zip(matrix, periods):
+            np.testing.assert_allclose(row, compute_sma(prices, period).to_numpy(),
+                                       rtol=1e-10, equal_nan=True)
+
+    def test_nan_windows(self):
+        """Test that windows holding a NaN are NaN, like compute_sma."""
+        prices = pd.Series(np.arange(1.0, 31.0))
+        prices.iloc[10] = np.nan
+        matrix = compute_sma_matrix(prices, [1, 5])
+
+        np.testing.assert_allclose(matrix[1], compute_sma(prices, 5).to_numpy(), equal_nan=True)
+        assert np.isnan(matrix[0, 10]) and matrix[0, 11] == 12.0
+
+    def test_period_longer_than_data(self):
+        """Test that a period longer than the series gives an all-NaN row."""
+        matrix = compute_sma_matrix([1.0, 2.0, 3.0], [2, 5])
+        assert matrix[0].tolist()[1:] == [1.5, 2.5]
+        assert np.isnan(matrix[1]).all()
+
+    def test_invalid_period(self):
+        """Test that non-positive periods are rejected."""
+        with pytest.raises(ValueError):
+            compute_sma_matrix([1.0, 2.0], [0, 1])
+
+
+class TestHysteresisPositions:
+    """Tests for the vectorized BUY/SELL state machine."""
+
+    def test_matches_scalar_state_machine(self):
+        """Test against the bar-by-bar rules on a random walk."""
+        prices = np.random.default_rng(4).normal(0, 1, 3000).cumsum() + 100
+        sma = compute_sma(pd.Series(prices), 50).to_numpy()
+        buy_levels, sell_levels = sma * 1.05, sma * 0.97
+
+        held, trades = hysteresis_positions(prices, buy_levels, sell_levels)
+
+        position, expected_held, expected_trades = False, [], []
+        for i, (price, buy, sell) in enumerate(zip(prices, buy_levels, sell_levels)):
+            if not position and price >= buy or position and price <= sell:
+                position = not position
+                expected_trades.append(i)
+            expected_held.append(position)
+        assert held.tolist() == expected_held
+        assert trades.tolist() == expected_trades
+        assert len(trades) > 4
+
+    def test_initial_position(self):
+        """Test that the starting position is kept until a trigger fires."""
+        held, trades = hysteresis_positions([100, 96, 101], [105] * 3, [97] * 3, invested=True)
+        assert held.tolist() == [True, False, False]
+        assert trades.tolist() == [1]
+
+    def test_ignores_trigger_for_current_side(self):
+        """Test that a BUY trigger while invested (and SELL in cash) is not a trade."""
+        held, trades = hysteresis_positions([110, 111, 90, 80], [105] * 4, [97] * 4)
+        assert held.tolist() == [True, True, False, False]
+        assert trades.tolist() == [0, 2]
+
+    def test_nan_levels_hold(self):
+        """Test that bars without levels keep the position."""
+        held, trades = hysteresis_positions([110, 90], [np.nan, np.nan], [np.nan, np.nan], invested=True)
+        assert held.all() and len(trades) == 0
+
+
+class TestTriggerPrice:
+    """Tests for next-session trigger prices."""
+
+    @pytest.fixture
+    def window(self):
+        """Last 200 closes of a random walk."""
+        return np.random.default_rng(5).normal(0, 1, 200).cumsum() + 400
+
+    def test_close_lands_on_level(self, window):
+        """Test that the trigger close equals multiplier × the SMA including it."""
+        for multiplier in (1.05, 0.97):
+            x = trigger_price(window, multiplier)
+            new_sma = np.mean(np.append(window[1:], x))
+            assert x == pytest.approx(multiplier * new_sma, rel=1e-12)
+
+    def test_flat_path_matches_rolled_window(self, window):
+        """Test each session of the flat path against an explicitly rolled window."""
+        table = trigger_price_table(window, {"buy": 1.05}, sessions=4)
+
+        rolled = list(window)
+        for k in range(4):
+            assert table["flat"]["buy"][k] == pytest.approx(trigger_price(rolled, 1.05), rel=1e-12)
+            rolled = rolled[1:] + [window[-1]]
+
+    def test_first_session_same_for_all_paths(self, window):
+        """Test that the next session does not depend on the assumed path."""
+        table = trigger_price_table(window, {"buy": 1.05, "sell": 0.97}, sessions=3)
+        for scenario in ("flat", "drift", "bootstrap"):
+            assert table[scenario]["sell"][0] == pytest.approx(trigger_price(window, 0.97))
+            assert len(table[scenario]["buy"]) == 3
+
+    def test_bootstrap_repeatable(self, window):
+        """Test that the bootstrap table is the same on every run."""
+        first = trigger_price_table(window, {"buy": 1.05}, sessions=10, paths=200)
+        second = trigger_price_table(window, {"buy": 1.05}, sessions=10, paths=200)
+        np.testing.assert_array_equal(first["bootstrap"]["buy"], second["bootstrap"]["buy"])
+
+    def test_sessions_limited_to_period(self):
+        """Test that the table stops once the window is fully replaced."""
+        table = trigger_price_table([100.0, 101.0, 102.0], {"buy": 1.05}, sessions=10)
+        assert len(table["flat"]["buy"]) == 3
+
+
+class TestIncrementalSMA:
+    """Tests for the O(1) incremental SMA window."""
+
+    def _prices(self, n, seed=0):
+        rng = np.random.default_rng(seed)
+        index = pd.bdate_range('2020-01-01', periods=n, name='Date')
+        return pd.Series(100 + np.cumsum(rng.normal(0, 1, n)), index=index)
+
+    def test_matches_rolling_mean(self):
+        """Test that bar-by-bar updates match the rolling mean."""
+        prices = self._prices(300)
+        expected = compute_sma(prices, 20)
+        sma = IncrementalSMA(20)
+        for i, (date, price) in enumerate(prices.items()):
+            value = sma.update(price, date)
+            if i < 19:
+                assert value is None
+            else:
+                assert value == pytest.approx(expected.iloc[i], rel=1e-12)
+
+    def test_round_trip(self):
+        """Test that a saved window restores to the same state."""
+        sma = IncrementalSMA.from_history(self._prices(50), 20)
+        restored = IncrementalSMA.from_dict(sma.to_dict())
+
+        assert restored.prices() == sma.prices()
+        assert restored.last_date == sma.last_date
+        assert restored.value == pytest.approx(sma.value, rel=1e-12)
+        assert restored.update(123.0) == pytest.approx(sma.update(123.0), rel=1e-12)
+
+    def test_sync_feeds_only_new_bars(self):
+        """Test that a saved window is advanced with the bars after it."""
+        prices = self._prices(260)
+        state = IncrementalSMA.from_history(prices.iloc[:250], 200).to_dict()
+
+        sma = IncrementalSMA.sync(state, prices, 200)
+
+        assert sma.last_date == prices.index[-1]
+        assert sma.value == pytest.approx(compute_sma(prices, 200).iloc[-1], rel=1e-12)
+
+    def test_sync_rebuilds_after_readjustment(self):
+        """Test that a history rescaled by a dividend adjustment is not mixed with the old window."""
+        prices = self._prices(260)
+        state = IncrementalSMA.from_history(prices.iloc[:250], 200).to_dict()
+        adjusted = prices * 0.99
+
+        sma = IncrementalSMA.sync(state, adjusted, 200)
+
+        assert sma.value == pytest.approx(compute_sma(adjusted, 200).iloc[-1], rel=1e-12)
+
+    def test_sync_rebuilds_after_mid_window_revision(self):
+        """Test that a revised bar inside the saved window forces a rebuild."""
+        prices = self._prices(260)
+        state = IncrementalSMA.from_history(prices.iloc[:250], 200).to_dict()
+        revised = prices.copy()
+        revised.iloc[150] += 5.0
+
+        sma = IncrementalSMA.sync(state, revised, 200)
+
+        assert sma.value == pytest.approx(compute_sma(revised, 200).iloc[-1], rel=1e-12)
+
+    @pytest.mark.parametrize("state", [
+        None,
+        {},
+        {"period": 200, "last_date": "2019-01-01", "prices": [1.0] * 200},  # date not in history
+        {"period": 50, "last_date": None, "prices": [1.0] * 50},            # malformed
+        {"period": 3, "last_date": "2020-01-01", "prices": [1.0] * 5},      # too many prices
+    ])
+    def test_sync_rebuilds_invalid_state(self, state):
+        """Test that missing, foreign or malformed state is rebuilt from history."""
+        prices = self._prices(260)
+        sma = IncrementalSMA.sync(state, prices, 200)
+        assert sma.value == pytest.approx(compute_sma(prices, 200).iloc[-1], rel=1e-12)
+
+    def test_short_history(self):
+        """Test that fewer bars than the period give no SMA."""
+        sma = IncrementalSMA.sync(None, self._prices(150), 200)
+        assert sma.value is None
+        assert len(sma.to_dict()["prices"]) == 150
+
+
 class TestPctDistance:
     """Tests for percentage distance calculation."""
 
@@ -133,3 +378,35 @@ class TestFormatPct:
         assert format_pct(1.234567) == "+1.23%"
         assert format_pct(-9.876543) == "-9.88%"
 
+
+class TestArrayFormatting:
+    """Tests for the vectorized percentage helpers."""
+
+    def test_pct_distance_matches_scalar(self):
+        """Test that every element equals pct_distance, with NaN for None."""
+        current = np.array([100.0, 110.0, 0.0, np.nan, 100.0, 485.0])
+        target = np.array([110.0, 100.0, 100.0, 100.0, np.nan, 500 * 0.97])
+
+        result = pct_distance_array(current, target)
+
+        for value, c, t in zip(result, current, target):
+            expected = pct_distance(c, t)
+            if expected is None:
+                assert np.isnan(value)
+            else:
+                assert value == pytest.approx(expected, abs=1e-12)
+
+    def test_pct_distance_scalar_target(self):
+        """Test that a single target is broadcast over the array."""
+        np.testing.assert_allclose(pct_distance_array([100.0, 50.0], 110.0), [10.0, 120.0])
+
+    def test_format_matches_scalar(self):
+        """Test that every element equals format_pct."""
+        values = [5.5, 10.0, -3.25, 0.0, 1.234567, -9.876543, None, float('nan')]
+        assert format_pct_array(values).tolist() == [format_pct(v) for v in values]
+
+    def test_prefix_and_missing_text(self):
+        """Test hover-style text: prefix on values only, custom text for missing ones."""
+        text = format_pct_array([7.99, np.nan], na="", prefix="vs SMA: ")
+        assert text.tolist() == ["vs SMA: +7.99%", ""]
+
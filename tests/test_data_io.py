@@ -2,15 +2,19 @@
 Tests for data fetching and CSV logging functionality.
 """
 import pytest
+import numpy as np
 import pandas as pd
 import csv
+import logging
 import os
+import threading
+import time
 from datetime import datetime, timezone, timedelta
 from unittest.mock import Mock, patch, MagicMock
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src import data_fetcher, logger, config
+from src import bar_store, data_fetcher, logger, config
 
 
 class TestYahooFinanceDataFetching:
@@ -18,8 +22,8 @@ class TestYahooFinanceDataFetching:
 
     def test_fetch_adj_close_success(self, monkeypatch, tmp_path):
         """Test successful data fetch from Yahoo Finance."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
 
         # Mock the fetch_data_with_retry function
         mock_data = pd.DataFrame({
@@ -43,17 +47,16 @@ class TestYahooFinanceDataFetching:
 
     def test_fetch_adj_close_with_cache_hit(self, monkeypatch, tmp_path):
         """Test fetch with cache hit."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
 
-        # Prepare cached data
-        cached_df = pd.DataFrame({'adj_close': [100.0, 101.0, 102.0]})
-        cache_data = {
-            'TEST_3y': cached_df
-        }
-
-        # Mock load_cache to return cached data
-        monkeypatch.setattr(data_fetcher, 'load_cache', lambda: cache_data)
+        # Prepare cached data covering the requested window
+        cached_df = pd.DataFrame(
+            {'adj_close': [100.0, 101.0, 102.0]},
+            index=pd.date_range(pd.Timestamp.now().normalize() - pd.Timedelta(days=2), periods=3, freq='D')
+        )
+        three_years_ago = (pd.Timestamp.now() - pd.DateOffset(years=3)).strftime('%Y-%m-%d')
+        data_fetcher.save_cache({'TEST': cached_df}, coverage={'TEST': three_years_ago})
 
         # Mock fetch_data_with_retry (should not be called)
         fetch_called = [False]
@@ -73,11 +76,11 @@ class TestYahooFinanceDataFetching:
 
     def test_fetch_adj_close_with_cache_miss(self, monkeypatch, tmp_path):
         """Test fetch with cache miss (stale or no cache)."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
 
         # Mock load_cache to return None (cache miss)
-        monkeypatch.setattr(data_fetcher, 'load_cache', lambda: None)
+        monkeypatch.setattr(data_fetcher, 'load_cache', lambda keys=None: None)
 
         # Mock fetch_data_with_retry
         mock_data = pd.DataFrame({
@@ -92,7 +95,7 @@ class TestYahooFinanceDataFetching:
 
         # Mock save_cache to track if it was called
         save_cache_called = []
-        def mock_save_cache(data):
+        def mock_save_cache(data, coverage=None):
             save_cache_called.append(data)
 
         monkeypatch.setattr(data_fetcher, 'save_cache', mock_save_cache)
@@ -105,13 +108,13 @@ class TestYahooFinanceDataFetching:
 
         # Verify cache was saved
         assert len(save_cache_called) == 1
-        assert 'TEST_3y' in save_cache_called[0]
+        assert 'TEST' in save_cache_called[0]
 
     def test_fetch_adj_close_empty_data_raises_error(self, monkeypatch, tmp_path):
         """Test handling of empty data from Yahoo Finance."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
-        monkeypatch.setattr(data_fetcher, 'load_cache', lambda: None)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
+        monkeypatch.setattr(data_fetcher, 'load_cache', lambda keys=None: None)
 
         # Mock fetch_data_with_retry to return empty DataFrame
         def mock_fetch(*args, **kwargs):
@@ -168,9 +171,9 @@ class TestYahooFinanceDataFetching:
 
     def test_fetch_multiple_symbols(self, monkeypatch, tmp_path):
         """Test fetching data for multiple symbols."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
-        monkeypatch.setattr(data_fetcher, 'load_cache', lambda: None)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
+        monkeypatch.setattr(data_fetcher, 'load_cache', lambda keys=None: None)
 
         call_count = {'QQQ': 0, 'TQQQ': 0}
 
@@ -189,7 +192,7 @@ class TestYahooFinanceDataFetching:
             return pd.DataFrame()
 
         monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
-        monkeypatch.setattr(data_fetcher, 'save_cache', lambda x: None)
+        monkeypatch.setattr(data_fetcher, 'save_cache', lambda data, coverage=None: None)
 
         qqq_result = data_fetcher.fetch_adj_close('QQQ', 3, use_cache=False)
         tqqq_result = data_fetcher.fetch_adj_close('TQQQ', 5, use_cache=False)
@@ -200,6 +203,892 @@ class TestYahooFinanceDataFetching:
         assert tqqq_result['adj_close'].iloc[0] == 50.0
 
 
+class TestNormalizeBars:
+    """Test the ingestion stage that normalizes downloaded frames."""
+
+    def test_flattens_yfinance_columns(self):
+        """Test that (field, ticker) columns become flat lower-case names."""
+        index = pd.date_range('2024-01-01', periods=3, freq='D')
+        columns = pd.MultiIndex.from_product([['Adj Close', 'Close', 'Volume'], ['QQQ']], names=['Price', 'Ticker'])
+        raw = pd.DataFrame(np.arange(9, dtype=float).reshape(3, 3) + 1, index=index, columns=columns)
+
+        df = data_fetcher.normalize_bars(raw, 'QQQ')
+
+        assert list(df.columns) == ['adj_close', 'close', 'volume']
+        assert df.index.name == 'Date'
+        assert (df.dtypes == np.float64).all()
+        assert isinstance(df['adj_close'], pd.Series)
+
+    def test_ticker_level_first(self):
+        """Test flattening when the ticker is the outer column level."""
+        index = pd.date_range('2024-01-01', periods=2, freq='D')
+        columns = pd.MultiIndex.from_product([['QQQ'], ['Adj Close', 'Close']])
+        raw = pd.DataFrame([[1.0, 2.0], [3.0, 4.0]], index=index, columns=columns)
+
+        assert list(data_fetcher.normalize_bars(raw).columns) == ['adj_close', 'close']
+
+    def test_sorts_dedupes_and_coerces(self):
+        """Test that unsorted, duplicated and string-typed input is cleaned up."""
+        raw = pd.DataFrame({
+            'Adj Close': ['101.0', '100.0', '102.5', '102.0'],
+        }, index=['2024-01-02', '2024-01-01', '2024-01-03', '2024-01-03'])
+
+        df = data_fetcher.normalize_bars(raw, 'QQQ')
+
+        assert df.index.is_monotonic_increasing
+        assert df.index.is_unique
+        # The last duplicate wins
+        assert df['adj_close'].tolist() == [100.0, 101.0, 102.0]
+
+    def test_drops_missing_and_zero_bars(self, capsys):
+        """Test that bars with missing or non-positive prices are removed."""
+        index = pd.date_range('2024-01-01', periods=5, freq='D')
+        raw = pd.DataFrame({'Adj Close': [100.0, np.nan, 0.0, 'n/a', 101.0]}, index=index)
+
+        df = data_fetcher.normalize_bars(raw, 'QQQ')
+
+        assert df['adj_close'].tolist() == [100.0, 101.0]
+        assert "Dropped 3 bar(s)" in capsys.readouterr().out
+
+    def test_spikes_flagged_not_dropped(self, capsys):
+        """Test that a large one-session move is reported but kept."""
+        index = pd.date_range('2024-01-01', periods=4, freq='D')
+        raw = pd.DataFrame({'Adj Close': [100.0, 101.0, 250.0, 102.0]}, index=index)
+
+        flags = data_fetcher.flag_bars(data_fetcher.normalize_bars(raw, 'QQQ'))
+
+        assert flags['spike'].tolist() == [False, False, True, True]
+        assert "Large one-session move" in capsys.readouterr().out
+
+    def test_empty_frame(self):
+        """Test that an empty download stays empty."""
+        assert data_fetcher.normalize_bars(pd.DataFrame()).empty
+
+
+class TestIncrementalFetching:
+    """Test incremental (delta) fetching on top of a stale cache."""
+
+    def _write_stale_cache(self, monkeypatch, tmp_path, df, key='TEST'):
+        """Cache ``df`` under ``key`` and make it look older than the last close."""
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
+        data_fetcher.save_cache({key: df}, coverage={key: data_fetcher.FULL_HISTORY})
+        monkeypatch.setattr(
+            data_fetcher, 'get_last_market_close',
+            lambda: datetime.now(timezone.utc) + timedelta(hours=1)
+        )
+
+    def _bars(self, adj_close, index, close=None):
+        """Full OHLCV record (every column of STORED_COLUMNS) for the given prices."""
+        close = np.asarray(adj_close if close is None else close, dtype=float)
+        return pd.DataFrame({'adj_close': np.asarray(adj_close, dtype=float), 'close': close,
+                             'open': close, 'high': close + 1, 'low': close - 1,
+                             'volume': np.full(len(close), 1000.0)}, index=index)
+
+    def test_fetches_only_missing_bars(self, monkeypatch, tmp_path):
+        """Test that a stale cache is extended with only the new bars."""
+        dates = pd.date_range('2024-01-01', periods=5, freq='D')
+        cached = self._bars([100.0, 101.0, 102.0, 103.0, 104.0], dates)
+        self._write_stale_cache(monkeypatch, tmp_path, cached)
+
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            return self._bars([104.0, 105.0, 106.0], pd.date_range('2024-01-05', periods=3, freq='D'))
+
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher.fetch_adj_close('TEST', 3, use_cache=True)
+
+        # Only one request, re-fetching the last few cached bars
+        assert len(calls) == 1
+        assert calls[0]['start'] == '2024-01-01'
+        assert 'period' not in calls[0]
+
+        assert list(result.columns) == data_fetcher.STORED_COLUMNS
+        assert len(result) == 7
+        assert not result.isna().any().any()
+        assert result['adj_close'].iloc[-1] == 106.0
+        assert result.index.is_unique
+
+    def test_overlap_mismatch_triggers_full_refetch(self, monkeypatch, tmp_path):
+        """Test that a re-adjusted history falls back to a full download."""
+        dates = pd.date_range('2024-01-01', periods=3, freq='D')
+        cached = self._bars([100.0, 101.0, 102.0], dates)
+        self._write_stale_cache(monkeypatch, tmp_path, cached)
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+
+        full = self._bars([99.0, 100.0, 101.0, 102.0], pd.date_range('2024-01-01', periods=4, freq='D'),
+                          close=[100.0, 101.0, 102.0, 103.0])
+
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            if 'start' in kwargs:
+                # Overlapping bar no longer matches the cached value
+                return full.loc['2024-01-03':]
+            return full
+
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher.fetch_adj_close('TEST', 3, use_cache=True)
+
+        # Full refetch covers the cached entry's whole range
+        assert len(calls) == 2
+        assert 'start' not in calls[1]
+        assert calls[1]['period'] == 'max'
+        assert result['adj_close'].tolist() == [99.0, 100.0, 101.0, 102.0]
+
+    def test_readjusted_history_is_rescaled(self, monkeypatch, tmp_path):
+        """Test that a dividend re-adjustment rescales the cache instead of refetching."""
+        dates = pd.date_range('2024-01-01', periods=6, freq='D')
+        close = np.array([100.0, 101.0, 102.0, 103.0, 104.0, 105.0])
+        cached = self._bars(close[:5], dates[:5])
+        self._write_stale_cache(monkeypatch, tmp_path, cached)
+
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            # Dividend paid on the new bar: all earlier adj_close values scale down
+            adj = close * 0.98
+            adj[-1] = close[-1]
+            delta = self._bars(adj, dates, close=close)
+            return delta.loc[kwargs['start']:]
+
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher.fetch_adj_close('TEST', 3, use_cache=True)
+
+        assert len(calls) == 1
+        np.testing.assert_allclose(result['adj_close'].to_numpy()[:5], close[:5] * 0.98)
+        assert result['adj_close'].iloc[-1] == 105.0
+        assert result['close'].tolist() == close.tolist()
+
+    def test_changed_raw_close_triggers_full_refetch(self, monkeypatch, tmp_path):
+        """Test that revised raw prices are not mistaken for a re-adjustment."""
+        dates = pd.date_range('2024-01-01', periods=4, freq='D')
+        cached = self._bars([100.0, 101.0, 102.0], dates[:3])
+        self._write_stale_cache(monkeypatch, tmp_path, cached)
+
+        # 2:1 split: adj_close and close both halve by the same factor
+        full = self._bars([50.0, 50.5, 51.0, 51.5], dates)
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            return full.loc[kwargs['start']:] if 'start' in kwargs else full
+
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher.fetch_adj_close('TEST', 3, use_cache=True)
+
+        assert len(calls) == 2
+        assert calls[1]['period'] == 'max'
+        assert result['adj_close'].tolist() == [50.0, 50.5, 51.0, 51.5]
+
+    def test_partial_entry_is_refetched(self, monkeypatch, tmp_path):
+        """Test that an entry without the full record (e.g. legacy adj_close only) is not extended."""
+        dates = pd.date_range('2024-01-01', periods=4, freq='D')
+        cached = pd.DataFrame({'adj_close': [100.0, 101.0, 102.0]}, index=dates[:3])
+        self._write_stale_cache(monkeypatch, tmp_path, cached)
+
+        full = self._bars([100.0, 101.0, 102.0, 103.0], dates)
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            return full.loc[kwargs['start']:] if 'start' in kwargs else full
+
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher.fetch_adj_close('TEST', 3, use_cache=True)
+
+        assert len(calls) == 1
+        assert calls[0]['period'] == 'max'
+        assert result['close'].tolist() == [100.0, 101.0, 102.0, 103.0]
+        assert bar_store.load_manifest()['TEST']['columns'] == data_fetcher.STORED_COLUMNS
+
+    def test_merge_rejects_columns_missing_from_cache(self):
+        """Test that new bars are not appended under columns the cache lacks."""
+        dates = pd.date_range('2024-01-01', periods=4, freq='D')
+        cached = pd.DataFrame({'adj_close': [100.0, 101.0, 102.0]}, index=dates[:3])
+
+        assert data_fetcher._merge_incremental(cached, self._bars([102.0, 103.0], dates[2:])) is None
+
+    def test_incremental_fetch_disabled(self, monkeypatch, tmp_path):
+        """Test that INCREMENTAL_FETCH=False always downloads the full window."""
+        dates = pd.date_range('2024-01-01', periods=3, freq='D')
+        cached = pd.DataFrame({'adj_close': [100.0, 101.0, 102.0]}, index=dates)
+        self._write_stale_cache(monkeypatch, tmp_path, cached)
+        monkeypatch.setattr(config, 'INCREMENTAL_FETCH', False)
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            return pd.DataFrame({'adj_close': [100.0, 101.0, 102.0, 103.0]},
+                                index=pd.date_range('2024-01-01', periods=4, freq='D'))
+
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        data_fetcher.fetch_adj_close('TEST', 3, use_cache=True)
+
+        assert len(calls) == 1
+        assert 'start' not in calls[0]
+
+    def test_stale_entries_survive_other_updates(self, monkeypatch, tmp_path):
+        """Test that refreshing one entry does not mark other entries fresh."""
+        dates = pd.date_range('2024-01-01', periods=3, freq='D')
+        cached = pd.DataFrame({'adj_close': [100.0, 101.0, 102.0]}, index=dates)
+        self._write_stale_cache(monkeypatch, tmp_path, cached, key='OTHER')
+        market_close = datetime.now(timezone.utc)
+
+        data_fetcher.save_cache({'TEST': cached})
+
+        # Fresh entry is served, stale one is withheld but still available
+        monkeypatch.setattr(data_fetcher, 'get_last_market_close', lambda: market_close)
+        fresh = data_fetcher.load_cache()
+        assert 'TEST' in fresh
+        assert 'OTHER' not in fresh
+        assert data_fetcher.load_stale_entry('OTHER').equals(cached)
+
+
+class TestCoverageLookup:
+    """Test serving sub-windows from the longest cached series."""
+
+    def _history(self, years):
+        """Daily bars ending today and starting ``years`` ago."""
+        end = pd.Timestamp.now().normalize()
+        index = pd.date_range(end - pd.DateOffset(years=years), end, freq='D')
+        return pd.DataFrame({'adj_close': np.arange(len(index), dtype=float) + 100.0,
+                             'close': np.arange(len(index), dtype=float) + 100.0}, index=index)
+
+    def _no_fetch(self, monkeypatch):
+        """Fail the test if any download is attempted."""
+        def mock_fetch(*args, **kwargs):
+            raise AssertionError("network fetch not expected")
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+    def test_shorter_window_sliced_from_cache(self, monkeypatch, tmp_path):
+        """Test that a 3y request is served from a cached 5y series."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', lambda symbol, **kw: self._history(5))
+
+        five = data_fetcher.fetch_adj_close('QQQ', 5)
+
+        self._no_fetch(monkeypatch)
+        three = data_fetcher.fetch_adj_close('QQQ', 3)
+
+        assert len(three) < len(five)
+        assert three.index[0] >= pd.Timestamp.now().normalize() - pd.DateOffset(years=3)
+        assert three.index[-1] == five.index[-1]
+        # One entry per symbol, no duplicate storage
+        assert list(bar_store.load_manifest()) == ['QQQ']
+
+    def test_start_date_served_from_full_history(self, monkeypatch, tmp_path):
+        """Test that a start-date request is served from a period='max' entry."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            return self._history(10)
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        data_fetcher.fetch_adj_close('QQQ')
+        assert calls[0]['period'] == 'max'
+
+        self._no_fetch(monkeypatch)
+        start = (pd.Timestamp.now() - pd.DateOffset(years=7)).strftime('%Y-%m-%d')
+        result = data_fetcher.fetch_adj_close('QQQ', start=start)
+        assert result.index[0] >= pd.Timestamp(start)
+        assert data_fetcher.fetch_adj_close('QQQ', 5).index[0] >= pd.Timestamp.now().normalize() - pd.DateOffset(years=5)
+
+    def test_longer_window_replaces_entry(self, monkeypatch, tmp_path):
+        """Test that a request reaching past the cache refetches and widens it."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            return self._history(int(kwargs['period'][:-1]))
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        data_fetcher.fetch_adj_close('QQQ', 3)
+        data_fetcher.fetch_adj_close('QQQ', 5)
+        assert [c['period'] for c in calls] == ['3y', '5y']
+
+        self._no_fetch(monkeypatch)
+        assert len(data_fetcher.fetch_adj_close('QQQ', 3)) < len(data_fetcher.fetch_adj_close('QQQ', 5))
+
+    def test_column_projection(self, monkeypatch, tmp_path):
+        """Test that the full OHLCV record is cached and callers get only what they ask for."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+
+        def mock_fetch(symbol, **kwargs):
+            df = self._history(3)
+            df['open'] = df['close'] - 1
+            df['volume'] = 1000.0
+            return df
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        first = data_fetcher.fetch_adj_close('QQQ', 3, columns=['adj_close'])
+        assert list(first.columns) == ['adj_close']
+        assert bar_store.load_manifest()['QQQ']['columns'] == ['adj_close', 'close', 'open', 'volume']
+
+        self._no_fetch(monkeypatch)
+        bars = data_fetcher.fetch_adj_close('QQQ', 3, columns=['open', 'volume'])
+        assert list(bars.columns) == ['open', 'volume']
+        assert bars['volume'].iloc[-1] == 1000
+
+    def test_missing_column_refetches(self, monkeypatch, tmp_path):
+        """Test that asking for a column the entry does not store downloads it."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', lambda symbol, **kw: self._history(3))
+        data_fetcher.fetch_adj_close('QQQ', 3)
+
+        assert data_fetcher.lookup_cached('QQQ', years=3, columns=['high']) is None
+        calls = []
+        def mock_fetch(symbol, **kwargs):
+            calls.append(kwargs)
+            df = self._history(3)
+            df['high'] = df['close'] + 1
+            return df
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher.fetch_adj_close('QQQ', 3, columns=['high'])
+        assert len(calls) == 1
+        assert not result['high'].isna().any()
+
+    def test_lookup_cached_miss(self, monkeypatch, tmp_path):
+        """Test lookup_cached without a covering entry."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        assert data_fetcher.lookup_cached('QQQ', years=3) is None
+
+
+class TestIntradayResampling:
+    """Test collapsing intraday fallback bars into daily bars."""
+
+    def _intraday(self, start, end, freq='30min'):
+        """Half-hourly bars in exchange time, including pre/post market."""
+        index = pd.date_range(start, end, freq=freq, tz='America/New_York', name='Datetime')
+        n = len(index)
+        return pd.DataFrame({
+            'open': np.arange(n, dtype=float),
+            'high': np.arange(n, dtype=float) + 1,
+            'low': np.arange(n, dtype=float) - 1,
+            'close': np.arange(n, dtype=float),
+            'adj_close': np.arange(n, dtype=float),
+            'volume': np.ones(n, dtype=np.int64),
+        }, index=index)
+
+    def test_one_bar_per_session(self):
+        """Test that each session collapses to first/max/min/last/sum."""
+        df = self._intraday('2024-01-02 09:30', '2024-01-03 15:30')
+        daily = data_fetcher.resample_to_daily(df)
+
+        assert list(daily.index) == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-03')]
+        assert daily.index.name == 'Date'
+        assert list(daily.columns) == list(df.columns)
+        first_day = df.loc['2024-01-02 09:30':'2024-01-02 15:30']
+        assert daily['open'].iloc[0] == first_day['open'].iloc[0]
+        assert daily['high'].iloc[0] == first_day['high'].max()
+        assert daily['low'].iloc[0] == first_day['low'].min()
+        assert daily['adj_close'].iloc[0] == first_day['adj_close'].iloc[-1]
+        assert daily['volume'].iloc[0] == 13
+
+    def test_outside_hours_and_holidays_dropped(self):
+        """Test that overnight bars and holiday bars do not create sessions."""
+        df = self._intraday('2024-07-03 04:00', '2024-07-05 20:00')
+        daily = data_fetcher.resample_to_daily(df)
+
+        # July 3rd closes at 13:00 ET, July 4th is a holiday
+        assert list(daily.index) == [pd.Timestamp('2024-07-03'), pd.Timestamp('2024-07-05')]
+        early = df.loc['2024-07-03 09:30':'2024-07-03 12:30']
+        assert daily['adj_close'].iloc[0] == early['adj_close'].iloc[-1]
+        assert daily['volume'].iloc[0] == len(early)
+
+    def test_naive_timestamps_are_utc(self):
+        """Test that naive intraday timestamps are interpreted as UTC."""
+        df = self._intraday('2024-01-02 09:30', '2024-01-02 15:30')
+        df.index = df.index.tz_convert('UTC').tz_localize(None)
+        daily = data_fetcher.resample_to_daily(df)
+        assert len(daily) == 1
+
+    def test_fallback_returns_daily_bars(self, monkeypatch, tmp_path):
+        """Test that the 1h fallback is cached as daily bars."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        hourly = self._intraday('2024-01-02 09:30', '2024-01-12 15:30', freq='1h')
+
+        def mock_fetch(symbol, interval="1d", **kwargs):
+            return hourly if interval == "1h" else pd.DataFrame()
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher.fetch_adj_close('TEST', 3)
+
+        assert len(result) == 9
+        assert (result.index == result.index.normalize()).all()
+        assert bar_store.load_manifest()['TEST']['rows'] == 9
+
+    def test_fallback_coverage_starts_at_first_bar(self, monkeypatch, tmp_path):
+        """Test that a short intraday fallback does not claim the requested window."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        hourly = self._intraday('2024-01-02 09:30', '2024-01-12 15:30', freq='1h')
+        calls = []
+
+        def mock_fetch(symbol, interval="1d", **kwargs):
+            calls.append(interval)
+            return hourly if interval == "1h" else pd.DataFrame()
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        data_fetcher.fetch_adj_close('TEST', start='2023-01-02')
+
+        assert bar_store.load_manifest()['TEST']['covers_from'] == '2024-01-02'
+        # The requested window is not served from the short entry
+        assert data_fetcher.cache_status('TEST', start='2023-01-02') == 'miss'
+        assert data_fetcher.cache_status('TEST', start='2024-01-02') != 'miss'
+
+
+class TestHedgedFetch:
+    """Test hedged fallback requests for full-window downloads."""
+
+    def _daily(self):
+        index = pd.date_range('2024-01-02', periods=5, freq='B', name='Date')
+        return pd.DataFrame({'adj_close': [100.0, 101.0, 102.0, 103.0, 104.0],
+                             'close': [100.0, 101.0, 102.0, 103.0, 104.0]}, index=index)
+
+    def test_slow_daily_is_hedged(self, monkeypatch):
+        """Test that a hung daily request is overtaken and cancelled."""
+        monkeypatch.setattr(config, 'HEDGE_DELAY', 0.05)
+        hourly = TestIntradayResampling()._intraday('2024-01-02 09:30', '2024-01-03 15:30', freq='1h')
+        cancelled = threading.Event()
+
+        def mock_fetch(symbol, interval="1d", cancel=None, **kwargs):
+            if interval == "1d":
+                if cancel.wait(5):
+                    cancelled.set()
+                return pd.DataFrame()
+            return hourly if interval == "1h" else pd.DataFrame()
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        start = time.monotonic()
+        result = data_fetcher._fetch_full_window('TEST', 3)
+
+        assert time.monotonic() - start < 2
+        assert len(result) == 2
+        assert cancelled.wait(2)
+
+    def test_fast_daily_wins(self, monkeypatch):
+        """Test that no fallback is started when the daily request answers in time."""
+        calls = []
+
+        def mock_fetch(symbol, interval="1d", **kwargs):
+            calls.append(interval)
+            return self._daily()
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher._fetch_full_window('TEST', 3)
+
+        assert calls == ['1d']
+        assert len(result) == 5
+
+    def test_failed_request_starts_next_immediately(self, monkeypatch):
+        """Test that a failed request does not wait for the hedge deadline."""
+        monkeypatch.setattr(config, 'HEDGE_DELAY', 60)
+        calls = []
+
+        def mock_fetch(symbol, interval="1d", **kwargs):
+            calls.append(interval)
+            return pd.DataFrame()
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        start = time.monotonic()
+        with pytest.raises(RuntimeError):
+            data_fetcher._fetch_full_window('TEST', 3)
+
+        assert calls == ['1d', '1h', '30m']
+        assert time.monotonic() - start < 2
+
+    def test_hung_fallbacks_give_up(self, monkeypatch):
+        """Test that the wait after the last fallback is bounded by the remaining retries."""
+        monkeypatch.setattr(config, 'HEDGE_DELAY', 0.05)
+        release = threading.Event()
+
+        def mock_fetch(symbol, interval="1d", **kwargs):
+            release.wait(10)
+            return pd.DataFrame()
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        start = time.monotonic()
+        try:
+            with pytest.raises(RuntimeError):
+                data_fetcher._fetch_full_window('TEST', 3)
+        finally:
+            release.set()
+
+        # Two hedge delays to launch every fallback, then 0.05s per remaining retry (7)
+        assert time.monotonic() - start < 2
+
+    def test_sequential_mode(self, monkeypatch):
+        """Test that HEDGED_FETCH=False tries the intervals one after another."""
+        monkeypatch.setattr(config, 'HEDGED_FETCH', False)
+        hourly = TestIntradayResampling()._intraday('2024-01-02 09:30', '2024-01-03 15:30', freq='1h')
+        calls = []
+
+        def mock_fetch(symbol, interval="1d", **kwargs):
+            calls.append((interval, kwargs.get('cancel')))
+            return hourly if interval == "30m" else pd.DataFrame()
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        result = data_fetcher._fetch_full_window('TEST', 3)
+
+        assert calls == [('1d', None), ('1h', None), ('30m', None)]
+        assert len(result) == 2
+
+    def test_cancel_stops_retries(self, monkeypatch):
+        """Test that a set cancel event stops further download attempts."""
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: 0.0)
+        attempts = []
+        cancel = threading.Event()
+
+        def mock_download(*args, **kwargs):
+            attempts.append(1)
+            cancel.set()
+            raise RuntimeError("timeout")
+
+        with patch('yfinance.download', side_effect=mock_download):
+            df = data_fetcher.fetch_data_with_retry('QQQ', retries=3, cancel=cancel)
+
+        assert df.empty
+        assert len(attempts) == 1
+
+
+class TestTokenBucket:
+    """Test the shared request rate limiter."""
+
+    def test_burst_is_immediate(self):
+        """Test that requests within the burst size do not wait."""
+        bucket = data_fetcher.TokenBucket(rate=1.0, capacity=3)
+        assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+    def test_waits_when_empty(self, monkeypatch):
+        """Test that an empty bucket sleeps until a token refills."""
+        clock = [0.0]
+        sleeps = []
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+        monkeypatch.setattr(data_fetcher.time, 'monotonic', lambda: clock[0])
+        monkeypatch.setattr(data_fetcher.time, 'sleep', fake_sleep)
+
+        bucket = data_fetcher.TokenBucket(rate=2.0, capacity=1)
+        bucket.acquire()
+        waited = bucket.acquire()
+
+        assert waited == pytest.approx(0.5)
+        assert sleeps == [pytest.approx(0.5)]
+
+    def test_download_uses_rate_limiter(self, monkeypatch):
+        """Test that every download attempt takes a token."""
+        acquired = []
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: acquired.append(tokens))
+
+        mock_data = pd.DataFrame({'Adj Close': [100.0]}, index=pd.date_range('2024-01-01', periods=1))
+        with patch('yfinance.download', return_value=mock_data):
+            data_fetcher.fetch_data_with_retry('QQQ')
+            data_fetcher.fetch_batch_with_retry(['QQQ'])
+
+        assert acquired == [1, 1]
+
+
+class TestSharedRateLimiter:
+    """Test the on-disk rate limiter shared between processes."""
+
+    def test_budget_shared_between_buckets(self, monkeypatch, tmp_path):
+        """Test that two buckets on the same file draw from one budget."""
+        state_file = str(tmp_path / "rate.json")
+        sleeps = []
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: sleeps.append(s))
+        monkeypatch.setattr(data_fetcher.time, 'time', lambda: 1000.0 + sum(sleeps))
+
+        first = data_fetcher.TokenBucket(rate=1.0, capacity=2, state_file=state_file)
+        second = data_fetcher.TokenBucket(rate=1.0, capacity=2, state_file=state_file)
+
+        first.acquire()
+        first.acquire()
+        # The second "process" finds the bucket already drained
+        waited = second.acquire()
+
+        assert waited == pytest.approx(1.0)
+        assert os.path.exists(state_file)
+
+    def test_cooldown_persists(self, monkeypatch, tmp_path):
+        """Test that a recorded 429 makes later buckets wait out the cooldown."""
+        state_file = str(tmp_path / "rate.json")
+        sleeps = []
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: sleeps.append(s))
+        monkeypatch.setattr(data_fetcher.time, 'time', lambda: 1000.0 + sum(sleeps))
+
+        data_fetcher.TokenBucket(rate=1.0, capacity=2, state_file=state_file).record_rate_limit(30)
+
+        later_run = data_fetcher.TokenBucket(rate=1.0, capacity=2, state_file=state_file)
+        assert later_run.cooldown_remaining() == pytest.approx(30.0)
+        assert later_run.acquire() == pytest.approx(30.0)
+        assert later_run.cooldown_remaining() == 0.0
+
+    def test_corrupt_state_file_is_reset(self, tmp_path):
+        """Test that an unreadable state file starts a fresh bucket."""
+        state_file = tmp_path / "rate.json"
+        state_file.write_text("{not json")
+
+        bucket = data_fetcher.TokenBucket(rate=1.0, capacity=2, state_file=str(state_file))
+        assert bucket.acquire() == 0.0
+
+    def test_429_records_cooldown(self, monkeypatch):
+        """Test that a rate-limited download records a shared cooldown."""
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: 0.0)
+        monkeypatch.setattr(config, 'RATE_LIMIT_COOLDOWN', 45)
+
+        with patch('yfinance.download', side_effect=Exception("429 Too Many Requests")):
+            result = data_fetcher.fetch_data_with_retry('TEST', retries=1, initial_delay=0)
+
+        assert result.empty
+        assert data_fetcher._rate_limiter.cooldown_remaining() == pytest.approx(45.0, abs=1.0)
+
+
+class TestCircuitBreaker:
+    """Test the persistent circuit breaker on the market data endpoint."""
+
+    def _breaker(self, tmp_path, **kwargs):
+        return data_fetcher.CircuitBreaker(state_file=str(tmp_path / "breaker.json"), **kwargs)
+
+    def test_opens_after_threshold(self, tmp_path):
+        """Test that consecutive failures open the breaker and refuse requests."""
+        breaker = self._breaker(tmp_path, failure_threshold=3)
+        assert breaker.record_failure() is False
+        assert breaker.record_failure() is False
+        assert breaker.allow_request()
+        assert breaker.record_failure() is True
+        assert breaker.is_open()
+        assert not breaker.allow_request()
+
+    def test_success_resets_failures(self, tmp_path):
+        """Test that a success in between keeps the breaker closed."""
+        breaker = self._breaker(tmp_path, failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert not breaker.is_open()
+
+    def test_rate_limit_opens_immediately(self, tmp_path):
+        """Test that one rate-limit answer opens the breaker."""
+        breaker = self._breaker(tmp_path)
+        assert breaker.record_failure(rate_limited=True)
+        assert 'open until' in breaker.describe()
+
+    def test_state_survives_across_runs(self, tmp_path):
+        """Test that a new breaker on the same file sees the open state."""
+        self._breaker(tmp_path).record_failure(rate_limited=True)
+        assert self._breaker(tmp_path).is_open()
+
+    def test_half_open_probe(self, monkeypatch, tmp_path):
+        """Test that one probe is allowed after the cooldown and decides the state."""
+        clock = [1000.0]
+        monkeypatch.setattr(data_fetcher.time, 'time', lambda: clock[0])
+        breaker = self._breaker(tmp_path, cooldown=60, max_cooldown=100)
+        breaker.record_failure(rate_limited=True)
+
+        clock[0] += 61
+        assert breaker.allow_request()      # the probe
+        assert not breaker.allow_request()  # everyone else waits for it
+        assert breaker.record_failure()
+
+        # A failed probe doubles the cooldown, capped at max_cooldown
+        clock[0] += 99
+        assert breaker.is_open()
+        clock[0] += 2
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert not breaker.is_open()
+        assert breaker.allow_request()
+
+    def test_stops_retrying_when_open(self, monkeypatch):
+        """Test that a rate-limited download is not retried once the breaker opens."""
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: 0.0)
+
+        with patch('yfinance.download', side_effect=Exception("429 Too Many Requests")) as mock_download:
+            assert data_fetcher.fetch_data_with_retry('TEST', retries=3).empty
+            assert data_fetcher.fetch_data_with_retry('TEST', retries=3).empty
+
+        assert mock_download.call_count == 1
+
+    def test_empty_answer_is_not_a_failure(self, monkeypatch):
+        """Test that empty answers (e.g. an unserved intraday range) never open the breaker."""
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: 0.0)
+        monkeypatch.setattr(data_fetcher._circuit_breaker, 'failure_threshold', 2)
+
+        with patch('yfinance.download', return_value=pd.DataFrame()) as mock_download:
+            assert data_fetcher.fetch_data_with_retry('TEST', interval='30m', retries=3).empty
+
+        assert mock_download.call_count == 3
+        assert not data_fetcher._circuit_breaker.is_open()
+
+    def test_logged_transport_error_counts(self, monkeypatch):
+        """Test that a transport error yfinance only logs still counts as a failure."""
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: 0.0)
+        monkeypatch.setattr(data_fetcher._circuit_breaker, 'failure_threshold', 2)
+
+        def failing_download(*args, **kwargs):
+            logging.getLogger('yfinance').error("['TEST']: DNSError('Could not resolve host')")
+            return pd.DataFrame()
+
+        with patch('yfinance.download', side_effect=failing_download) as mock_download:
+            assert data_fetcher.fetch_data_with_retry('TEST', retries=3).empty
+
+        assert mock_download.call_count == 2
+        assert data_fetcher._circuit_breaker.is_open()
+
+    def test_open_breaker_serves_cache(self, monkeypatch, tmp_path):
+        """Test that an open breaker returns stale cached bars without any request."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        cached = pd.DataFrame({'adj_close': [100.0, 101.0]},
+                              index=pd.date_range('2024-01-01', periods=2, freq='D'))
+        data_fetcher.save_cache({'TEST': cached}, coverage={'TEST': data_fetcher.FULL_HISTORY})
+        monkeypatch.setattr(data_fetcher, 'get_last_market_close',
+                            lambda: datetime.now(timezone.utc) + timedelta(hours=1))
+        data_fetcher._circuit_breaker.record_failure(rate_limited=True)
+
+        with patch('yfinance.download') as mock_download:
+            result = data_fetcher.fetch_adj_close('TEST', 3)
+            with pytest.raises(RuntimeError, match="circuit breaker open"):
+                data_fetcher.fetch_adj_close('OTHER', 3)
+
+        assert mock_download.call_count == 0
+        assert list(result['adj_close']) == [100.0, 101.0]
+        assert result.attrs['degraded']
+
+    def test_breaker_opening_mid_fetch_falls_back(self, monkeypatch, tmp_path):
+        """Test that a fetch tripping the breaker still returns cached bars."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        monkeypatch.setattr(data_fetcher.time, 'sleep', lambda s: None)
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: 0.0)
+        cached = pd.DataFrame({'adj_close': [100.0, 101.0]},
+                              index=pd.date_range('2024-01-01', periods=2, freq='D'))
+        data_fetcher.save_cache({'TEST': cached}, coverage={'TEST': data_fetcher.FULL_HISTORY})
+        monkeypatch.setattr(data_fetcher, 'get_last_market_close',
+                            lambda: datetime.now(timezone.utc) + timedelta(hours=1))
+
+        with patch('yfinance.download', side_effect=Exception("429 Too Many Requests")):
+            result = data_fetcher.fetch_adj_close('TEST', 3)
+
+        assert result.attrs['degraded']
+        assert len(result) == 2
+
+
+class TestConcurrentFetching:
+    """Test fetching several symbols at once."""
+
+    def _multi_ticker(self, symbols, n=5):
+        """Build a yfinance-style multi-ticker frame."""
+        index = pd.date_range('2024-01-01', periods=n, freq='D')
+        columns = pd.MultiIndex.from_product([['Adj Close', 'Close'], symbols], names=['Price', 'Ticker'])
+        values = np.tile(np.arange(n, dtype=float)[:, None] + 100.0, len(columns))
+        return pd.DataFrame(values, index=index, columns=columns)
+
+    def test_batch_splits_symbols(self, monkeypatch):
+        """Test that a multi-ticker download is split per symbol."""
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire', lambda tokens=1: 0.0)
+        raw = self._multi_ticker(['QQQ', 'TQQQ'])
+        raw.loc[raw.index[:2], ('Adj Close', 'TQQQ')] = np.nan
+        raw.loc[raw.index[:2], ('Close', 'TQQQ')] = np.nan
+
+        with patch('yfinance.download', return_value=raw) as mock_download:
+            frames = data_fetcher.fetch_batch_with_retry(['QQQ', 'TQQQ'])
+
+        assert mock_download.call_count == 1
+        assert mock_download.call_args[0][0] == ['QQQ', 'TQQQ']
+        assert set(frames) == {'QQQ', 'TQQQ'}
+        assert list(frames['QQQ'].columns) == ['adj_close', 'close']
+        # Rows padded for the shorter history are dropped
+        assert len(frames['QQQ']) == 5
+        assert len(frames['TQQQ']) == 3
+
+    def test_cold_cache_uses_one_batch_request(self, monkeypatch, tmp_path):
+        """Test that uncached symbols are downloaded with one request and cached."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+
+        calls = []
+        def mock_batch(symbols, **kwargs):
+            calls.append((symbols, kwargs))
+            raw = self._multi_ticker(symbols)
+            return {sym: data_fetcher.normalize_bars(raw.xs(sym, axis=1, level=1), sym) for sym in symbols}
+        monkeypatch.setattr(data_fetcher, 'fetch_batch_with_retry', mock_batch)
+
+        def no_single_fetch(*args, **kwargs):
+            raise AssertionError("per-symbol fetch not expected")
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', no_single_fetch)
+
+        start = (pd.Timestamp.now() - pd.DateOffset(years=30)).strftime('%Y-%m-%d')
+        frames = data_fetcher.fetch_adj_close_many(['QQQ', 'TQQQ'], start={'QQQ': start, 'TQQQ': '2024-01-03'})
+
+        assert len(calls) == 1
+        assert calls[0][1]['start'] == start
+        assert len(frames['QQQ']) == 5
+        assert len(frames['TQQQ']) == 3
+        assert set(bar_store.load_manifest()) == {'QQQ', 'TQQQ'}
+        assert bar_store.load_manifest()['QQQ']['covers_from'] == start
+
+    def test_cached_symbols_fetched_per_symbol(self, monkeypatch, tmp_path):
+        """Test that symbols already in the cache take the per-symbol path."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        monkeypatch.setattr(data_fetcher, 'fetch_batch_with_retry',
+                            lambda *a, **kw: pytest.fail("batch fetch not expected"))
+
+        fetched = []
+        def mock_fetch(symbol, years=None, use_cache=True, start=None, columns=None):
+            fetched.append((symbol, years))
+            return pd.DataFrame({'adj_close': [float(years)]})
+        monkeypatch.setattr(data_fetcher, 'fetch_adj_close', mock_fetch)
+        monkeypatch.setattr(data_fetcher, '_manifest_entry', lambda symbol: {'rows': 1})
+
+        frames = data_fetcher.fetch_adj_close_many(['QQQ', 'TQQQ'], years={'QQQ': 5, 'TQQQ': 3})
+
+        assert sorted(fetched) == [('QQQ', 5), ('TQQQ', 3)]
+        assert list(frames) == ['QQQ', 'TQQQ']
+        assert frames['QQQ']['adj_close'].iloc[0] == 5.0
+
+    def test_failure_propagates(self, monkeypatch, tmp_path):
+        """Test that a failed symbol raises instead of returning partial data."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+
+        def mock_fetch(symbol, **kwargs):
+            if symbol == 'BAD':
+                raise RuntimeError("Failed to fetch any valid data for BAD")
+            return pd.DataFrame({'adj_close': [1.0]})
+        monkeypatch.setattr(data_fetcher, 'fetch_adj_close', mock_fetch)
+
+        with pytest.raises(RuntimeError):
+            data_fetcher.fetch_adj_close_many(['QQQ', 'BAD'], years=3, batch=False)
+
+    def test_symbol_missing_from_window_dict(self, monkeypatch):
+        """Test that a symbol left out of a per-symbol dict is an error, not a full-history fetch."""
+        calls = []
+        monkeypatch.setattr(data_fetcher, 'fetch_adj_close', lambda symbol, **kwargs: calls.append(kwargs))
+
+        with pytest.raises(KeyError, match='TQQQ'):
+            data_fetcher.fetch_adj_close_many(['QQQ', 'TQQQ'], years={'QQQ': 5})
+        with pytest.raises(KeyError, match='TQQQ'):
+            data_fetcher.fetch_adj_close_many(['QQQ', 'TQQQ'], start={'QQQ': '2024-01-02'}, batch=False)
+        assert calls == []
+
+
 class TestCSVLogging:
     """Test CSV signal logging functionality."""
 
@@ -366,8 +1255,8 @@ class TestDataIntegration:
 
     def test_fetch_and_cache_workflow(self, monkeypatch, tmp_path):
         """Test complete workflow of fetch, cache, and retrieve."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
 
         # Mock fetch_data_with_retry
         mock_data = pd.DataFrame({
@@ -387,8 +1276,9 @@ class TestDataIntegration:
         assert call_count[0] == 1
         assert len(result1) == 3
 
-        # Verify cache file was created
-        assert tmp_path.joinpath("cache.pkl").exists()
+        # Verify cache files were created
+        assert tmp_path.joinpath("cache", "manifest.json").exists()
+        assert tmp_path.joinpath("cache", "QQQ.bars").exists()
 
         # Second call: should use cache (no new fetch)
         result2 = data_fetcher.fetch_adj_close('QQQ', 3, use_cache=True)
@@ -400,8 +1290,8 @@ class TestDataIntegration:
 
     def test_cache_invalidation(self, monkeypatch, tmp_path):
         """Test cache can be bypassed when needed."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
 
         mock_data = pd.DataFrame({
             'adj_close': [100.0, 101.0],
@@ -0,0 +1,117 @@
+"""Tests for the run deadline and per-stage budgets."""
+import pytest
+import threading
+import time
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src import config, data_fetcher, main
+from src.deadline import RunDeadline, StageTimeout
+
+
+class TestBudgets:
+    """Tests for splitting the deadline between stages."""
+
+    def test_shares_of_remaining_time(self):
+        """Test that each stage gets its share of the time still left."""
+        deadline = RunDeadline(total=100, budgets={"fetch": 0.6, "compute": 0.1, "chart": 0.3})
+        assert deadline.budget("fetch") == pytest.approx(60, abs=0.5)
+
+        deadline.run("fetch", lambda: None)
+        # Unused fetch time carries over: compute gets 1/4 of what is left
+        assert deadline.budget("compute") == pytest.approx(25, abs=0.5)
+
+    def test_last_stage_gets_the_rest(self):
+        """Test that the final stage may use all remaining time."""
+        deadline = RunDeadline(total=10, budgets={"fetch": 0.5, "notify": 0.5})
+        deadline.run("fetch", lambda: None)
+        assert deadline.budget("notify") == pytest.approx(deadline.remaining(), abs=0.01)
+
+
+class TestStages:
+    """Tests for running stages within their budget."""
+
+    def test_returns_value(self):
+        """Test that a stage returns the value of its function."""
+        deadline = RunDeadline(total=10, budgets={"compute": 1.0})
+        assert deadline.run("compute", lambda a, b=0: a + b, 1, b=2) == 3
+        assert deadline.result()["status"] == "complete"
+
+    def test_timeout_abandons_stage(self):
+        """Test that an overrunning stage is abandoned and cancelled."""
+        deadline = RunDeadline(total=0.2, budgets={"fetch": 0.5, "chart": 0.5})
+        release = threading.Event()
+        cancelled = []
+
+        start = time.monotonic()
+        with pytest.raises(StageTimeout, match="fetch stage"):
+            deadline.run("fetch", release.wait, 5, cancel=lambda: cancelled.append(True))
+        release.set()
+
+        assert time.monotonic() - start < 1
+        assert cancelled == [True]
+        assert deadline.abandoned()
+
+        deadline.skip_remaining("fetch stage timed out")
+        result = deadline.result()
+        assert result["status"] == "partial"
+        assert result["stages"]["fetch"]["status"] == "timeout"
+        assert result["stages"]["chart"] == {"status": "skipped", "reason": "fetch stage timed out"}
+
+    def test_failure_is_recorded_and_raised(self):
+        """Test that an exception in a stage propagates and marks it failed."""
+        deadline = RunDeadline(total=10, budgets={"fetch": 1.0})
+
+        def fail():
+            raise RuntimeError("no data")
+
+        with pytest.raises(RuntimeError, match="no data"):
+            deadline.run("fetch", fail)
+        assert deadline.result()["stages"]["fetch"]["status"] == "failed"
+        assert not deadline.abandoned()
+
+
+class TestRunDeadline:
+    """Tests for the deadline applied to a tqqq-sma run."""
+
+    def test_abort_stops_retries(self, monkeypatch):
+        """Test that aborting requests stops downloads before their next attempt."""
+        monkeypatch.setattr(data_fetcher._aborted, 'is_set', lambda: True)
+        monkeypatch.setattr(data_fetcher._rate_limiter, 'acquire',
+                            lambda tokens=1: pytest.fail("no request after abort"))
+
+        assert data_fetcher.fetch_data_with_retry('QQQ', retries=3).empty
+
+    def test_disabled_stages_take_no_budget(self, monkeypatch):
+        """Test that chart and notify get no share when they are turned off."""
+        monkeypatch.setattr(config, 'STAGE_BUDGETS', {"fetch": 0.6, "compute": 0.1, "chart": 0.2, "notify": 0.1})
+        monkeypatch.setattr(config, 'PRINT_CHART', False)
+        monkeypatch.setattr(config, 'GENERATE_INTERACTIVE_CHART', False)
+        monkeypatch.setattr(config, 'EMAIL_ALERT', {"enabled": False})
+
+        budgets = main._stage_budgets()
+        assert budgets == {"fetch": 0.6, "compute": 0.1}
+        assert RunDeadline(total=70, budgets=budgets).budget("fetch") == pytest.approx(60, abs=0.1)
+
+        monkeypatch.setattr(config, 'PRINT_CHART', True)
+        assert list(main._stage_budgets()) == ["fetch", "compute", "chart"]
+
+    def test_fetch_timeout_reports_partial_run(self, monkeypatch, capsys):
+        """Test that a hung fetch ends the run with a partial result and exit code 1."""
+        release = threading.Event()
+        exits = []
+        monkeypatch.setattr(main, 'RunDeadline', lambda budgets=None: RunDeadline(total=0.2, budgets=budgets))
+        monkeypatch.setattr(main, '_main_logic',
+                            lambda deadline: deadline.run("fetch", release.wait, 5, cancel=release.set))
+        monkeypatch.setattr(main.os, '_exit', exits.append)
+
+        main.main([])
+
+        out = capsys.readouterr().out
+        assert exits == [1]
+        assert 'fetch timed out' in out
+        assert 'Run partial' in out
+        assert 'chart skipped' in out
@@ -0,0 +1,116 @@
+"""Tests for the NYSE trading-session calendar."""
+import pytest
+import numpy as np
+import sys
+import os
+from datetime import date, datetime, timezone
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src import config, data_fetcher, market_calendar
+
+
+@pytest.fixture(autouse=True)
+def rules_calendar(monkeypatch, tmp_path):
+    """Evaluate the rules instead of reading the committed calendar file."""
+    monkeypatch.setattr(config, 'MARKET_CALENDAR_FILE', str(tmp_path / "calendar.npz"))
+    monkeypatch.setattr(market_calendar, '_sessions', None)
+
+
+def utc(*args):
+    """Build a UTC datetime."""
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class TestExchangeRules:
+    """Tests for holidays and early closes."""
+
+    def test_holidays_2024(self):
+        """Test the 2024 NYSE holiday schedule."""
+        assert market_calendar.holidays(2024) == [
+            date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29),
+            date(2024, 5, 27), date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2),
+            date(2024, 11, 28), date(2024, 12, 25),
+        ]
+
+    def test_weekend_holidays_observed(self):
+        """Test Saturday/Sunday holidays move to Friday/Monday."""
+        # July 4th 2026 is a Saturday, Christmas 2022 a Sunday
+        assert date(2026, 7, 3) in market_calendar.holidays(2026)
+        assert date(2022, 12, 26) in market_calendar.holidays(2022)
+        # New Year's Day 2022 was a Saturday and is not observed on Dec 31
+        assert date(2021, 12, 31) not in market_calendar.holidays(2021)
+        assert date(2022, 1, 1) not in market_calendar.holidays(2022)
+
+    def test_early_closes_2024(self):
+        """Test the 2024 early-close sessions."""
+        assert market_calendar.early_closes(2024) == [
+            date(2024, 7, 3), date(2024, 11, 29), date(2024, 12, 24),
+        ]
+
+    def test_no_early_close_on_observed_holiday(self):
+        """Test July 3rd is not an early close when it is the observed holiday."""
+        assert date(2026, 7, 3) not in market_calendar.early_closes(2026)
+
+
+class TestSessionLookups:
+    """Tests for lookups on the session arrays."""
+
+    def test_close_follows_dst(self):
+        """Test that the close is 21:00 UTC in winter and 20:00 UTC in summer."""
+        assert market_calendar.last_close(utc(2024, 1, 3, 23, 0)) == utc(2024, 1, 3, 21, 0)
+        assert market_calendar.last_close(utc(2024, 7, 1, 23, 0)) == utc(2024, 7, 1, 20, 0)
+
+    def test_before_close_uses_previous_session(self):
+        """Test that the close is not reached until 16:00 ET."""
+        assert market_calendar.last_close(utc(2024, 7, 2, 19, 59)) == utc(2024, 7, 1, 20, 0)
+
+    def test_early_close(self):
+        """Test the 13:00 ET close on the day after Thanksgiving."""
+        assert market_calendar.last_close(utc(2024, 11, 29, 19, 0)) == utc(2024, 11, 29, 18, 0)
+
+    def test_holiday_weekend(self):
+        """Test that a holiday Monday keeps the previous Friday's close."""
+        # Memorial Day 2024 (Monday May 27)
+        assert market_calendar.last_close(utc(2024, 5, 27, 22, 0)) == utc(2024, 5, 24, 20, 0)
+        assert market_calendar.next_open(utc(2024, 5, 25, 12, 0)) == utc(2024, 5, 28, 13, 30)
+
+    def test_is_session_day(self):
+        """Test session days against weekends, holidays and special closures."""
+        assert market_calendar.is_session_day(date(2024, 7, 3))
+        assert not market_calendar.is_session_day(date(2024, 7, 4))
+        assert not market_calendar.is_session_day(date(2024, 7, 6))
+        assert not market_calendar.is_session_day(date(2025, 1, 9))
+
+    def test_arrays_sorted(self):
+        """Test that opens and closes are sorted and paired."""
+        opens, closes = market_calendar.build_sessions(2020, 2022)
+        assert np.all(np.diff(opens) > 0)
+        assert np.all(closes > opens)
+        assert len(opens) == 253 + 252 + 251
+
+
+class TestCalendarFile:
+    """Tests for the precomputed calendar file."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that saved sessions load back unchanged."""
+        path = str(tmp_path / "calendar.npz")
+        opens, closes = market_calendar.build_sessions(2023, 2024)
+        market_calendar.save_sessions(path, opens, closes)
+
+        loaded_opens, loaded_closes = market_calendar.load_sessions(path)
+        assert np.array_equal(loaded_opens, opens)
+        assert np.array_equal(loaded_closes, closes)
+
+    def test_outdated_file_falls_back_to_rules(self, tmp_path):
+        """Test that a file ending in the past is not used for today."""
+        opens, closes = market_calendar.build_sessions(2010, 2011)
+        market_calendar.save_sessions(config.MARKET_CALENDAR_FILE, opens, closes)
+
+        assert market_calendar.last_close(utc(2024, 1, 3, 23, 0)) == utc(2024, 1, 3, 21, 0)
+
+    def test_cache_expiry_uses_calendar(self, monkeypatch):
+        """Test that the data fetcher's cache expiry comes from the calendar."""
+        assert data_fetcher.get_last_market_close() == market_calendar.last_close()
@@ -0,0 +1,99 @@
+"""Tests for the cache warm-up command."""
+import pytest
+import pandas as pd
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src import config, data_fetcher, main, prefetch
+
+
+@pytest.fixture
+def offline(monkeypatch, tmp_path):
+    """Serve bars from the synthetic provider into a temporary cache."""
+    monkeypatch.setattr(config, 'DATA_PROVIDER', 'synthetic')
+    monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+    return tmp_path
+
+
+class TestPlan:
+    """Tests for merging consumer requirements."""
+
+    def test_one_range_per_symbol(self):
+        """Test that the widest window per symbol wins."""
+        needs = [
+            ("signal", "QQQ", pd.Timestamp("2021-01-01")),
+            ("chart", "QQQ", pd.Timestamp("2020-01-01")),
+            ("signal", "TQQQ", pd.Timestamp("2023-01-01")),
+            ("backtest", "TQQQ", None),
+        ]
+        ranges = prefetch.plan(needs)
+
+        assert ranges["QQQ"] == (pd.Timestamp("2020-01-01"), ["signal", "chart"])
+        assert ranges["TQQQ"] == (None, ["signal", "backtest"])
+
+    def test_requirements_follow_config(self, monkeypatch):
+        """Test that disabled consumers add no ranges."""
+        monkeypatch.setattr(config, 'PRINT_CHART', False)
+        monkeypatch.setattr(config, 'GENERATE_INTERACTIVE_CHART', False)
+
+        consumers = {consumer for consumer, _, _ in prefetch.requirements()}
+        assert consumers == {"signal"}
+        with_backtest = prefetch.requirements(include_backtest=True)
+        assert ("backtest", config.TQQQ_SYMBOL, pd.Timestamp(config.BACKTEST_START)) in with_backtest
+
+
+class TestPrefetch:
+    """Tests for fetching the plan and reporting statistics."""
+
+    def test_cold_then_warm(self, offline, capsys):
+        """Test that a second prefetch is served entirely from the cache."""
+        assert prefetch.prefetch() == {"hit": 0, "stale": 0, "miss": 2}
+        assert prefetch.prefetch() == {"hit": 2, "stale": 0, "miss": 0}
+        assert "2 hit" in capsys.readouterr().out
+
+    def test_signal_uses_prefetched_data(self, offline, monkeypatch):
+        """Test that every range the signal needs is a cache hit after prefetch."""
+        prefetch.prefetch()
+
+        assert data_fetcher.cache_status(config.QQQ_SYMBOL, years=config.CHART_HISTORY_YEARS) == "hit"
+        assert data_fetcher.cache_status(config.TQQQ_SYMBOL, years=config.HISTORY_YEARS) == "hit"
+        # A longer window than anything prefetched is still a miss
+        assert data_fetcher.cache_status(config.QQQ_SYMBOL, start=config.BACKTEST_START) == "miss"
+
+    def test_stale_entry_reported(self, offline, monkeypatch):
+        """Test that an entry from before the last close counts as stale."""
+        prefetch.prefetch()
+        monkeypatch.setattr(data_fetcher, 'get_last_market_close',
+                            lambda: pd.Timestamp.now(tz='UTC') + pd.Timedelta(hours=1))
+
+        assert data_fetcher.cache_status(config.QQQ_SYMBOL, years=1) == "stale"
+
+    def test_partial_stale_entry_is_miss(self, offline, monkeypatch):
+        """Test that an out-of-date entry without the full record is planned as a full download."""
+        bars = data_fetcher.fetch_adj_close(config.QQQ_SYMBOL, years=1, use_cache=False, columns=["adj_close"])
+        data_fetcher.save_cache({config.QQQ_SYMBOL: bars}, coverage={config.QQQ_SYMBOL: data_fetcher.FULL_HISTORY})
+        monkeypatch.setattr(data_fetcher, 'get_last_market_close',
+                            lambda: pd.Timestamp.now(tz='UTC') + pd.Timedelta(hours=1))
+
+        assert data_fetcher.cache_status(config.QQQ_SYMBOL, years=1) == "miss"
+
+    def test_stale_entry_without_incremental_fetch_is_miss(self, offline, monkeypatch):
+        """Test that stale entries are full downloads when incremental fetching is off."""
+        prefetch.prefetch()
+        monkeypatch.setattr(config, 'INCREMENTAL_FETCH', False)
+        monkeypatch.setattr(data_fetcher, 'get_last_market_close',
+                            lambda: pd.Timestamp.now(tz='UTC') + pd.Timedelta(hours=1))
+
+        assert data_fetcher.cache_status(config.QQQ_SYMBOL, years=1) == "miss"
+
+    def test_cli_subcommand(self, offline, monkeypatch):
+        """Test that `tqqq-sma prefetch --backtest` runs the warm-up only."""
+        calls = []
+        monkeypatch.setattr(main, 'prefetch', lambda include_backtest: calls.append(include_backtest))
+        monkeypatch.setattr(main, '_main_logic', lambda deadline=None: pytest.fail("signal should not run"))
+
+        main.main(["prefetch", "--backtest"])
+        assert calls == [True]
@@ -200,3 +200,85 @@ class TestStateTransitions:
         can_sell = (current_position == "TQQQ" and qqq_close <= sell_threshold)
         assert not can_sell
 
+
+class TestStaleWhileRevalidate:
+    """Tests for the provisional signal shown while data refreshes."""
+
+    def test_provisional_then_final(self, capsys, signal_frames, run_signal):
+        """Test that the cached signal is printed before the refreshed one."""
+        run_signal(signal_frames(250, 100.0), signal_frames(251, 110.0))
+
+        out = capsys.readouterr().out
+        assert out.index('PROVISIONAL (cached bars through 2024-09-06)') < out.index('Date:')
+        assert 'data now through 2024-09-07' in out
+        assert 'ALERT: BUY TQQQ' in out
+        # CI parses the first match of these labels; the provisional block must not contain them
+        provisional_block = out[:out.index('Refresh complete')]
+        for label in ('Date:', 'QQQ Close:', 'SMA200:', 'Position:', 'TQQQ Close:', 'ALERT:', 'STATUS:'):
+            assert label not in provisional_block
+
+    def test_state_only_from_final_signal(self, monkeypatch, tmp_path, signal_frames, run_signal):
+        """Test that a provisional BUY is not written to state if the refresh disagrees."""
+        from src.state_manager import load_state
+        from src import config
+
+        run_signal(signal_frames(250, 110.0), signal_frames(250, 100.0))
+
+        monkeypatch.setattr(config, 'STATE_FILE', str(tmp_path / 'state.json'))
+        assert load_state()['position'] == 'CASH'
+
+    def test_sma_window_saved_in_state(self, monkeypatch, tmp_path, signal_frames, run_signal):
+        """Test that the SMA window is saved so the next run only adds new bars."""
+        from src.state_manager import load_state
+        from src import config
+
+        run_signal(signal_frames(250, 100.0), signal_frames(251, 110.0), mode=False)
+
+        monkeypatch.setattr(config, 'STATE_FILE', str(tmp_path / 'state.json'))
+        window = load_state()['sma']
+        assert window['last_date'] == '2024-09-07'
+        assert len(window['prices']) == config.SMA_PERIOD
+        assert window['prices'][-1] == 110.0
+
+    def test_skipped_when_cache_fresh(self, capsys, signal_frames, run_signal):
+        """Test that no provisional block is printed for a fresh cache."""
+        frames = signal_frames(250, 100.0)
+        run_signal(frames, frames, fresh=True)
+        assert 'PROVISIONAL' not in capsys.readouterr().out
+
+    def test_auto_mode_off_without_terminal(self, capsys, signal_frames, run_signal):
+        """Test that "auto" mode stays off when output is captured (CI)."""
+        run_signal(signal_frames(250, 100.0), signal_frames(251, 110.0), mode="auto")
+        assert 'PROVISIONAL' not in capsys.readouterr().out
+
+
+class TestDegradedOutput:
+    """Tests for the label printed when data comes from the cache only."""
+
+    def test_degraded_label_before_summary(self, capsys, signal_frames, run_signal):
+        """Test that degraded data is labeled ahead of the lines CI parses."""
+        frames = signal_frames(250, 100.0)
+        frames[0].attrs['degraded'] = True
+        run_signal(frames, frames, mode=False)
+
+        out = capsys.readouterr().out
+        assert out.index('DEGRADED') < out.index('Date:')
+        assert 'Using cached data' not in out
+
+
+class TestTriggerOutput:
+    """Tests for the next-session trigger prices in the summary."""
+
+    def test_trigger_prices_printed(self, capsys, signal_frames, run_signal):
+        """Test the closed-form trigger lines without disturbing the parsed fields."""
+        frames = signal_frames(250, 100.0)
+        run_signal(frames, frames, mode=False)
+
+        out = capsys.readouterr().out
+        # X = m * (199 * 100) / (200 - m)
+        assert 'Next session BUY if QQQ closes at or above $105.03, SELL at or below $96.99' in out
+        assert '+5  BUY' in out
+        # CI greps the first line with these labels; the trigger lines must not match
+        triggers = out[out.index('Next session'):out.index('Position:')]
+        for label in ('Date:', 'QQQ Close:', 'SMA200:', 'Threshold', 'Position:', 'ALERT:', 'STATUS:'):
+            assert label not in triggers
@@ -1,15 +1,15 @@
 """Tests for state management (load/save state, cache)."""
 import pytest
 import json
-import pickle
 import os
+import pandas as pd
 from datetime import datetime, timezone, timedelta
 import sys
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src import state_manager, data_fetcher, config
+from src import state_manager, data_fetcher, bar_store, config
 
 
 class TestStateManagement:
@@ -64,35 +64,36 @@ class TestStateManagement:
 class TestCacheManagement:
     """Tests for market data cache management."""
 
+    def _frame(self, values):
+        """Build a small adj_close frame indexed by date."""
+        return pd.DataFrame(
+            {'adj_close': values},
+            index=pd.date_range('2024-01-01', periods=len(values), freq='D', name='Date')
+        )
+
     def test_save_and_load_cache(self, monkeypatch, tmp_path):
         """Test saving and loading cache."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
 
         # Save cache
-        test_data = {'QQQ_3y': {'some': 'data'}}
+        test_data = {'QQQ_3y': self._frame([100.0, 101.0, 102.0])}
         data_fetcher.save_cache(test_data)
 
         # Load and verify
         loaded_cache = data_fetcher.load_cache()
-        assert loaded_cache == test_data
+        assert list(loaded_cache) == ['QQQ_3y']
+        pd.testing.assert_frame_equal(loaded_cache['QQQ_3y'], test_data['QQQ_3y'], check_freq=False)
 
     def test_cache_expiry(self, monkeypatch, tmp_path):
         """Test cache expiry based on market close."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
-
-        # Save old cache (before last market close)
-        old_time = datetime.now(timezone.utc) - timedelta(days=2)
-        cache_data = {
-            'timestamp': old_time,
-            'data': {'QQQ_3y': {'some': 'data'}}
-        }
-        with open(cache_file, 'wb') as f:
-            pickle.dump(cache_data, f)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
+
+        data_fetcher.save_cache({'QQQ_3y': self._frame([100.0, 101.0])})
 
-        # Mock get_last_market_close to return yesterday's close
-        mock_last_close = datetime.now(timezone.utc) - timedelta(days=1)
+        # Mock get_last_market_close to return a close after the cache was written
+        mock_last_close = datetime.now(timezone.utc) + timedelta(hours=1)
         monkeypatch.setattr(data_fetcher, 'get_last_market_close', lambda: mock_last_close)
 
         # Should return None (expired - cache is older than last market close)
@@ -101,17 +102,10 @@ class TestCacheManagement:
 
     def test_cache_not_expired(self, monkeypatch, tmp_path):
         """Test cache not expired (newer than last market close)."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
-
-        # Save recent cache (after last market close)
-        recent_time = datetime.now(timezone.utc)
-        cache_data = {
-            'timestamp': recent_time,
-            'data': {'QQQ_3y': {'test': 'data'}}
-        }
-        with open(cache_file, 'wb') as f:
-            pickle.dump(cache_data, f)
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
+
+        data_fetcher.save_cache({'QQQ_3y': self._frame([100.0, 101.0])})
 
         # Mock get_last_market_close to return a time before the cache
         mock_last_close = datetime.now(timezone.utc) - timedelta(hours=2)
@@ -119,25 +113,98 @@ class TestCacheManagement:
 
         # Should return data (cache is newer than last market close)
         loaded_cache = data_fetcher.load_cache()
-        assert loaded_cache == {'QQQ_3y': {'test': 'data'}}
+        assert loaded_cache['QQQ_3y']['adj_close'].tolist() == [100.0, 101.0]
 
     def test_load_cache_no_file(self, monkeypatch, tmp_path):
         """Test loading cache when file doesn't exist."""
-        cache_file = str(tmp_path / "nonexistent.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        cache_dir = str(tmp_path / "nonexistent")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
 
         result = data_fetcher.load_cache()
         assert result is None
 
     def test_load_cache_corrupted(self, monkeypatch, tmp_path):
-        """Test loading corrupted cache file."""
-        cache_file = str(tmp_path / "cache.pkl")
-        monkeypatch.setattr(config, 'CACHE_FILE', cache_file)
+        """Test loading corrupted cache manifest."""
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        monkeypatch.setattr(config, 'CACHE_DIR', str(cache_dir))
 
         # Create corrupted file
-        with open(cache_file, 'wb') as f:
+        with open(cache_dir / "manifest.json", 'wb') as f:
             f.write(b"corrupted data")
 
         result = data_fetcher.load_cache()
         assert result is None
 
+    def test_load_cache_corrupted_entry(self, monkeypatch, tmp_path):
+        """Test that a corrupted entry file only drops that entry."""
+        cache_dir = tmp_path / "cache"
+        monkeypatch.setattr(config, 'CACHE_DIR', str(cache_dir))
+
+        data_fetcher.save_cache({
+            'QQQ_3y': self._frame([100.0, 101.0]),
+            'TQQQ_3y': self._frame([50.0, 51.0]),
+        })
+        with open(cache_dir / "TQQQ_3y.bars", 'wb') as f:
+            f.write(b"corrupted data")
+
+        loaded_cache = data_fetcher.load_cache()
+        assert list(loaded_cache) == ['QQQ_3y']
+
+    def test_checksum_failure_refetches_only_that_symbol(self, monkeypatch, tmp_path):
+        """Test that a corrupted entry is dropped so only its symbol is refetched."""
+        cache_dir = tmp_path / "cache"
+        monkeypatch.setattr(config, 'CACHE_DIR', str(cache_dir))
+
+        data_fetcher.save_cache({
+            'QQQ': self._frame([100.0, 101.0]),
+            'TQQQ': self._frame([50.0, 51.0]),
+        }, coverage={'QQQ': data_fetcher.FULL_HISTORY, 'TQQQ': data_fetcher.FULL_HISTORY})
+        path = cache_dir / "TQQQ.bars"
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        path.write_bytes(bytes(data))
+
+        fetched = []
+        def mock_fetch(symbol, **kwargs):
+            fetched.append(symbol)
+            return self._frame([60.0, 61.0])
+        monkeypatch.setattr(data_fetcher, 'fetch_data_with_retry', mock_fetch)
+
+        assert data_fetcher.fetch_adj_close('QQQ')['adj_close'].iloc[-1] == 101.0
+        assert data_fetcher.fetch_adj_close('TQQQ')['adj_close'].iloc[-1] == 61.0
+        assert fetched == ['TQQQ']
+
+    def test_save_cache_evicts_least_recently_used(self, monkeypatch, tmp_path):
+        """Test that the cache stays within its byte budget."""
+        monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / "cache"))
+        data_fetcher.save_cache({'IWM': self._frame([10.0, 11.0])})
+        data_fetcher.save_cache({'QQQ': self._frame([100.0, 101.0])})
+        data_fetcher.load_cache(['IWM'])
+        monkeypatch.setattr(config, 'CACHE_MAX_BYTES', 2 * bar_store.entry_bytes('QQQ'))
+
+        data_fetcher.save_cache({'TQQQ': self._frame([50.0, 51.0])})
+
+        # QQQ was read least recently; the entry just written is always kept
+        assert sorted(bar_store.load_manifest()) == ['IWM', 'TQQQ']
+
+    def test_load_cache_only_requested_keys(self, monkeypatch, tmp_path):
+        """Test that load_cache(keys) only reads the requested entries."""
+        cache_dir = str(tmp_path / "cache")
+        monkeypatch.setattr(config, 'CACHE_DIR', cache_dir)
+
+        data_fetcher.save_cache({
+            'QQQ_3y': self._frame([100.0, 101.0]),
+            'TQQQ_3y': self._frame([50.0, 51.0]),
+        })
+
+        read = []
+        original = bar_store.read_frame
+        def tracking_read(name, *args, **kwargs):
+            read.append(name)
+            return original(name, *args, **kwargs)
+        monkeypatch.setattr(bar_store, 'read_frame', tracking_read)
+
+        loaded_cache = data_fetcher.load_cache(['TQQQ_3y'])
+        assert list(loaded_cache) == ['TQQQ_3y']
+        assert read == ['TQQQ_3y']